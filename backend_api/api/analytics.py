@@ -9,15 +9,19 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, or_
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
-import statistics
 
-from ..database import SessionLocal, Device, SensorData, Alert, Rule
-from ..config import SENSOR_LIMITS
+from database import ReadSessionLocal, Device, Alert, Rule, sensor_data_between
+from config import SENSOR_LIMITS
+from services.device_registry import device_registry
+from services.rollups import window_stats, lifetime_stats
+from services.quantiles import streaming_median
+from services.live_metrics import live_metrics
+from services.rules_engine import rule_index
 
 router = APIRouter()
 
 def get_db():
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
@@ -29,40 +33,19 @@ def get_db():
 
 @router.get("/analytics/overview")
 def get_analytics_overview(db: Session = Depends(get_db)):
-    """Get comprehensive system analytics."""
+    """Get comprehensive system analytics (served from in-memory live counters)."""
     
     now = datetime.utcnow()
-    last_24h = now - timedelta(hours=24)
-    last_7d = now - timedelta(days=7)
+    live_metrics.ensure_fresh(db, rule_index.pending_trigger_count)
+    metrics = live_metrics.snapshot()
     
     # Device statistics
-    total_devices = db.query(Device).count()
-    online_devices = db.query(Device).filter(Device.status == "online").count()
+    total_devices = metrics["devices_total"]
+    online_devices = metrics["devices_online"]
     
     # Data statistics
-    data_24h = db.query(SensorData).filter(
-        SensorData.timestamp >= last_24h
-    ).count()
-    
-    data_7d = db.query(SensorData).filter(
-        SensorData.timestamp >= last_7d
-    ).count()
-    
-    # Alert statistics
-    alerts_24h = db.query(Alert).filter(
-        Alert.created_at >= last_24h
-    ).count()
-    
-    critical_alerts = db.query(Alert).filter(
-        and_(
-            Alert.severity == "critical",
-            Alert.is_resolved == False
-        )
-    ).count()
-    
-    # Rules statistics
-    active_rules = db.query(Rule).filter(Rule.is_active == True).count()
-    total_triggers_24h = db.query(func.sum(Rule.trigger_count)).scalar() or 0
+    data_24h = metrics["data_24h"]
+    data_7d = metrics["data_7d"]
     
     return {
         "devices": {
@@ -78,14 +61,14 @@ def get_analytics_overview(db: Session = Depends(get_db)):
             "rate_per_minute": round(data_24h / (24 * 60), 2) if data_24h > 0 else 0
         },
         "alerts": {
-            "last_24h": alerts_24h,
-            "critical_unresolved": critical_alerts,
+            "last_24h": metrics["alerts_24h"],
+            "critical_unresolved": metrics["alerts_critical"],
             "avg_per_day": round(data_7d / 7, 2) if data_7d > 0 else 0
         },
         "rules": {
-            "total": db.query(Rule).count(),
-            "active": active_rules,
-            "triggers_24h": total_triggers_24h
+            "total": metrics["rules_total"],
+            "active": metrics["rules_active"],
+            "triggers_24h": metrics["rule_triggers"]
         },
         "timestamp": now.isoformat()
     }
@@ -98,22 +81,17 @@ def get_device_analytics(
 ):
     """Get detailed analytics for a specific device."""
     
-    device = db.query(Device).filter(Device.device_id == device_id).first()
+    device = device_registry.get(db, device_id)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
     now = datetime.utcnow()
     start_time = now - timedelta(hours=hours)
     
-    # Get sensor data
-    data_points = db.query(SensorData).filter(
-        and_(
-            SensorData.device_id == device.id,
-            SensorData.timestamp >= start_time
-        )
-    ).order_by(SensorData.timestamp).all()
+    # Aggregates from the rollup tables
+    window = window_stats(db, start_time, now, [device.id]).get(device.id)
     
-    if not data_points:
+    if not window:
         return {
             "device_id": device_id,
             "device_name": device.name,
@@ -121,31 +99,48 @@ def get_device_analytics(
             "message": "No data available for this period"
         }
     
-    values = [d.value for d in data_points]
+    # Raw readings, limited to the partitions overlapping the window
+    raw = sensor_data_between(db, start_time)
+    in_window = and_(
+        raw.device_id == device.id,
+        raw.timestamp >= start_time
+    )
+    first_value = db.query(raw.value).filter(in_window).order_by(raw.timestamp).limit(1).scalar()
+    last_value = db.query(raw.value).filter(in_window).order_by(raw.timestamp.desc()).limit(1).scalar()
+    
+    # Median from a constant-memory streaming sketch
+    median = streaming_median(
+        v for (v,) in db.query(raw.value).filter(in_window).yield_per(1000)
+    )
     
     # Calculate statistics
     stats = {
-        "count": len(values),
-        "min": round(min(values), 2),
-        "max": round(max(values), 2),
-        "avg": round(statistics.mean(values), 2),
-        "median": round(statistics.median(values), 2),
-        "std_dev": round(statistics.stdev(values), 2) if len(values) > 1 else 0,
-        "first_value": round(values[0], 2),
-        "last_value": round(values[-1], 2),
-        "change": round(values[-1] - values[0], 2),
-        "change_percentage": round(((values[-1] - values[0]) / values[0] * 100) if values[0] != 0 else 0, 2)
+        "count": window.count,
+        "min": round(window.min, 2),
+        "max": round(window.max, 2),
+        "avg": round(window.mean, 2),
+        "median": round(median, 2) if median is not None else None,
+        "std_dev": round(window.std_dev, 2),
+        "first_value": round(first_value, 2),
+        "last_value": round(last_value, 2),
+        "change": round(last_value - first_value, 2),
+        "change_percentage": round(((last_value - first_value) / first_value * 100) if first_value != 0 else 0, 2)
     }
     
     # Get sensor limits
     sensor_limits = SENSOR_LIMITS.get(device.device_type, {})
     
-    # Calculate violations
+    # Calculate violations (counted in SQL)
     violations = 0
-    if sensor_limits:
-        min_limit = sensor_limits.get("min", float('-inf'))
-        max_limit = sensor_limits.get("max", float('inf'))
-        violations = sum(1 for v in values if v < min_limit or v > max_limit)
+    out_of_range = []
+    if "min" in sensor_limits:
+        out_of_range.append(raw.value < sensor_limits["min"])
+    if "max" in sensor_limits:
+        out_of_range.append(raw.value > sensor_limits["max"])
+    if out_of_range:
+        violations = db.query(func.count(raw.id)).filter(
+            in_window, or_(*out_of_range)
+        ).scalar() or 0
     
     # Get related alerts
     alerts = db.query(Alert).filter(
@@ -163,9 +158,9 @@ def get_device_analytics(
         "statistics": stats,
         "limits": sensor_limits,
         "violations": violations,
-        "violation_percentage": round((violations / len(values) * 100) if values else 0, 2),
+        "violation_percentage": round((violations / window.count * 100) if window.count else 0, 2),
         "alerts_generated": alerts,
-        "quality_avg": round(statistics.mean([d.quality for d in data_points if d.quality]), 2),
+        "quality_avg": round(window.quality_avg, 2),
         "timestamp": now.isoformat()
     }
 
@@ -179,16 +174,19 @@ def get_trends(
     now = datetime.utcnow()
     trends = []
     
+    # Raw readings, limited to the partitions overlapping the whole range
+    raw = sensor_data_between(db, (now - timedelta(days=days)).replace(hour=0, minute=0, second=0), now)
+    
     for day in range(days, 0, -1):
         date = now - timedelta(days=day)
         start = date.replace(hour=0, minute=0, second=0)
         end = date.replace(hour=23, minute=59, second=59)
         
         # Count data points
-        data_count = db.query(SensorData).filter(
+        data_count = db.query(raw).filter(
             and_(
-                SensorData.timestamp >= start,
-                SensorData.timestamp <= end
+                raw.timestamp >= start,
+                raw.timestamp <= end
             )
         ).count()
         
@@ -232,21 +230,20 @@ def get_devices_ranking(
     devices = db.query(Device).all()
     rankings = []
     
+    if metric == "alerts":
+        alert_counts = dict(
+            db.query(Alert.device_id, func.count(Alert.id)).group_by(Alert.device_id).all()
+        )
+    else:
+        history = lifetime_stats(db)
+    
     for device in devices:
         if metric == "data_count":
-            count = db.query(SensorData).filter(
-                SensorData.device_id == device.id
-            ).count()
-            value = count
+            value = history[device.id].count if device.id in history else 0
         elif metric == "alerts":
-            count = db.query(Alert).filter(
-                Alert.device_id == device.id
-            ).count()
-            value = count
+            value = alert_counts.get(device.id, 0)
         elif metric == "avg_value":
-            avg = db.query(func.avg(SensorData.value)).filter(
-                SensorData.device_id == device.id
-            ).scalar()
+            avg = history[device.id].mean if device.id in history else None
             value = round(avg, 2) if avg else 0
         
         rankings.append({
@@ -390,30 +387,25 @@ def export_analytics(
     now = datetime.utcnow()
     start_time = now - timedelta(days=days)
     
-    # Get all devices with their data
+    # Get all devices with their aggregates (served from rollups)
     devices = db.query(Device).all()
+    per_device = window_stats(db, start_time, now)
     export_data = []
     
     for device in devices:
-        data_points = db.query(SensorData).filter(
-            and_(
-                SensorData.device_id == device.id,
-                SensorData.timestamp >= start_time
-            )
-        ).all()
+        stats = per_device.get(device.id)
         
-        if data_points:
-            values = [d.value for d in data_points]
+        if stats:
             export_data.append({
                 "device_id": device.device_id,
                 "device_name": device.name,
                 "device_type": device.device_type,
-                "data_points_count": len(data_points),
-                "avg_value": round(statistics.mean(values), 2),
-                "min_value": round(min(values), 2),
-                "max_value": round(max(values), 2),
-                "first_reading": data_points[0].timestamp.isoformat(),
-                "last_reading": data_points[-1].timestamp.isoformat()
+                "data_points_count": stats.count,
+                "avg_value": round(stats.mean, 2),
+                "min_value": round(stats.min, 2),
+                "max_value": round(stats.max, 2),
+                "first_reading": stats.first_at.isoformat(),
+                "last_reading": stats.last_at.isoformat()
             })
     
     if format == "csv":
@@ -11,13 +11,15 @@ from datetime import datetime, timedelta
 from typing import List, Optional
 from pydantic import BaseModel, EmailStr
 
-from ..database import SessionLocal
-from ..models_crm import Contact, Lead, Opportunity, Interaction, DemoSession, Campaign
+from database import ReadSessionLocal
+from services.db_writer import db_writer
+from models_crm import Contact, Lead, Opportunity, Interaction, DemoSession, Campaign
 
 router = APIRouter()
 
 def get_db():
-    db = SessionLocal()
+    """Read-only session; writes go through `db_writer`."""
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
@@ -112,20 +114,21 @@ def get_contacts(
     return contacts
 
 @router.post("/crm/contacts", response_model=ContactResponse)
-def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
+def create_contact(contact: ContactCreate):
     """Crear nuevo contacto."""
     
-    # Verificar si el email ya existe
-    existing = db.query(Contact).filter(Contact.email == contact.email).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    db_contact = Contact(**contact.dict())
-    db.add(db_contact)
-    db.commit()
-    db.refresh(db_contact)
+    def create(db: Session):
+        # Verificar si el email ya existe
+        existing = db.query(Contact).filter(Contact.email == contact.email).first()
+        if existing:
+            raise HTTPException(status_code=400, detail="Email already registered")
+        
+        db_contact = Contact(**contact.dict())
+        db.add(db_contact)
+        db.flush()
+        return db_contact
     
-    return db_contact
+    return db_writer.call(create)
 
 @router.get("/crm/contacts/{contact_id}", response_model=ContactResponse)
 def get_contact(contact_id: int, db: Session = Depends(get_db)):
@@ -138,33 +141,36 @@ def get_contact(contact_id: int, db: Session = Depends(get_db)):
     return contact
 
 @router.put("/crm/contacts/{contact_id}")
-def update_contact(contact_id: int, updates: dict, db: Session = Depends(get_db)):
+def update_contact(contact_id: int, updates: dict):
     """Actualizar contacto."""
     
-    contact = db.query(Contact).filter(Contact.id == contact_id).first()
-    if not contact:
-        raise HTTPException(status_code=404, detail="Contact not found")
-    
-    for key, value in updates.items():
-        if hasattr(contact, key):
-            setattr(contact, key, value)
-    
-    contact.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(contact)
+    def update(db: Session):
+        contact = db.query(Contact).filter(Contact.id == contact_id).first()
+        if not contact:
+            raise HTTPException(status_code=404, detail="Contact not found")
+        
+        for key, value in updates.items():
+            if hasattr(contact, key):
+                setattr(contact, key, value)
+        
+        contact.updated_at = datetime.utcnow()
+        db.flush()
+        return contact
     
-    return {"success": True, "contact": contact}
+    return {"success": True, "contact": db_writer.call(update)}
 
 @router.delete("/crm/contacts/{contact_id}")
-def delete_contact(contact_id: int, db: Session = Depends(get_db)):
+def delete_contact(contact_id: int):
     """Eliminar contacto."""
     
-    contact = db.query(Contact).filter(Contact.id == contact_id).first()
-    if not contact:
-        raise HTTPException(status_code=404, detail="Contact not found")
+    def delete(db: Session):
+        contact = db.query(Contact).filter(Contact.id == contact_id).first()
+        if not contact:
+            raise HTTPException(status_code=404, detail="Contact not found")
+        
+        db.delete(contact)
     
-    db.delete(contact)
-    db.commit()
+    db_writer.call(delete)
     
     return {"success": True, "message": "Contact deleted"}
 
@@ -195,49 +201,51 @@ def get_leads(
     return leads
 
 @router.post("/crm/leads")
-def create_lead(lead: LeadCreate, db: Session = Depends(get_db)):
+def create_lead(lead: LeadCreate):
     """Crear nuevo lead."""
     
-    # Verificar que el contacto existe
-    contact = db.query(Contact).filter(Contact.id == lead.contact_id).first()
-    if not contact:
-        raise HTTPException(status_code=404, detail="Contact not found")
-    
-    db_lead = Lead(**lead.dict())
-    db.add(db_lead)
-    
-    # Actualizar tipo de contacto
-    contact.contact_type = "lead"
-    contact.last_contact_date = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(db_lead)
+    def create(db: Session):
+        # Verificar que el contacto existe
+        contact = db.query(Contact).filter(Contact.id == lead.contact_id).first()
+        if not contact:
+            raise HTTPException(status_code=404, detail="Contact not found")
+        
+        db_lead = Lead(**lead.dict())
+        db.add(db_lead)
+        
+        # Actualizar tipo de contacto
+        contact.contact_type = "lead"
+        contact.last_contact_date = datetime.utcnow()
+        
+        db.flush()
+        return db_lead
     
-    return db_lead
+    return db_writer.call(create)
 
 @router.put("/crm/leads/{lead_id}/stage")
-def update_lead_stage(lead_id: int, stage: str, db: Session = Depends(get_db)):
+def update_lead_stage(lead_id: int, stage: str):
     """Actualizar stage del lead (para pipeline)."""
     
-    lead = db.query(Lead).filter(Lead.id == lead_id).first()
-    if not lead:
-        raise HTTPException(status_code=404, detail="Lead not found")
-    
-    lead.stage = stage
-    lead.updated_at = datetime.utcnow()
-    
-    # Si el stage es won, marcar como customer
-    if stage == "won":
-        lead.status = "won"
-        lead.closed_at = datetime.utcnow()
-        contact = db.query(Contact).filter(Contact.id == lead.contact_id).first()
-        if contact:
-            contact.contact_type = "customer"
-    
-    db.commit()
-    db.refresh(lead)
+    def update(db: Session):
+        lead = db.query(Lead).filter(Lead.id == lead_id).first()
+        if not lead:
+            raise HTTPException(status_code=404, detail="Lead not found")
+        
+        lead.stage = stage
+        lead.updated_at = datetime.utcnow()
+        
+        # Si el stage es won, marcar como customer
+        if stage == "won":
+            lead.status = "won"
+            lead.closed_at = datetime.utcnow()
+            contact = db.query(Contact).filter(Contact.id == lead.contact_id).first()
+            if contact:
+                contact.contact_type = "customer"
+        
+        db.flush()
+        return lead
     
-    return lead
+    return db_writer.call(update)
 
 @router.get("/crm/pipeline")
 def get_pipeline(db: Session = Depends(get_db)):
@@ -300,19 +308,20 @@ def get_opportunities(
     return opportunities
 
 @router.post("/crm/opportunities")
-def create_opportunity(opportunity: OpportunityCreate, db: Session = Depends(get_db)):
+def create_opportunity(opportunity: OpportunityCreate):
     """Crear nueva oportunidad."""
     
-    contact = db.query(Contact).filter(Contact.id == opportunity.contact_id).first()
-    if not contact:
-        raise HTTPException(status_code=404, detail="Contact not found")
-    
-    db_opportunity = Opportunity(**opportunity.dict())
-    db.add(db_opportunity)
-    db.commit()
-    db.refresh(db_opportunity)
+    def create(db: Session):
+        contact = db.query(Contact).filter(Contact.id == opportunity.contact_id).first()
+        if not contact:
+            raise HTTPException(status_code=404, detail="Contact not found")
+        
+        db_opportunity = Opportunity(**opportunity.dict())
+        db.add(db_opportunity)
+        db.flush()
+        return db_opportunity
     
-    return db_opportunity
+    return db_writer.call(create)
 
 # ============================================
 # INTERACTIONS ENDPOINTS
@@ -341,46 +350,49 @@ def get_interactions(
     return interactions
 
 @router.post("/crm/interactions")
-def create_interaction(interaction: InteractionCreate, db: Session = Depends(get_db)):
+def create_interaction(interaction: InteractionCreate):
     """Registrar nueva interacción."""
     
-    contact = db.query(Contact).filter(Contact.id == interaction.contact_id).first()
-    if not contact:
-        raise HTTPException(status_code=404, detail="Contact not found")
-    
-    db_interaction = Interaction(**interaction.dict())
-    db.add(db_interaction)
-    
-    # Actualizar última fecha de contacto
-    contact.last_contact_date = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(db_interaction)
+    def create(db: Session):
+        contact = db.query(Contact).filter(Contact.id == interaction.contact_id).first()
+        if not contact:
+            raise HTTPException(status_code=404, detail="Contact not found")
+        
+        db_interaction = Interaction(**interaction.dict())
+        db.add(db_interaction)
+        
+        # Actualizar última fecha de contacto
+        contact.last_contact_date = datetime.utcnow()
+        
+        db.flush()
+        return db_interaction
     
-    return db_interaction
+    return db_writer.call(create)
 
 # ============================================
 # DEMO SESSIONS ENDPOINTS
 # ============================================
 
 @router.post("/crm/demo/start")
-def start_demo_session(demo: DemoSessionCreate, db: Session = Depends(get_db)):
+def start_demo_session(demo: DemoSessionCreate):
     """Iniciar nueva sesión de demo."""
     
     import uuid
     
-    session = DemoSession(
-        session_id=str(uuid.uuid4()),
-        rubro=demo.rubro,
-        visitor_name=demo.visitor_name,
-        visitor_email=demo.visitor_email,
-        visitor_phone=demo.visitor_phone,
-        visitor_company=demo.visitor_company
-    )
+    def create(db: Session):
+        session = DemoSession(
+            session_id=str(uuid.uuid4()),
+            rubro=demo.rubro,
+            visitor_name=demo.visitor_name,
+            visitor_email=demo.visitor_email,
+            visitor_phone=demo.visitor_phone,
+            visitor_company=demo.visitor_company
+        )
+        db.add(session)
+        db.flush()
+        return session
     
-    db.add(session)
-    db.commit()
-    db.refresh(session)
+    session = db_writer.call(create)
     
     return {
         "success": True,
@@ -392,78 +404,80 @@ def start_demo_session(demo: DemoSessionCreate, db: Session = Depends(get_db)):
 def update_demo_activity(
     session_id: str,
     pages_viewed: int = 0,
-    features_tested: List[str] = [],
-    db: Session = Depends(get_db)
+    features_tested: List[str] = []
 ):
     """Actualizar actividad de la sesión de demo."""
     
-    session = db.query(DemoSession).filter(DemoSession.session_id == session_id).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Demo session not found")
-    
-    session.pages_viewed += pages_viewed
-    session.features_tested = list(set(session.features_tested + features_tested))
-    session.interactions_count += 1
+    def update(db: Session):
+        session = db.query(DemoSession).filter(DemoSession.session_id == session_id).first()
+        if not session:
+            raise HTTPException(status_code=404, detail="Demo session not found")
+        
+        session.pages_viewed += pages_viewed
+        session.features_tested = list(set(session.features_tested + features_tested))
+        session.interactions_count += 1
     
-    db.commit()
+    db_writer.call(update)
     
     return {"success": True}
 
 @router.post("/crm/demo/{session_id}/convert")
 def convert_demo_to_lead(
     session_id: str,
-    visitor_data: dict,
-    db: Session = Depends(get_db)
+    visitor_data: dict
 ):
     """Convertir sesión de demo en lead."""
     
-    session = db.query(DemoSession).filter(DemoSession.session_id == session_id).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Demo session not found")
-    
-    # Crear o actualizar contacto
-    email = visitor_data.get("email") or session.visitor_email
-    existing_contact = db.query(Contact).filter(Contact.email == email).first()
-    
-    if existing_contact:
-        contact = existing_contact
-    else:
-        contact = Contact(
-            first_name=visitor_data.get("first_name", session.visitor_name or "Demo"),
-            last_name=visitor_data.get("last_name", "User"),
-            email=email,
-            phone=visitor_data.get("phone", session.visitor_phone),
-            company=visitor_data.get("company", session.visitor_company),
-            industry=session.rubro,
-            source="demo",
-            contact_type="lead"
+    def convert(db: Session):
+        session = db.query(DemoSession).filter(DemoSession.session_id == session_id).first()
+        if not session:
+            raise HTTPException(status_code=404, detail="Demo session not found")
+        
+        # Crear o actualizar contacto
+        email = visitor_data.get("email") or session.visitor_email
+        existing_contact = db.query(Contact).filter(Contact.email == email).first()
+        
+        if existing_contact:
+            contact = existing_contact
+        else:
+            contact = Contact(
+                first_name=visitor_data.get("first_name", session.visitor_name or "Demo"),
+                last_name=visitor_data.get("last_name", "User"),
+                email=email,
+                phone=visitor_data.get("phone", session.visitor_phone),
+                company=visitor_data.get("company", session.visitor_company),
+                industry=session.rubro,
+                source="demo",
+                contact_type="lead"
+            )
+            db.add(contact)
+            db.flush()
+        
+        # Crear lead
+        lead = Lead(
+            contact_id=contact.id,
+            title=f"Interesado en {session.rubro} desde demo",
+            description=f"Generado desde sesión de demo. Engagement: {session.interactions_count} interacciones",
+            stage="demo",
+            source=f"demo_{session.rubro}",
+            estimated_value=visitor_data.get("estimated_value", 0)
         )
-        db.add(contact)
+        db.add(lead)
         db.flush()
-    
-    # Crear lead
-    lead = Lead(
-        contact_id=contact.id,
-        title=f"Interesado en {session.rubro} desde demo",
-        description=f"Generado desde sesión de demo. Engagement: {session.interactions_count} interacciones",
-        stage="demo",
-        source=f"demo_{session.rubro}",
-        estimated_value=visitor_data.get("estimated_value", 0)
-    )
-    db.add(lead)
-    db.flush()
-    
-    # Actualizar sesión
-    session.converted_to_lead = True
-    session.lead_id = lead.id
-    session.interest_level = visitor_data.get("interest_level", "medium")
-    
-    db.commit()
+        
+        # Actualizar sesión
+        session.converted_to_lead = True
+        session.lead_id = lead.id
+        session.interest_level = visitor_data.get("interest_level", "medium")
+        
+        return contact.id, lead.id
+        
+    contact_id, lead_id = db_writer.call(convert)
     
     return {
         "success": True,
-        "contact_id": contact.id,
-        "lead_id": lead.id,
+        "contact_id": contact_id,
+        "lead_id": lead_id,
         "message": "Demo convertido exitosamente a lead"
     }
 
@@ -11,13 +11,13 @@ from datetime import datetime, timedelta
 from typing import Optional
 from io import BytesIO
 
-from ..database import SessionLocal
-from ..services.report_generator import ReportGenerator
+from database import ReadSessionLocal
+from services.report_generator import ReportGenerator
 
 router = APIRouter()
 
 def get_db():
-    db = SessionLocal()
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
@@ -6,30 +6,127 @@ Supports both SQLite (simulation) and SQL Server (production).
 """
 
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Float, Boolean,
-    DateTime, Text, ForeignKey, JSON, Enum as SQLEnum
+    create_engine, event, inspect, text, insert, select, union_all, false,
+    Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, JSON,
+    Enum as SQLEnum, UniqueConstraint, Index, MetaData, Table
 )
+from sqlalchemy.engine import Connection, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from datetime import datetime
-from typing import Optional, Dict, Any
+from sqlalchemy.orm import Session, sessionmaker, relationship, aliased
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateSchema
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, Iterable, List, Tuple, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
 import enum
 
-from config import DATABASE_URL
+from config import (
+    DATABASE_URL, DB_THREAD_POOL_SIZE, SQLITE_PROFILE, SQLITE_PROFILES,
+    TELEMETRY_SCHEMA, TELEMETRY_DATABASE_PATH, TELEMETRY_SQLITE_PROFILE, SENSOR_DATA_PARTITION
+)
 
 # ============================================
 # DATABASE SETUP
 # ============================================
+def pool_options(url: str) -> Dict[str, Any]:
+    """
+    Pool sizing for `create_engine`.
+
+    Only a QueuePool takes `pool_size` / `max_overflow`; SQLite `:memory:`
+    URLs default to a SingletonThreadPool, which rejects them.
+    """
+    url = make_url(url)
+    if not issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        return {}
+    return {"pool_size": DB_THREAD_POOL_SIZE, "max_overflow": DB_THREAD_POOL_SIZE}
+
+
 engine = create_engine(
     DATABASE_URL,
     echo=False,  # Set to True for SQL debugging
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
+    **pool_options(DATABASE_URL)
 )
 
+
+
+def sqlite_pragmas(profile: str) -> Dict[str, Any]:
+    """PRAGMA settings of a storage profile (see config.SQLITE_PROFILES)."""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile: {profile} (expected one of {', '.join(SQLITE_PROFILES)})")
+    return SQLITE_PROFILES[profile]
+
+
+def apply_sqlite_profile(dbapi_connection, profile: str = SQLITE_PROFILE, schema: str = "main"):
+    """Apply a storage profile to one database of a raw sqlite3 connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in sqlite_pragmas(profile).items():
+            cursor.execute(f"PRAGMA {schema}.{pragma}={value}")
+    finally:
+        cursor.close()
+
+
+def telemetry_database_path() -> str:
+    """SQLite file holding the time-series tables (next to the main database by default)."""
+    if TELEMETRY_DATABASE_PATH:
+        return TELEMETRY_DATABASE_PATH
+    database = engine.url.database
+    if database in (None, "", ":memory:"):
+        return ":memory:"
+    path = Path(database)
+    return str(path.with_name(f"{path.stem}_telemetry{path.suffix}"))
+
+
+def prepare_sqlite_connection(dbapi_connection):
+    """Attach the telemetry database and apply both storage profiles."""
+    dbapi_connection.execute(f"ATTACH DATABASE ? AS {TELEMETRY_SCHEMA}", (telemetry_database_path(),))
+    apply_sqlite_profile(dbapi_connection)
+    apply_sqlite_profile(dbapi_connection, TELEMETRY_SQLITE_PROFILE, schema=TELEMETRY_SCHEMA)
+
+
+if engine.dialect.name == "sqlite":
+    # Fail fast on a misconfigured profile
+    sqlite_pragmas(SQLITE_PROFILE)
+    sqlite_pragmas(TELEMETRY_SQLITE_PROFILE)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        prepare_sqlite_connection(dbapi_connection)
+
+# Read-only connections for queries. Writes go through the single writer
+# (services.db_writer), so readers never wait on or take the write lock.
+if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+    read_engine = create_engine(
+        DATABASE_URL,
+        echo=False,
+        connect_args={"check_same_thread": False},
+        **pool_options(DATABASE_URL)
+    )
+
+    @event.listens_for(read_engine, "connect")
+    def _on_read_connect(dbapi_connection, connection_record):
+        prepare_sqlite_connection(dbapi_connection)
+        dbapi_connection.execute("PRAGMA query_only=ON")
+else:
+    read_engine = engine
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
 
+@event.listens_for(Base.metadata, "before_create")
+def _create_telemetry_schema(target, connection, **kw):
+    """SQL Server needs the telemetry schema before its tables (SQLite attaches a file)."""
+    if connection.dialect.name != "sqlite" and not inspect(connection).has_schema(TELEMETRY_SCHEMA):
+        connection.execute(CreateSchema(TELEMETRY_SCHEMA))
+
+
 # ============================================
 # ENUMS
 # ============================================
@@ -113,13 +210,15 @@ class Device(Base):
     
     # Relationships
     owner = relationship("User", back_populates="devices")
-    data_points = relationship("SensorData", back_populates="device", cascade="all, delete-orphan")
+    data_points = relationship("SensorData", back_populates="device", viewonly=True)  # see delete_device_readings()
+    rollups = relationship("SensorRollup", back_populates="device", cascade="all, delete-orphan")
     alerts = relationship("Alert", back_populates="device", cascade="all, delete-orphan")
 
 
 class SensorData(Base):
     """Time-series sensor readings."""
     __tablename__ = "sensor_data"
+    __table_args__ = {"schema": TELEMETRY_SCHEMA}
     
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("devices.id"), nullable=False, index=True)
@@ -135,7 +234,36 @@ class SensorData(Base):
     metadata = Column(JSON)  # Additional context
     
     # Relationships
-    device = relationship("Device", back_populates="data_points")
+    device = relationship("Device", back_populates="data_points", viewonly=True)
+
+
+class SensorRollup(Base):
+    """Pre-aggregated sensor readings per device and time bucket (1m, 1h, 1d)."""
+    __tablename__ = "sensor_rollups"
+    __table_args__ = (
+        UniqueConstraint("device_id", "resolution", "bucket_start", name="uq_rollup_bucket"),
+        {"schema": TELEMETRY_SCHEMA}
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=False, index=True)
+    resolution = Column(String(4), nullable=False)  # 1m, 1h, 1d
+    bucket_start = Column(DateTime, nullable=False, index=True)
+    
+    # Aggregates
+    count = Column(Integer, nullable=False, default=0)
+    min_value = Column(Float)
+    max_value = Column(Float)
+    sum_value = Column(Float, default=0.0)
+    sum_squares = Column(Float, default=0.0)
+    quality_sum = Column(Float, default=0.0)
+    
+    # First/last reading inside the bucket
+    first_at = Column(DateTime)
+    last_at = Column(DateTime)
+    
+    # Relationships
+    device = relationship("Device", back_populates="rollups")
 
 
 class Rule(Base):
@@ -171,6 +299,7 @@ class Rule(Base):
 class Alert(Base):
     """System alerts and notifications."""
     __tablename__ = "alerts"
+    __table_args__ = {"schema": TELEMETRY_SCHEMA}
     
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("devices.id"), index=True)
@@ -272,6 +401,7 @@ class Transaction(Base):
 class SystemLog(Base):
     """System event logs."""
     __tablename__ = "system_logs"
+    __table_args__ = {"schema": TELEMETRY_SCHEMA}
     
     id = Column(Integer, primary_key=True, index=True)
     level = Column(String(20), nullable=False)  # DEBUG, INFO, WARNING, ERROR
@@ -281,6 +411,368 @@ class SystemLog(Base):
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
 
 
+class ArchiveSegment(Base):
+    """
+    Manifest entry for one Parquet file of archived telemetry rows.
+
+    Kept in the telemetry schema so the entry and the deletion of its rows
+    commit atomically (SQLite WAL transactions are atomic per file only).
+    """
+    __tablename__ = "archive_segments"
+    __table_args__ = {"schema": TELEMETRY_SCHEMA}
+    
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String(50), nullable=False, index=True)
+    rubro = Column(String(50))  # None = policy for every rubro
+    resolution = Column(String(4))  # sensor_rollups only
+    path = Column(String(500), nullable=False)  # Relative to ARCHIVE_DIR
+    
+    # Archived range
+    row_count = Column(Integer, nullable=False)
+    start_at = Column(DateTime, nullable=False, index=True)
+    end_at = Column(DateTime, nullable=False, index=True)
+    min_id = Column(Integer)
+    max_id = Column(Integer)
+    size_bytes = Column(Integer)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# ============================================
+# SENSOR DATA PARTITIONS
+# ============================================
+# On SQLite, readings are stored in one table per period in the telemetry
+# database (sensor_data_YYYYMM, or sensor_data_YYYYMMDD with daily
+# partitions) and `sensor_data` is a UNION ALL view over all of them, so
+# every query on `SensorData` keeps working. Time-bounded reads use
+# `sensor_data_between()` to touch only the partitions overlapping their
+# window, writes go through `insert_readings()` and retention drops whole
+# partitions (`drop_partitions_before()`). Each partition draws ids from
+# its own range (`partition_id_offset()`) so ids stay unique in the view.
+# Other databases keep a single `sensor_data` table.
+PARTITIONED = engine.dialect.name == "sqlite"
+PARTITION_PREFIX = "sensor_data_"
+PARTITION_ID_SPAN = 10 ** 10  # Max rows per partition (and per day)
+MAX_SAFE_ID = 2 ** 53  # Larger ids lose precision as JSON numbers in JavaScript
+_COMPOUND_SELECT_LIMIT = 400  # SQLite allows 500 terms per UNION ALL
+_partition_metadata = MetaData()
+_known_partitions: set = set()  # Partitions known to exist; cleared on rollback and drops
+_partition_entities: Dict[Tuple[str, ...], Any] = {}  # sensor_data_between() aliases by partition keys
+
+if SENSOR_DATA_PARTITION not in ("day", "month"):
+    raise ValueError(f"SENSOR_DATA_PARTITION must be 'day' or 'month', not {SENSOR_DATA_PARTITION!r}")
+
+
+def partition_key(timestamp: datetime) -> str:
+    """Partition holding readings taken at `timestamp`."""
+    return timestamp.strftime("%Y%m%d" if SENSOR_DATA_PARTITION == "day" else "%Y%m")
+
+
+def partition_bounds(key: str) -> Tuple[datetime, datetime]:
+    """[start, end) covered by a partition (daily or monthly, from the key length)."""
+    if len(key) == 8:
+        start = datetime.strptime(key, "%Y%m%d")
+        return start, start + timedelta(days=1)
+    start = datetime.strptime(key, "%Y%m")
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+def partition_table(key: str) -> Table:
+    """Table object of one partition (columns mirror `SensorData`)."""
+    name = PARTITION_PREFIX + key
+    table = _partition_metadata.tables.get(f"{TELEMETRY_SCHEMA}.{name}")
+    if table is None:
+        columns = [
+            Column(
+                column.name, column.type, primary_key=column.primary_key, nullable=column.nullable,
+                default=column.default.arg if column.default is not None else None
+            )
+            for column in SensorData.__table__.columns
+        ]
+        table = Table(
+            name, _partition_metadata, *columns,
+            Index(f"ix_{name}_device_timestamp", "device_id", "timestamp"),
+            Index(f"ix_{name}_timestamp", "timestamp"),
+            schema=TELEMETRY_SCHEMA,
+            sqlite_autoincrement=True
+        )
+    return table
+
+
+def list_partitions(conn: Connection) -> List[str]:
+    """Keys of the existing partitions, oldest first."""
+    rows = conn.execute(text(
+        f"SELECT name FROM {TELEMETRY_SCHEMA}.sqlite_master "
+        f"WHERE type = 'table' AND name GLOB '{PARTITION_PREFIX}[0-9]*'"
+    ))
+    return sorted((name[len(PARTITION_PREFIX):] for (name,) in rows), key=partition_bounds)
+
+
+def _partitions_between(keys: Iterable[str], start: Optional[datetime], end: Optional[datetime]) -> List[str]:
+    """Partitions overlapping [start, end] (either bound may be open)."""
+    overlapping = []
+    for key in keys:
+        lower, upper = partition_bounds(key)
+        if (start is None or upper > start) and (end is None or lower <= end):
+            overlapping.append(key)
+    return overlapping
+
+
+def partition_id_offset(key: str) -> int:
+    """
+    Id after which a partition's ids start: its first day, counted from
+    1970-01-01, times PARTITION_ID_SPAN.
+
+    Daily and monthly partitions never overlap, and ids stay below
+    MAX_SAFE_ID until the year 4436.
+    """
+    return (partition_bounds(key)[0] - datetime(1970, 1, 1)).days * PARTITION_ID_SPAN
+
+
+def _create_partition(conn: Connection, key: str):
+    offset = partition_id_offset(key)
+    if offset + PARTITION_ID_SPAN > MAX_SAFE_ID:
+        raise ValueError(f"Partition {key} is too far in the future for JSON-safe ids")
+    table = partition_table(key)
+    table.create(conn)
+    conn.execute(
+        text(f"INSERT INTO {TELEMETRY_SCHEMA}.sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+        {"name": table.name, "seq": offset}
+    )
+
+
+def _union(selects: List[str]) -> str:
+    if len(selects) <= _COMPOUND_SELECT_LIMIT:
+        return " UNION ALL ".join(selects)
+    chunks = [selects[i:i + _COMPOUND_SELECT_LIMIT] for i in range(0, len(selects), _COMPOUND_SELECT_LIMIT)]
+    return " UNION ALL ".join(f"SELECT * FROM ({_union(chunk)})" for chunk in chunks)
+
+
+def _rebuild_view(conn: Connection, keys: Iterable[str]):
+    # Unqualified names: a view resolves them inside its own database file
+    columns = ", ".join(f'"{column.name}"' for column in SensorData.__table__.columns)
+    selects = [f"SELECT {columns} FROM {PARTITION_PREFIX}{key}" for key in sorted(keys, key=partition_bounds)]
+    conn.execute(text(f"DROP VIEW IF EXISTS {TELEMETRY_SCHEMA}.sensor_data"))
+    conn.execute(text(f"CREATE VIEW {TELEMETRY_SCHEMA}.sensor_data AS {_union(selects)}"))
+
+
+def ensure_partitions(conn: Connection, keys: Iterable[str]) -> List[str]:
+    """Create missing partitions (and refresh the view); returns the keys created."""
+    keys = set(keys)
+    if keys <= _known_partitions:
+        return []
+    existing = set(list_partitions(conn))
+    missing = sorted(keys - existing, key=partition_bounds)
+    if missing:
+        for key in missing:
+            _create_partition(conn, key)
+        _rebuild_view(conn, existing | set(missing))
+    _known_partitions.update(existing, missing)
+    return missing
+
+
+@event.listens_for(engine, "rollback")
+def _forget_partitions(conn):
+    # Partitions created by the rolled-back transaction no longer exist
+    _known_partitions.clear()
+
+
+def _absorb_table(conn: Connection, source: str):
+    """Move the rows of an unpartitioned `sensor_data` table into partitions and drop it."""
+    columns = ", ".join(f'"{column.name}"' for column in SensorData.__table__.columns)
+    fmt = "%Y%m%d" if SENSOR_DATA_PARTITION == "day" else "%Y%m"
+    keys = [key for (key,) in conn.execute(text(
+        f"SELECT DISTINCT strftime('{fmt}', timestamp) FROM {source} WHERE timestamp IS NOT NULL"
+    ))]
+    current = partition_key(datetime.utcnow())
+    existing = set(list_partitions(conn))
+    for key in sorted(set(keys + [current]) - existing, key=partition_bounds):
+        _create_partition(conn, key)
+
+    for key in keys:
+        start, end = partition_bounds(key)
+        conn.execute(text(
+            f"INSERT OR IGNORE INTO {TELEMETRY_SCHEMA}.{PARTITION_PREFIX}{key} ({columns}) "
+            f"SELECT {columns} FROM {source} WHERE timestamp >= :start AND timestamp < :end"
+        ), {"start": start.strftime("%Y-%m-%d %H:%M:%S"), "end": end.strftime("%Y-%m-%d %H:%M:%S")})
+    conn.execute(text(
+        f"INSERT OR IGNORE INTO {TELEMETRY_SCHEMA}.{PARTITION_PREFIX}{current} ({columns}) "
+        f"SELECT {columns} FROM {source} WHERE timestamp IS NULL"
+    ))
+    conn.execute(text(f"DROP TABLE {source}"))
+    _rebuild_view(conn, list_partitions(conn))
+
+
+def setup_partitions(conn: Connection):
+    """Turn `sensor_data` into the partition view (moving any rows it holds)."""
+    kind = conn.execute(text(
+        f"SELECT type FROM {TELEMETRY_SCHEMA}.sqlite_master WHERE name = 'sensor_data'"
+    )).scalar()
+    if kind == "table":
+        _absorb_table(conn, f"{TELEMETRY_SCHEMA}.sensor_data")
+    elif not ensure_partitions(conn, [partition_key(datetime.utcnow())]) and kind is None:
+        _rebuild_view(conn, list_partitions(conn))
+
+
+@event.listens_for(SensorData.__table__, "after_create")
+def _partition_sensor_data(target, connection, **kw):
+    if PARTITIONED:
+        setup_partitions(connection)
+
+
+def sensor_data_between(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    `SensorData` restricted to the partitions overlapping [start, end].
+
+    Returns an entity usable exactly like `SensorData` in queries
+    (`P = sensor_data_between(db, since); db.query(P.value).filter(P.device_id == pk)`).
+    It only prunes partitions; callers still filter on `timestamp`.
+    """
+    if not PARTITIONED:
+        return SensorData
+    partitions = list_partitions(db.connection())
+    keys = _partitions_between(partitions, start, end)
+    if len(keys) == len(partitions) or len(keys) > _COMPOUND_SELECT_LIMIT:
+        return SensorData  # Nothing to prune (the view also handles unions of any size)
+    return _partition_entity(tuple(keys))
+
+
+def _partition_entity(keys: Tuple[str, ...]):
+    # Reusing the alias lets SQLAlchemy reuse its compiled statements
+    entity = _partition_entities.get(keys)
+    if entity is None:
+        if not keys:
+            selectable = select(SensorData.__table__).where(false()).subquery("sensor_data")
+        elif len(keys) == 1:
+            selectable = partition_table(keys[0])
+        else:
+            selectable = union_all(*(select(*partition_table(key).c) for key in keys)).subquery("sensor_data")
+        entity = _partition_entities[keys] = aliased(SensorData, selectable, adapt_on_names=True)
+    return entity
+
+
+def latest_readings(db: Session, device_pk: int, limit: int, since: Optional[datetime] = None) -> List[SensorData]:
+    """
+    Newest readings of one device (newest first), reading partitions from
+    the most recent backwards and stopping once `limit` rows are certain.
+    """
+    if not PARTITIONED:
+        query = db.query(SensorData).filter(SensorData.device_id == device_pk)
+        if since is not None:
+            query = query.filter(SensorData.timestamp >= since)
+        return query.order_by(SensorData.timestamp.desc()).limit(limit).all()
+
+    keys = sorted(
+        _partitions_between(list_partitions(db.connection()), since, None),
+        key=lambda key: partition_bounds(key)[1], reverse=True
+    )
+    rows: List[SensorData] = []
+    for key in keys:
+        if len(rows) >= limit and partition_bounds(key)[1] <= (rows[limit - 1].timestamp or datetime.min):
+            break
+        partition = _partition_entity((key,))
+        query = db.query(partition).filter(partition.device_id == device_pk)
+        if since is not None:
+            query = query.filter(partition.timestamp >= since)
+        rows.extend(query.order_by(partition.timestamp.desc()).limit(limit).all())
+        rows.sort(key=lambda row: row.timestamp or datetime.min, reverse=True)
+    return rows[:limit]
+
+
+def insert_readings(db: Session, rows: List[Dict[str, Any]]):
+    """Insert reading dicts (`SensorData` columns), routing each to its partition."""
+    if not PARTITIONED:
+        db.execute(insert(SensorData), rows)
+        return
+
+    grouped: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        if row.get("timestamp") is None:
+            row = {**row, "timestamp": datetime.utcnow()}
+        grouped[partition_key(row["timestamp"])].append(row)
+
+    ensure_partitions(db.connection(), grouped)
+    for key, partition_rows in grouped.items():
+        db.execute(insert(partition_table(key)), partition_rows)
+
+
+def delete_device_readings(db: Session, device_pk: int) -> int:
+    """Delete every reading of a device (all partitions)."""
+    if not PARTITIONED:
+        return db.query(SensorData).filter(SensorData.device_id == device_pk).delete(synchronize_session=False)
+
+    deleted = 0
+    for key in list_partitions(db.connection()):
+        table = partition_table(key)
+        deleted += db.execute(table.delete().where(table.c.device_id == device_pk)).rowcount
+    return deleted
+
+
+def drop_partitions_before(db: Session, cutoff: datetime, keys: Optional[List[str]] = None) -> List[str]:
+    """
+    Drop every partition that ends at or before `cutoff` (only among
+    `keys` when given).
+
+    Whole tables are dropped, so the cost does not depend on the number of
+    rows. The partition of the current period is always kept. Without
+    partitioning (SQL Server) the rows are deleted instead.
+    """
+    if not PARTITIONED:
+        db.query(SensorData).filter(SensorData.timestamp < cutoff).delete(synchronize_session=False)
+        return []
+
+    conn = db.connection()
+    existing = list_partitions(conn)
+    current = partition_key(datetime.utcnow())
+    expired = [
+        key for key in (existing if keys is None else keys)
+        if key in existing and partition_bounds(key)[1] <= cutoff and key != current
+    ]
+    if expired:
+        _known_partitions.clear()
+        for key in expired:
+            partition_table(key).drop(conn)
+            conn.execute(
+                text(f"DELETE FROM {TELEMETRY_SCHEMA}.sqlite_sequence WHERE name = :name"),
+                {"name": PARTITION_PREFIX + key}
+            )
+        remaining = [key for key in existing if key not in expired]
+        ensure_partitions(conn, [current]) or _rebuild_view(conn, remaining)
+    return expired
+
+
+def partition_tables(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Table]:
+    """Tables holding the readings of [start, end], oldest first (the single table without partitions)."""
+    if not PARTITIONED:
+        return [SensorData.__table__]
+    return [partition_table(key) for key in _partitions_between(list_partitions(db.connection()), start, end)]
+
+
+def maintain_partitions(db: Session) -> List[str]:
+    """
+    Create the current and next period's partitions and drop past
+    partitions left empty by retention; returns the keys dropped.
+    """
+    if not PARTITIONED:
+        return []
+
+    conn = db.connection()
+    current = partition_key(datetime.utcnow())
+    ensure_partitions(conn, [current, partition_key(partition_bounds(current)[1])])
+
+    now = datetime.utcnow()
+    empty = [
+        key for key in list_partitions(conn)
+        if partition_bounds(key)[1] <= now
+        and conn.execute(select(partition_table(key).c.id).limit(1)).first() is None
+    ]
+    if empty:
+        return drop_partitions_before(db, partition_bounds(empty[-1])[1], keys=empty)
+    return []
+
+
 # ============================================
 # DATABASE UTILITIES
 # ============================================
@@ -293,12 +785,66 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    """Dependency for FastAPI to get a read-only database session."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+T = TypeVar("T")
+
+# Bounded pool for blocking DB calls made from async code. Keeps queries
+# off the event loop without letting them exhaust the connection pool.
+db_executor = ThreadPoolExecutor(max_workers=DB_THREAD_POOL_SIZE, thread_name_prefix="db")
+
+
+async def run_db(fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run a blocking database callable on the DB thread pool.
+
+    A session must only be used by one thread at a time; pass it to the
+    callable and do not touch it from the event loop while awaiting.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(fn, *args, **kwargs))
+
+
 def init_database():
     """Initialize database tables."""
     Base.metadata.create_all(bind=engine)
+    migrate_telemetry_tables()
     print("✓ Database tables created successfully")
 
 
+def migrate_telemetry_tables():
+    """
+    Move time-series tables created before the telemetry split out of the
+    main SQLite file. Re-running after an interruption is safe: rows that
+    were already copied are skipped.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        legacy = set(inspect(conn).get_table_names(schema="main"))
+        for table in Base.metadata.sorted_tables:
+            if table.schema != TELEMETRY_SCHEMA or table.name not in legacy:
+                continue
+            if table is SensorData.__table__ and PARTITIONED:
+                _absorb_table(conn, f"main.{table.name}")
+                print(f"✓ Moved {table.name} to the telemetry database")
+                continue
+            columns = ", ".join(f'"{column.name}"' for column in table.columns)
+            conn.exec_driver_sql(
+                f"INSERT OR IGNORE INTO {TELEMETRY_SCHEMA}.{table.name} ({columns}) "
+                f"SELECT {columns} FROM main.{table.name}"
+            )
+            conn.exec_driver_sql(f"DROP TABLE main.{table.name}")
+            print(f"✓ Moved {table.name} to the telemetry database")
+
+
 def seed_demo_data():
     """Seed database with demo data for testing."""
     from passlib.context import CryptContext
@@ -19,32 +19,45 @@ from loguru import logger
 # Local imports
 import config
 from database import (
-    get_db, init_database, seed_demo_data,
-    Device, SensorData, Rule, Alert, User,
-    DeviceStatus, AlertSeverity
+    get_read_db, run_db, init_database, seed_demo_data, SessionLocal, ReadSessionLocal,
+    Device, SensorData, SensorRollup, Rule, Alert, User,
+    DeviceStatus, AlertSeverity, latest_readings, delete_device_readings, maintain_partitions
 )
-from services.rules_engine import RulesEngine
+from services.rules_engine import RulesEngine, rule_index
+from services.ingest_buffer import ingest_buffer, IngestQueueFull
+from services.device_registry import device_registry
+from services.latest_values import latest_values
+from services.live_metrics import live_metrics
+from services.rollups import rebuild_rollups
+from services.realtime import manager, parse_topics, FORMAT_JSON
+from services.scenario_replay import scenario_replay, ReplayInProgress
+from services.db_writer import db_writer
+from services.retention import retention_engine
+from simulator.sensor_models import create_sensor
 
 # Import API routers
 try:
     from api.analytics import router as analytics_router
-except ImportError:
+except ImportError as e:  # Missing optional dependency
+    logger.warning(f"Analytics router disabled: {e}")
     analytics_router = None
 
 try:
     from api.reports import router as reports_router
-except ImportError:
+except ImportError as e:  # Missing optional dependency
+    logger.warning(f"Reports router disabled: {e}")
     reports_router = None
 
 try:
     from api.crm import router as crm_router
-except ImportError:
+except ImportError as e:  # Missing optional dependency
+    logger.warning(f"CRM router disabled: {e}")
     crm_router = None
 
 # Configure logging
 logger.add(
     config.LOG_FILE,
-    rotation=f"{config.LOG_MAX_BYTES} bytes",
+    rotation=config.LOG_MAX_BYTES,
     retention=config.LOG_BACKUP_COUNT,
     level=config.LOG_LEVEL
 )
@@ -70,6 +83,9 @@ class DeviceResponse(BaseModel):
     status: str
     last_seen: Optional[datetime]
     is_simulated: bool
+    last_value: Optional[float] = None
+    last_value_at: Optional[datetime] = None
+    last_quality: Optional[float] = None
     
     class Config:
         from_attributes = True
@@ -82,6 +98,10 @@ class SensorDataCreate(BaseModel):
     quality: float = 1.0
 
 
+class SensorDataBatch(BaseModel):
+    readings: List[SensorDataCreate]
+
+
 class SensorDataResponse(BaseModel):
     id: int
     device_id: int
@@ -164,39 +184,6 @@ if crm_router:
     app.include_router(crm_router, prefix="/api", tags=["crm"])
     logger.info("CRM router registered")
 
-# WebSocket connection manager
-class ConnectionManager:
-    """Manages WebSocket connections for real-time updates."""
-    
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"WebSocket connected. Total: {len(self.active_connections)}")
-    
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        logger.info(f"WebSocket disconnected. Total: {len(self.active_connections)}")
-    
-    async def broadcast(self, message: dict):
-        """Broadcast message to all connected clients."""
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to client: {e}")
-                disconnected.append(connection)
-        
-        # Remove disconnected clients
-        for conn in disconnected:
-            self.disconnect(conn)
-
-manager = ConnectionManager()
-
-
 # ============================================
 # STARTUP & SHUTDOWN EVENTS
 # ============================================
@@ -207,7 +194,27 @@ async def startup_event():
     init_database()
     seed_demo_data()
     
+    # Warm in-memory caches
+    db = SessionLocal()
+    try:
+        device_registry.load(db)
+        
+        # Backfill rollups for data that predates them
+        if not db.query(SensorRollup.id).first() and db.query(SensorData.id).first():
+            rebuild_rollups(db)
+        
+        live_metrics.reconcile(db, rule_index.pending_trigger_count)
+    finally:
+        db.close()
+    
     # Start background tasks
+    db_writer.start()
+    ingest_buffer.start()
+    manager.start()
+    asyncio.create_task(rule_stats_loop())
+    asyncio.create_task(live_metrics_loop())
+    asyncio.create_task(retention_loop())
+    
     if config.SIM_MODE:
         asyncio.create_task(simulation_loop())
     
@@ -217,6 +224,11 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown."""
+    await scenario_replay.stop()
+    await ingest_buffer.stop()
+    await manager.stop()
+    await db_writer.execute(persist_rule_stats)
+    await db_writer.stop()
     logger.info("System shutting down")
 
 
@@ -246,70 +258,87 @@ async def health_check():
 async def list_devices(
     rubro: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List all devices with optional filters."""
-    query = db.query(Device)
-    
-    if rubro:
-        query = query.filter(Device.rubro == rubro)
-    if status:
-        query = query.filter(Device.status == status)
+    def load():
+        query = db.query(Device)
+        
+        if rubro:
+            query = query.filter(Device.rubro == rubro)
+        if status:
+            query = query.filter(Device.status == status)
+        
+        return [DeviceResponse.model_validate(d) for d in query.all()]
     
-    devices = query.all()
-    return devices
+    devices = await run_db(load)
+    return [d.model_copy(update=latest_values.snapshot(d.id)) for d in devices]
 
 
 @app.post("/api/devices", response_model=DeviceResponse, status_code=status.HTTP_201_CREATED)
-async def create_device(device: DeviceCreate, db: Session = Depends(get_db)):
+async def create_device(device: DeviceCreate):
     """Register a new device."""
-    # Check if device already exists
-    existing = db.query(Device).filter(Device.device_id == device.device_id).first()
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Device with this ID already exists"
+    def create(db: Session):
+        # Check if device already exists
+        existing = db.query(Device).filter(Device.device_id == device.device_id).first()
+        if existing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Device with this ID already exists"
+            )
+        
+        db_device = Device(
+            device_id=device.device_id,
+            name=device.name,
+            device_type=device.device_type,
+            rubro=device.rubro,
+            location=device.location,
+            description=device.description,
+            config=device.config,
+            is_simulated=config.SIM_MODE,
+            status=DeviceStatus.ONLINE,
+            owner_id=1  # Default to first user (demo)
         )
+        
+        db.add(db_device)
+        db.flush()
+        return db_device
     
-    db_device = Device(
-        device_id=device.device_id,
-        name=device.name,
-        device_type=device.device_type,
-        rubro=device.rubro,
-        location=device.location,
-        description=device.description,
-        config=device.config,
-        is_simulated=config.SIM_MODE,
-        status=DeviceStatus.ONLINE,
-        owner_id=1  # Default to first user (demo)
-    )
-    
-    db.add(db_device)
-    db.commit()
-    db.refresh(db_device)
+    db_device = await db_writer.execute(create)
+    device_registry.put(db_device)
+    created = DeviceResponse.model_validate(db_device)
+    live_metrics.set_device_status(created.id, created.status)
     
     logger.info(f"Device created: {device.device_id}")
-    return db_device
+    return created
 
 
 @app.get("/api/devices/{device_id}", response_model=DeviceResponse)
-async def get_device(device_id: str, db: Session = Depends(get_db)):
+async def get_device(device_id: str, db: Session = Depends(get_read_db)):
     """Get device details."""
-    device = db.query(Device).filter(Device.device_id == device_id).first()
+    device = await run_db(lambda: db.query(Device).filter(Device.device_id == device_id).first())
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
-    return device
+    return DeviceResponse.model_validate(device).model_copy(update=latest_values.snapshot(device.id))
 
 
 @app.delete("/api/devices/{device_id}")
-async def delete_device(device_id: str, db: Session = Depends(get_db)):
+async def delete_device(device_id: str):
     """Delete a device."""
-    device = db.query(Device).filter(Device.device_id == device_id).first()
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
+    def delete(db: Session):
+        device = db.query(Device).filter(Device.device_id == device_id).first()
+        if not device:
+            raise HTTPException(status_code=404, detail="Device not found")
+        
+        device_pk = device.id
+        delete_device_readings(db, device_pk)
+        db.delete(device)
+        return device_pk
     
-    db.delete(device)
-    db.commit()
+    device_pk = await db_writer.execute(delete)
+    device_registry.invalidate(device_id)
+    latest_values.discard(device_pk)
+    live_metrics.invalidate()  # cascaded alerts/readings
     
     logger.info(f"Device deleted: {device_id}")
     return {"message": "Device deleted successfully"}
@@ -323,20 +352,18 @@ async def get_sensor_data(
     device_id: str,
     limit: int = 100,
     hours: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get historical sensor data."""
-    device = db.query(Device).filter(Device.device_id == device_id).first()
+    device = await run_db(device_registry.get, db, device_id)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    query = db.query(SensorData).filter(SensorData.device_id == device.id)
+    def load():
+        since = datetime.utcnow() - timedelta(hours=hours) if hours else None
+        return latest_readings(db, device.id, limit, since)
     
-    if hours:
-        since = datetime.utcnow() - timedelta(hours=hours)
-        query = query.filter(SensorData.timestamp >= since)
-    
-    data = query.order_by(SensorData.timestamp.desc()).limit(limit).all()
+    data = await run_db(load)
     
     return {
         "device_id": device_id,
@@ -355,37 +382,84 @@ async def get_sensor_data(
     }
 
 
-@app.post("/api/data", status_code=status.HTTP_201_CREATED)
-async def post_sensor_data(data: SensorDataCreate, db: Session = Depends(get_db)):
-    """Manually post sensor data (for testing or external integration)."""
-    device = db.query(Device).filter(Device.device_id == data.device_id).first()
+@app.get("/api/data/{device_id}/archive")
+async def get_archived_sensor_data(
+    device_id: str,
+    start: datetime,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Sensor data moved to the Parquet archive by the retention engine."""
+    device = await run_db(device_registry.get, db, device_id)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    # Create data point
-    db_data = SensorData(
-        device_id=device.id,
-        value=data.value,
-        unit=data.unit,
-        quality=data.quality
-    )
+    try:
+        rows = await run_db(
+            retention_engine.read_archive, db, "sensor_data", start, end or datetime.utcnow(), device.id
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    rows = rows[:config.MAX_DATAPOINTS_PER_QUERY]
     
-    db.add(db_data)
+    return {
+        "device_id": device_id,
+        "device_name": device.name,
+        "device_type": device.device_type,
+        "count": len(rows),
+        "data": [
+            {
+                "timestamp": row["timestamp"].isoformat(),
+                "value": row["value"],
+                "unit": row["unit"],
+                "quality": row["quality"]
+            }
+            for row in rows
+        ]
+    }
+
+
+@app.post("/api/data", status_code=status.HTTP_202_ACCEPTED)
+async def post_sensor_data(data: SensorDataCreate, db: Session = Depends(get_read_db)):
+    """
+    Post sensor data (for testing or external integration).
     
-    # Update device status
-    device.last_seen = datetime.utcnow()
-    device.status = DeviceStatus.ONLINE
+    The reading is queued in the write-behind ingestion buffer and
+    persisted in the next group commit. Rules are evaluated in memory and
+    their alerts queued on the writer, so the request never waits for a
+    commit (alert actions in the response have a null `alert_id`).
+    """
+    device = await run_db(device_registry.get, db, data.device_id)
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
     
-    db.commit()
+    # Queue data point (device last_seen/status are updated at flush time)
+    try:
+        ingest_buffer.submit(
+            device.id,
+            data.value,
+            unit=data.unit,
+            quality=data.quality
+        )
+    except IngestQueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, int(config.INGEST_FLUSH_INTERVAL)))}
+        )
     
-    # Evaluate rules
+    # Evaluate rules (alerts are written by the writer in the background)
     rules_engine = RulesEngine(db)
-    actions = rules_engine.evaluate_all_rules(data.device_id, data.value)
+    actions = await run_db(rules_engine.evaluate_all_rules, data.device_id, data.value)
+    rules_engine.queue_alerts()
     
     # Broadcast to WebSocket clients
     await manager.broadcast({
         "type": "sensor_data",
         "device_id": data.device_id,
+        "device_name": device.name,
+        "rubro": device.rubro,
+        "device_type": device.device_type,
         "value": data.value,
         "timestamp": datetime.utcnow().isoformat()
     })
@@ -397,74 +471,167 @@ async def post_sensor_data(data: SensorDataCreate, db: Session = Depends(get_db)
     }
 
 
+@app.post("/api/data/batch", status_code=status.HTTP_201_CREATED)
+async def post_sensor_data_batch(batch: SensorDataBatch, db: Session = Depends(get_read_db)):
+    """
+    Post many sensor readings (across many devices) in a single request.
+    
+    Devices are resolved with one query, all rows are inserted in one
+    transaction and rules are evaluated once per device using its latest
+    reading in the batch.
+    """
+    if len(batch.readings) > config.MAX_BATCH_READINGS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch too large (max {config.MAX_BATCH_READINGS} readings)"
+        )
+    
+    # Resolve all referenced devices (cache first, misses in one round-trip)
+    devices = await run_db(device_registry.get_many, db, [r.device_id for r in batch.readings])
+    
+    now = datetime.utcnow()
+    rows = []
+    results = []
+    latest_by_device: Dict[str, float] = {}
+    
+    for index, reading in enumerate(batch.readings):
+        device = devices.get(reading.device_id)
+        if not device:
+            results.append({
+                "index": index,
+                "device_id": reading.device_id,
+                "status": "rejected",
+                "error": "Device not found"
+            })
+            continue
+        
+        rows.append({
+            "device_id": device.id,
+            "timestamp": now,
+            "value": reading.value,
+            "unit": reading.unit,
+            "quality": reading.quality
+        })
+        latest_by_device[reading.device_id] = reading.value
+        latest_values.update(device.id, reading.value, now, reading.quality)
+        results.append({"index": index, "device_id": reading.device_id, "status": "accepted"})
+    
+    if rows:
+        await ingest_buffer.write(rows, {
+            devices[device_id].id: (now, DeviceStatus.ONLINE)
+            for device_id in latest_by_device
+        })
+    
+    # Evaluate rules once per device on its latest value (only alerts go to the writer)
+    actions = await RulesEngine(db).evaluate_readings(list(latest_by_device.items()))
+    
+    # Broadcast latest value per device
+    for device_id, value in latest_by_device.items():
+        await manager.broadcast({
+            "type": "sensor_data",
+            "device_id": device_id,
+            "device_name": devices[device_id].name,
+            "rubro": devices[device_id].rubro,
+            "device_type": devices[device_id].device_type,
+            "value": value,
+            "timestamp": now.isoformat()
+        })
+    
+    accepted = len(rows)
+    return {
+        "message": "Batch received",
+        "accepted": accepted,
+        "rejected": len(batch.readings) - accepted,
+        "actions_triggered": len(actions),
+        "actions": actions,
+        "results": results
+    }
+
+
 # ============================================
 # RULES ENDPOINTS
 # ============================================
 @app.get("/api/rules", response_model=List[RuleResponse])
-async def list_rules(active_only: bool = False, db: Session = Depends(get_db)):
+async def list_rules(active_only: bool = False, db: Session = Depends(get_read_db)):
     """List all automation rules."""
-    query = db.query(Rule)
-    
-    if active_only:
-        query = query.filter(Rule.is_active == True)
+    def load():
+        query = db.query(Rule)
+        
+        if active_only:
+            query = query.filter(Rule.is_active == True)
+        
+        return query.order_by(Rule.priority.desc()).all()
     
-    rules = query.order_by(Rule.priority.desc()).all()
-    return rules
+    return await run_db(load)
 
 
 @app.post("/api/rules", response_model=RuleResponse, status_code=status.HTTP_201_CREATED)
-async def create_rule(rule: RuleCreate, db: Session = Depends(get_db)):
+async def create_rule(rule: RuleCreate):
     """Create a new automation rule."""
-    db_rule = Rule(
-        name=rule.name,
-        description=rule.description,
-        condition=rule.condition,
-        action=rule.action,
-        is_active=rule.is_active,
-        priority=rule.priority,
-        cooldown_seconds=rule.cooldown_seconds
-    )
+    def create(db: Session):
+        db_rule = Rule(
+            name=rule.name,
+            description=rule.description,
+            condition=rule.condition,
+            action=rule.action,
+            is_active=rule.is_active,
+            priority=rule.priority,
+            cooldown_seconds=rule.cooldown_seconds
+        )
+        
+        db.add(db_rule)
+        db.flush()
+        return db_rule
     
-    db.add(db_rule)
-    db.commit()
-    db.refresh(db_rule)
+    db_rule = await db_writer.execute(create)
+    rule_index.invalidate()
+    live_metrics.invalidate()
     
     logger.info(f"Rule created: {rule.name}")
     return db_rule
 
 
 @app.put("/api/rules/{rule_id}", response_model=RuleResponse)
-async def update_rule(rule_id: int, rule: RuleCreate, db: Session = Depends(get_db)):
+async def update_rule(rule_id: int, rule: RuleCreate):
     """Update an existing rule."""
-    db_rule = db.query(Rule).filter(Rule.id == rule_id).first()
-    if not db_rule:
-        raise HTTPException(status_code=404, detail="Rule not found")
-    
-    db_rule.name = rule.name
-    db_rule.description = rule.description
-    db_rule.condition = rule.condition
-    db_rule.action = rule.action
-    db_rule.is_active = rule.is_active
-    db_rule.priority = rule.priority
-    db_rule.cooldown_seconds = rule.cooldown_seconds
-    db_rule.updated_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(db_rule)
+    def update(db: Session):
+        db_rule = db.query(Rule).filter(Rule.id == rule_id).first()
+        if not db_rule:
+            raise HTTPException(status_code=404, detail="Rule not found")
+        
+        db_rule.name = rule.name
+        db_rule.description = rule.description
+        db_rule.condition = rule.condition
+        db_rule.action = rule.action
+        db_rule.is_active = rule.is_active
+        db_rule.priority = rule.priority
+        db_rule.cooldown_seconds = rule.cooldown_seconds
+        db_rule.updated_at = datetime.utcnow()
+        
+        db.flush()
+        return db_rule
+    
+    db_rule = await db_writer.execute(update)
+    rule_index.invalidate()
+    live_metrics.invalidate()
     
     logger.info(f"Rule updated: {rule.name}")
     return db_rule
 
 
 @app.delete("/api/rules/{rule_id}")
-async def delete_rule(rule_id: int, db: Session = Depends(get_db)):
+async def delete_rule(rule_id: int):
     """Delete a rule."""
-    db_rule = db.query(Rule).filter(Rule.id == rule_id).first()
-    if not db_rule:
-        raise HTTPException(status_code=404, detail="Rule not found")
+    def delete(db: Session):
+        db_rule = db.query(Rule).filter(Rule.id == rule_id).first()
+        if not db_rule:
+            raise HTTPException(status_code=404, detail="Rule not found")
+        
+        db.delete(db_rule)
     
-    db.delete(db_rule)
-    db.commit()
+    await db_writer.execute(delete)
+    rule_index.invalidate()
+    live_metrics.invalidate()
     
     return {"message": "Rule deleted successfully"}
 
@@ -477,47 +644,56 @@ async def list_alerts(
     unresolved_only: bool = False,
     severity: Optional[str] = None,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List system alerts."""
-    query = db.query(Alert)
-    
-    if unresolved_only:
-        query = query.filter(Alert.is_resolved == False)
-    
-    if severity:
-        query = query.filter(Alert.severity == severity)
+    def load():
+        query = db.query(Alert)
+        
+        if unresolved_only:
+            query = query.filter(Alert.is_resolved == False)
+        
+        if severity:
+            query = query.filter(Alert.severity == severity)
+        
+        return query.order_by(Alert.created_at.desc()).limit(limit).all()
     
-    alerts = query.order_by(Alert.created_at.desc()).limit(limit).all()
-    return alerts
+    return await run_db(load)
 
 
 @app.post("/api/alerts/{alert_id}/acknowledge")
-async def acknowledge_alert(alert_id: int, db: Session = Depends(get_db)):
+async def acknowledge_alert(alert_id: int):
     """Acknowledge an alert."""
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
-    if not alert:
-        raise HTTPException(status_code=404, detail="Alert not found")
-    
-    alert.is_acknowledged = True
-    alert.acknowledged_at = datetime.utcnow()
+    def acknowledge(db: Session):
+        alert = db.query(Alert).filter(Alert.id == alert_id).first()
+        if not alert:
+            raise HTTPException(status_code=404, detail="Alert not found")
+        
+        alert.is_acknowledged = True
+        alert.acknowledged_at = datetime.utcnow()
     
-    db.commit()
+    await db_writer.execute(acknowledge)
     
     return {"message": "Alert acknowledged"}
 
 
 @app.post("/api/alerts/{alert_id}/resolve")
-async def resolve_alert(alert_id: int, db: Session = Depends(get_db)):
+async def resolve_alert(alert_id: int):
     """Resolve an alert."""
-    alert = db.query(Alert).filter(Alert.id == alert_id).first()
-    if not alert:
-        raise HTTPException(status_code=404, detail="Alert not found")
-    
-    alert.is_resolved = True
-    alert.resolved_at = datetime.utcnow()
+    def resolve(db: Session):
+        alert = db.query(Alert).filter(Alert.id == alert_id).first()
+        if not alert:
+            raise HTTPException(status_code=404, detail="Alert not found")
+        
+        was_open = not alert.is_resolved
+        severity = alert.severity
+        alert.is_resolved = True
+        alert.resolved_at = datetime.utcnow()
+        return was_open, severity
     
-    db.commit()
+    was_open, severity = await db_writer.execute(resolve)
+    if was_open:
+        live_metrics.alert_resolved(severity)
     
     return {"message": "Alert resolved"}
 
@@ -526,19 +702,14 @@ async def resolve_alert(alert_id: int, db: Session = Depends(get_db)):
 # STATISTICS ENDPOINT
 # ============================================
 @app.get("/api/stats")
-async def get_statistics(db: Session = Depends(get_db)):
-    """Get system statistics."""
-    total_devices = db.query(Device).count()
-    online_devices = db.query(Device).filter(Device.status == DeviceStatus.ONLINE).count()
-    total_alerts = db.query(Alert).filter(Alert.is_resolved == False).count()
-    critical_alerts = db.query(Alert).filter(
-        Alert.is_resolved == False,
-        Alert.severity == AlertSeverity.CRITICAL
-    ).count()
-    
-    # Data points in last 24h
-    since_24h = datetime.utcnow() - timedelta(hours=24)
-    datapoints_24h = db.query(SensorData).filter(SensorData.timestamp >= since_24h).count()
+async def get_statistics(db: Session = Depends(get_read_db)):
+    """Get system statistics (served from in-memory live counters)."""
+    await run_db(live_metrics.ensure_fresh, db, rule_index.pending_trigger_count)
+    metrics = live_metrics.snapshot()
+    
+    total_devices = metrics["devices_total"]
+    online_devices = metrics["devices_online"]
+    datapoints_24h = metrics["data_24h"]
     
     return {
         "devices": {
@@ -547,12 +718,22 @@ async def get_statistics(db: Session = Depends(get_db)):
             "offline": total_devices - online_devices
         },
         "alerts": {
-            "total": total_alerts,
-            "critical": critical_alerts
+            "total": metrics["alerts_open"],
+            "critical": metrics["alerts_critical"]
         },
         "data": {
             "points_24h": datapoints_24h,
-            "rate_per_minute": round(datapoints_24h / (24 * 60), 2)
+            "rate_per_minute": round(datapoints_24h / (24 * 60), 2),
+            "ingest_rate_per_second": metrics["ingest_rate_per_second"]
+        },
+        "ingest": ingest_buffer.stats(),
+        "writer": db_writer.stats(),
+        "cache": {
+            "device_registry": device_registry.stats()
+        },
+        "realtime": manager.stats(),
+        "metrics": {
+            "reconciled_at": metrics["reconciled_at"]
         },
         "system": {
             "mode": "simulation" if config.SIM_MODE else "hardware",
@@ -561,24 +742,148 @@ async def get_statistics(db: Session = Depends(get_db)):
     }
 
 
+# ============================================
+# SCENARIO REPLAY ENDPOINTS
+# ============================================
+@app.post("/api/scenarios/{scenario_name}/replay", status_code=status.HTTP_202_ACCEPTED)
+async def replay_scenario(
+    scenario_name: str,
+    speed: float = config.SCENARIO_REPLAY_SPEED,
+    seed: Optional[int] = None,
+    tick_seconds: float = 1.0,
+    evaluate_rules: bool = True
+):
+    """
+    Replay a scenario from `scenarios/` on a virtual clock.
+    
+    Readings are written straight into the ingestion path with virtual
+    timestamps; `speed=0` replays as fast as possible. Poll
+    `GET /api/scenarios/replay` for progress.
+    """
+    if speed < 0 or tick_seconds <= 0:
+        raise HTTPException(status_code=400, detail="speed must be >= 0 and tick_seconds > 0")
+    try:
+        return await scenario_replay.start(
+            scenario_name, speed=speed, seed=seed, tick_seconds=tick_seconds, evaluate_rules=evaluate_rules
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    except ReplayInProgress as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@app.get("/api/scenarios/replay")
+async def get_replay_status():
+    """Progress of the current or last scenario replay."""
+    return scenario_replay.status()
+
+
+@app.delete("/api/scenarios/replay")
+async def cancel_replay():
+    """Cancel the running scenario replay."""
+    await scenario_replay.stop()
+    return scenario_replay.status()
+
+
+# ============================================
+# RETENTION ENDPOINTS
+# ============================================
+@app.get("/api/retention")
+async def get_retention_status(db: Session = Depends(get_read_db)):
+    """Retention policies, last run and archive totals."""
+    return await run_db(retention_engine.stats, db)
+
+
+@app.post("/api/retention/run")
+async def run_retention():
+    """Apply the retention policies now (archive and delete aged telemetry)."""
+    result = await run_db(retention_engine.run)
+    dropped = await db_writer.execute(maintain_partitions)
+    return {**result, "dropped_partitions": dropped}
+
+
 # ============================================
 # WEBSOCKET ENDPOINT
 # ============================================
 @app.websocket("/ws/realtime")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time data streaming."""
-    await manager.connect(websocket)
+    """
+    WebSocket endpoint for real-time data streaming.
+    
+    Clients receive every message unless they subscribe, either in the
+    query string (`?rubro=carniceria&device_id=A,B`) or by sending
+    `{"action": "subscribe", ...}` / `{"action": "unsubscribe", ...}`.
+    `?format=binary` switches sensor readings to packed binary frames.
+    """
+    client = await manager.connect(websocket, websocket.query_params.get("format", FORMAT_JSON))
+    if client is None:
+        return
+    manager.subscribe(client, parse_topics(websocket.query_params))
     
     try:
-        while True:
-            # Keep connection alive with heartbeat
-            await asyncio.sleep(config.WS_HEARTBEAT_INTERVAL)
-            await websocket.send_json({"type": "heartbeat", "timestamp": datetime.utcnow().isoformat()})
+        while not client.closed:
+            try:
+                text = await asyncio.wait_for(websocket.receive_text(), timeout=config.WS_HEARTBEAT_INTERVAL)
+                manager.handle_message(client, text)
+            except asyncio.TimeoutError:
+                # Keep connection alive with heartbeat
+                manager.send(client, {"type": "heartbeat", "timestamp": datetime.utcnow().isoformat()})
     
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
 
+# ============================================
+# RULE STATISTICS PERSISTENCE (Background Task)
+# ============================================
+def persist_rule_stats(db: Session) -> int:
+    """Write operation: persist accumulated rule trigger counters."""
+    return rule_index.persist_trigger_stats(db)
+
+
+async def rule_stats_loop():
+    """Periodically persist rule trigger counters."""
+    while True:
+        await asyncio.sleep(config.RULE_STATS_FLUSH_INTERVAL)
+        try:
+            await db_writer.execute(persist_rule_stats)
+        except Exception as e:
+            logger.error(f"Error persisting rule statistics: {e}")
+
+
+async def retention_loop():
+    """Archive telemetry past its retention, then maintain sensor_data partitions."""
+    while True:
+        try:
+            await run_db(retention_engine.run)
+            dropped = await db_writer.execute(maintain_partitions)
+            if dropped:
+                logger.info(f"Dropped empty sensor_data partitions: {', '.join(dropped)}")
+        except Exception as e:
+            logger.error(f"Error applying retention: {e}")
+        await asyncio.sleep(config.RETENTION_INTERVAL)
+
+
+def reconcile_live_metrics():
+    """Recount live dashboard metrics from the database."""
+    db = ReadSessionLocal()
+    try:
+        live_metrics.reconcile(db, rule_index.pending_trigger_count)
+    except Exception as e:
+        logger.error(f"Error reconciling live metrics: {e}")
+    finally:
+        db.close()
+
+
+async def live_metrics_loop():
+    """Periodically correct drift in the live counters."""
+    while True:
+        await asyncio.sleep(config.LIVE_METRICS_RECONCILE_INTERVAL)
+        await run_db(reconcile_live_metrics)
+
+
 # ============================================
 # SIMULATION LOOP (Background Task)
 # ============================================
@@ -586,23 +891,21 @@ async def simulation_loop():
     """Background task that generates simulated sensor data."""
     logger.info("Starting simulation loop...")
     
-    # Import simulator
-    import sys
-    sys.path.append("../simulator")
-    from sensor_models import create_sensor
-    
     # Create simulated sensors
     sensors = {}
+    site_tz = config.get_simulator_timezone()
     
     await asyncio.sleep(5)  # Wait for DB to initialize
     
     while True:
         try:
-            # Get database session
-            db = next(get_db())
-            
             # Get all simulated devices
-            devices = db.query(Device).filter(Device.is_simulated == True).all()
+            db = ReadSessionLocal()
+            try:
+                devices = await run_db(lambda: db.query(Device).filter(Device.is_simulated == True).all())
+            finally:
+                db.close()
+            readings = []
             
             for device in devices:
                 # Create sensor model if not exists
@@ -611,6 +914,8 @@ async def simulation_loop():
                         sensors[device.device_id] = create_sensor(
                             device.device_type,
                             device.device_id,
+                            seed=config.SIMULATOR_SEED,
+                            tz=site_tz,
                             **(device.config or {})
                         )
                         logger.info(f"Created simulator for {device.device_id}")
@@ -622,36 +927,38 @@ async def simulation_loop():
                 sensor = sensors[device.device_id]
                 state = sensor.read()
                 
-                # Save to database
-                data_point = SensorData(
-                    device_id=device.id,
-                    value=state.value,
+                # Queue for group commit
+                await ingest_buffer.put(
+                    device.id,
+                    float(state.value),
                     unit=config.get_sensor_config(device.device_type).get("unit", ""),
-                    quality=state.quality
+                    quality=float(state.quality),
+                    device_status=DeviceStatus.ONLINE if state.is_connected else DeviceStatus.OFFLINE
                 )
                 
-                db.add(data_point)
-                device.last_seen = datetime.utcnow()
-                device.status = DeviceStatus.ONLINE if state.is_connected else DeviceStatus.OFFLINE
-                
-                # Evaluate rules
                 if state.is_connected:
-                    rules_engine = RulesEngine(db)
-                    rules_engine.evaluate_all_rules(device.device_id, state.value)
+                    readings.append((device.device_id, state.value))
                 
                 # Broadcast to WebSocket
                 await manager.broadcast({
                     "type": "sensor_data",
                     "device_id": device.device_id,
                     "device_name": device.name,
+                    "rubro": device.rubro,
+                    "device_type": device.device_type,
                     "value": round(state.value, 2),
                     "unit": config.get_sensor_config(device.device_type).get("unit", ""),
                     "quality": state.quality,
                     "timestamp": datetime.utcnow().isoformat()
                 })
             
-            db.commit()
-            db.close()
+            # Evaluate rules (alerts are committed by the writer)
+            if readings:
+                db = ReadSessionLocal()
+                try:
+                    await RulesEngine(db).evaluate_readings(readings)
+                finally:
+                    db.close()
             
             # Wait before next iteration
             await asyncio.sleep(config.SIMULATOR_UPDATE_RATE)
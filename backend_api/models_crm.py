@@ -7,7 +7,7 @@ Modelos de datos para sistema CRM integrado
 from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from .database import Base
+from database import Base
 
 # ============================================
 # CONTACT - Contacto General
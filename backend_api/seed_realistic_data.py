@@ -14,8 +14,9 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from database import SessionLocal, init_database
-from database import Device, SensorData, Rule, Alert, User
+from database import Device, Rule, Alert, User, insert_readings
 from database import Appointment, RFIDCard, Transaction, SystemLog
+from services.rollups import rebuild_rollups
 from sqlalchemy.exc import IntegrityError
 
 def seed_realistic_data():
@@ -48,6 +49,9 @@ def seed_realistic_data():
         print("\n🏥 Seeding Centro Médico data...")
         seed_centro_medico(db)
         
+        print("\n📈 Rebuilding sensor rollups...")
+        rebuild_rollups(db)
+        
         print("\n✅ Realistic data seeding completed!")
         
     except Exception as e:
@@ -190,7 +194,7 @@ def seed_carniceria(db):
                     
                     value = base_temp + variation
                     
-                    sensor_data = SensorData(
+                    sensor_data = dict(
                         device_id=device.id,
                         value=value,
                         unit="°C",
@@ -198,7 +202,7 @@ def seed_carniceria(db):
                         metadata={"simulated": True},
                         timestamp=timestamp
                     )
-                    db.add(sensor_data)
+                    insert_readings(db, [sensor_data])
             
             print(f"    ↳ Generated 168 temperature readings for {device.name}")
         
@@ -209,14 +213,14 @@ def seed_carniceria(db):
                     timestamp = now - timedelta(days=days_ago, hours=hour)
                     value = random.uniform(72, 78)
                     
-                    sensor_data = SensorData(
+                    sensor_data = dict(
                         device_id=device.id,
                         value=value,
                         unit="%",
                         quality=random.uniform(0.95, 1.0),
                         timestamp=timestamp
                     )
-                    db.add(sensor_data)
+                    insert_readings(db, [sensor_data])
             
             print(f"    ↳ Generated 168 humidity readings")
     
@@ -375,14 +379,14 @@ def seed_riego(db):
                     
                     moisture = max(20, min(moisture, 75))
                     
-                    sensor_data = SensorData(
+                    sensor_data = dict(
                         device_id=device.id,
                         value=moisture,
                         unit="%",
                         quality=random.uniform(0.9, 1.0),
                         timestamp=timestamp
                     )
-                    db.add(sensor_data)
+                    insert_readings(db, [sensor_data])
             
             print(f"    ↳ Generated irrigation data for {device.name}")
         
@@ -397,14 +401,14 @@ def seed_riego(db):
                     daily_variation = 8 * ((hour - 12) / 12)  # Peak at noon
                     value = base_temp + daily_variation + random.uniform(-2, 2)
                     
-                    sensor_data = SensorData(
+                    sensor_data = dict(
                         device_id=device.id,
                         value=value,
                         unit="°C",
                         quality=random.uniform(0.95, 1.0),
                         timestamp=timestamp
                     )
-                    db.add(sensor_data)
+                    insert_readings(db, [sensor_data])
     
     db.commit()
     
@@ -516,7 +520,7 @@ def seed_tienda_ropa(db):
                     
                     visitors = random.randint(base_visitors - 5, base_visitors + 10)
                     
-                    sensor_data = SensorData(
+                    sensor_data = dict(
                         device_id=device.id,
                         value=float(visitors),
                         unit="persons",
@@ -524,7 +528,7 @@ def seed_tienda_ropa(db):
                         timestamp=timestamp,
                         metadata={"cumulative": False}
                     )
-                    db.add(sensor_data)
+                    insert_readings(db, [sensor_data])
             
             print(f"    ↳ Generated foot traffic data")
     
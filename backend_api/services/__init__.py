@@ -3,6 +3,33 @@ IoT Multi-Rubro - Business Logic Services
 ==========================================
 """
 
-from .rules_engine import RulesEngine
+from .db_writer import DatabaseWriter, db_writer
+from .rules_engine import RulesEngine, RuleIndex, rule_index
+from .ingest_buffer import IngestionBuffer, ingest_buffer
+from .device_registry import DeviceRegistry, device_registry
+from .latest_values import LatestValueTable, latest_values
+from .live_metrics import LiveMetrics, live_metrics
+from .realtime import ConnectionManager
+from .scenario_replay import ScenarioReplay, scenario_replay
+from .retention import RetentionEngine, retention_engine
 
-__all__ = ["RulesEngine"]
+__all__ = [
+    "DatabaseWriter",
+    "db_writer",
+    "RulesEngine",
+    "RuleIndex",
+    "rule_index",
+    "IngestionBuffer",
+    "ingest_buffer",
+    "DeviceRegistry",
+    "device_registry",
+    "LatestValueTable",
+    "latest_values",
+    "LiveMetrics",
+    "live_metrics",
+    "ConnectionManager",
+    "ScenarioReplay",
+    "scenario_replay",
+    "RetentionEngine",
+    "retention_engine",
+]
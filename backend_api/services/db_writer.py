@@ -0,0 +1,290 @@
+"""
+Database Writer - Single-Writer Thread
+======================================
+SQLite allows one writer at a time. Instead of letting request handlers,
+the ingestion buffer, rule evaluation and CRM endpoints race for the
+write lock, every write is queued here and a dedicated thread drains the
+queue in batched transactions.
+
+Operations that change in-memory state (caches, counters, cooldowns)
+register it with `after_commit` / `on_rollback` so that state follows the
+transaction's outcome instead of the operation's return.
+"""
+
+from typing import Dict, Any, List, Optional, Callable, TypeVar
+from concurrent.futures import Future
+import asyncio
+import queue
+import threading
+import time
+from loguru import logger
+from sqlalchemy.orm import Session
+
+import config
+from database import SessionLocal
+
+T = TypeVar("T")
+
+# Session.info key of the operation currently running on a writer session
+_CURRENT_OP = "write_op"
+
+
+class WriteOp:
+    """One queued write: `fn(db, *args, **kwargs)` and its result future."""
+
+    __slots__ = ("fn", "args", "kwargs", "future", "commit_hooks", "rollback_hooks")
+
+    def __init__(self, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.commit_hooks: List[Callable[[], Any]] = []
+        self.rollback_hooks: List[Callable[[], Any]] = []
+
+    def committed(self):
+        """Apply the operation's deferred in-memory effects."""
+        hooks, self.commit_hooks, self.rollback_hooks = self.commit_hooks, [], []
+        _run_hooks(hooks)
+
+    def rolled_back(self):
+        """Undo the in-memory effects the operation applied eagerly (latest first)."""
+        hooks, self.commit_hooks, self.rollback_hooks = self.rollback_hooks, [], []
+        _run_hooks(reversed(hooks))
+
+
+def _run_hooks(hooks):
+    for hook in hooks:
+        try:
+            hook()
+        except Exception as e:
+            logger.error(f"Write hook {getattr(hook, '__qualname__', hook)} failed: {e}")
+
+
+def after_commit(db: Session, fn: Callable[[], Any]):
+    """
+    Run `fn` once the current write operation is committed.
+
+    Outside the writer (a session the caller commits itself) `fn` runs
+    immediately.
+    """
+    op: Optional[WriteOp] = db.info.get(_CURRENT_OP)
+    if op is None:
+        fn()
+    else:
+        op.commit_hooks.append(fn)
+
+
+def on_rollback(db: Session, fn: Callable[[], Any]):
+    """
+    Run `fn` if the current write operation is rolled back.
+
+    Use it to undo in-memory state the operation changed eagerly (because
+    later work in the same batch must see it). The operation may be re-run
+    afterwards and register its hooks again. No-op outside the writer.
+    """
+    op: Optional[WriteOp] = db.info.get(_CURRENT_OP)
+    if op is not None:
+        op.rollback_hooks.append(fn)
+
+
+class DatabaseWriter:
+    """
+    Owner of all database writes.
+
+    A write operation is a callable taking the writer's session as its
+    first argument. It may add, update and flush but must not commit:
+    up to `max_batch` queued operations run in one transaction and are
+    committed together. An operation that raises (including an
+    `HTTPException` used for control flow) fails alone: the transaction
+    is rolled back and the rest of the batch runs again without it. If
+    the commit itself fails, each operation is retried in its own
+    transaction. Operations must therefore be safe to re-run; in-memory
+    side effects go through `after_commit` and `on_rollback`.
+
+    Results are returned through futures. ORM objects stay readable after
+    the commit (expire_on_commit is off) but are detached from the session.
+    When the thread is not running (e.g. tests without lifespan events)
+    operations run inline, serialized by a lock.
+    """
+
+    def __init__(self, max_batch: int = config.DB_WRITER_MAX_BATCH):
+        self.max_batch = max_batch
+
+        self._queue: "queue.Queue[Optional[WriteOp]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._inline_lock = threading.Lock()
+
+        # Counters
+        self.ops_total = 0
+        self.failed_total = 0
+        self.batch_count = 0
+        self.retried_batches = 0
+        self.last_batch_size = 0
+        self.last_batch_ms = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    # ------------------------------------------
+    # Producer API
+    # ------------------------------------------
+    def submit(self, fn: Callable[..., T], *args, **kwargs) -> "Future[T]":
+        """Queue a write operation and return a future for its result."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Write operations cannot queue other write operations")
+
+        op = WriteOp(fn, args, kwargs)
+        if self.is_running:
+            self._queue.put(op)
+        else:
+            with self._inline_lock:
+                self._execute([op])
+        return op.future
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Run a write operation and block until it is committed."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def execute(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Run a write operation and await its commit without blocking the loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    # ------------------------------------------
+    # Writer thread
+    # ------------------------------------------
+    def _run(self):
+        while True:
+            op = self._queue.get()
+            if op is None:
+                return
+            batch = [op]
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    op = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if op is None:
+                    stopping = True
+                    break
+                batch.append(op)
+
+            try:
+                self._execute(batch)
+            except Exception as e:  # Never let the writer die
+                logger.error(f"Database writer batch failed: {e}")
+            if stopping:
+                return
+
+    def _execute(self, batch: List[WriteOp]):
+        ops = [op for op in batch if op.future.set_running_or_notify_cancel()]
+
+        started = time.perf_counter()
+        while ops:
+            db: Session = SessionLocal(expire_on_commit=False)
+            results: List[Any] = []
+            try:
+                for op in ops:
+                    results.append(self._call(db, op))
+                db.commit()
+                db.expunge_all()
+            except Exception as e:
+                db.rollback()
+                for op in reversed(ops[:len(results) + 1]):
+                    op.rolled_back()
+                if len(results) < len(ops):
+                    # An operation raised: it fails alone, the others run again
+                    failed = ops[len(results)]
+                    self.failed_total += 1
+                    failed.future.set_exception(e)
+                    ops = [op for op in ops if op is not failed]
+                    continue
+                if len(ops) == 1:
+                    self.failed_total += 1
+                    ops[0].future.set_exception(e)
+                    return
+                self.retried_batches += 1
+                logger.warning(f"Write batch of {len(ops)} failed ({e}), retrying operations individually")
+                break
+            else:
+                for op, result in zip(ops, results):
+                    op.committed()
+                    op.future.set_result(result)
+                self.ops_total += len(ops)
+                self.batch_count += 1
+                self.last_batch_size = len(ops)
+                self.last_batch_ms = round((time.perf_counter() - started) * 1000, 3)
+                return
+            finally:
+                db.close()
+
+        for op in ops:
+            self._execute_one(op)
+
+    def _execute_one(self, op: WriteOp):
+        db: Session = SessionLocal(expire_on_commit=False)
+        try:
+            result = self._call(db, op)
+            db.commit()
+            db.expunge_all()
+        except Exception as e:
+            db.rollback()
+            op.rolled_back()
+            self.failed_total += 1
+            op.future.set_exception(e)
+        else:
+            op.committed()
+            self.ops_total += 1
+            op.future.set_result(result)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _call(db: Session, op: WriteOp) -> Any:
+        db.info[_CURRENT_OP] = op
+        try:
+            return op.fn(db, *op.args, **op.kwargs)
+        finally:
+            db.info.pop(_CURRENT_OP, None)
+
+    # ------------------------------------------
+    # Lifecycle
+    # ------------------------------------------
+    def start(self):
+        """Start the writer thread."""
+        if self.is_running:
+            return
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Database writer started (max_batch={self.max_batch})")
+
+    async def stop(self):
+        """Commit everything already queued, then stop the thread."""
+        if self._thread:
+            self._queue.put(None)
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+            self._thread = None
+        logger.info(f"Database writer stopped ({self.ops_total} operations committed)")
+
+    def stats(self) -> Dict[str, Any]:
+        """Writer counters for monitoring."""
+        return {
+            "running": self.is_running,
+            "pending": self.pending,
+            "ops_total": self.ops_total,
+            "failed_total": self.failed_total,
+            "batch_count": self.batch_count,
+            "retried_batches": self.retried_batches,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_ms": self.last_batch_ms
+        }
+
+
+# Process-wide writer
+db_writer = DatabaseWriter()
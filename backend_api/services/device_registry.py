@@ -0,0 +1,143 @@
+"""
+Device Registry - In-Memory Device Lookup Cache
+================================================
+Process-wide cache of device metadata keyed by external `device_id`
+and internal primary key, so hot paths skip the `devices` SELECT.
+"""
+
+from typing import Dict, Any, Iterable, List, Optional
+from dataclasses import dataclass
+import threading
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from database import Device
+
+
+@dataclass(frozen=True)
+class DeviceInfo:
+    """Immutable snapshot of the static fields of a `Device` row."""
+    id: int
+    device_id: str
+    name: str
+    device_type: str
+    rubro: Optional[str] = None
+    location: Optional[str] = None
+    config: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_orm(cls, device: Device) -> "DeviceInfo":
+        return cls(
+            id=device.id,
+            device_id=device.device_id,
+            name=device.name,
+            device_type=device.device_type,
+            rubro=device.rubro,
+            location=device.location,
+            config=device.config
+        )
+
+
+class DeviceRegistry:
+    """
+    Read-through cache for device metadata.
+
+    Misses fall back to the database and populate the cache. Endpoints
+    that create or delete devices must call `put` / `invalidate`.
+    """
+
+    def __init__(self):
+        self._by_device_id: Dict[str, DeviceInfo] = {}
+        self._by_pk: Dict[int, DeviceInfo] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, db: Session):
+        """Warm the cache with every device in one query."""
+        devices = db.query(Device).all()
+        with self._lock:
+            self._by_device_id.clear()
+            self._by_pk.clear()
+            for device in devices:
+                self._store(DeviceInfo.from_orm(device))
+        logger.info(f"Device registry loaded ({len(devices)} devices)")
+
+    def _store(self, info: DeviceInfo):
+        self._by_device_id[info.device_id] = info
+        self._by_pk[info.id] = info
+
+    def put(self, device: Device) -> DeviceInfo:
+        """Insert or refresh a device entry."""
+        info = DeviceInfo.from_orm(device)
+        with self._lock:
+            stale = self._by_device_id.get(info.device_id)
+            if stale and stale.id != info.id:
+                self._by_pk.pop(stale.id, None)
+            self._store(info)
+        return info
+
+    def invalidate(self, device_id: Optional[str] = None):
+        """Drop one device (by external id) or the whole cache."""
+        with self._lock:
+            if device_id is None:
+                self._by_device_id.clear()
+                self._by_pk.clear()
+                return
+            info = self._by_device_id.pop(device_id, None)
+            if info:
+                self._by_pk.pop(info.id, None)
+
+    def get(self, db: Session, device_id: str) -> Optional[DeviceInfo]:
+        """Resolve an external device id."""
+        info = self._by_device_id.get(device_id)
+        if info:
+            self.hits += 1
+            return info
+
+        self.misses += 1
+        device = db.query(Device).filter(Device.device_id == device_id).first()
+        return self.put(device) if device else None
+
+    def get_by_pk(self, db: Session, pk: int) -> Optional[DeviceInfo]:
+        """Resolve an internal device primary key."""
+        info = self._by_pk.get(pk)
+        if info:
+            self.hits += 1
+            return info
+
+        self.misses += 1
+        device = db.query(Device).filter(Device.id == pk).first()
+        return self.put(device) if device else None
+
+    def get_many(self, db: Session, device_ids: Iterable[str]) -> Dict[str, DeviceInfo]:
+        """Resolve several external ids, fetching all misses in one query."""
+        found: Dict[str, DeviceInfo] = {}
+        missing: List[str] = []
+        for device_id in set(device_ids):
+            info = self._by_device_id.get(device_id)
+            if info:
+                found[device_id] = info
+            else:
+                missing.append(device_id)
+
+        self.hits += len(found)
+        if missing:
+            self.misses += len(missing)
+            for device in db.query(Device).filter(Device.device_id.in_(missing)).all():
+                found[device.device_id] = self.put(device)
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters for monitoring."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._by_device_id),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# Process-wide registry
+device_registry = DeviceRegistry()
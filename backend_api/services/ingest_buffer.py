@@ -0,0 +1,238 @@
+"""
+Ingestion Buffer - Write-Behind Group Commit
+=============================================
+Accepts sensor readings in memory and persists them to `sensor_data`
+in batched transactions, triggered by size or time thresholds.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import time
+from loguru import logger
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import config
+from database import Device, DeviceStatus, insert_readings
+from services.db_writer import db_writer
+from services.latest_values import latest_values
+from services.live_metrics import live_metrics
+from services.rollups import apply_rollups
+
+
+class IngestQueueFull(Exception):
+    """Raised when the buffer is at capacity and cannot accept more rows."""
+
+
+class IngestionBuffer:
+    """
+    In-process write-behind queue for `SensorData` rows.
+
+    Readings are appended in O(1) and flushed by a background task in
+    group commits. When the flusher is not running (e.g. tests without
+    lifespan events) the buffer degrades to write-through.
+    """
+
+    def __init__(
+        self,
+        flush_size: int = config.INGEST_FLUSH_SIZE,
+        flush_interval: float = config.INGEST_FLUSH_INTERVAL,
+        max_pending: int = config.INGEST_QUEUE_MAX
+    ):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._rows: List[Dict[str, Any]] = []
+        self._touched: Dict[int, Tuple[datetime, DeviceStatus]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+        # Counters
+        self.accepted_total = 0
+        self.rejected_total = 0
+        self.flushed_total = 0
+        self.flush_count = 0
+        self.last_flush_size = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return len(self._rows)
+
+    # ------------------------------------------
+    # Producer API
+    # ------------------------------------------
+    def submit(
+        self,
+        device_pk: int,
+        value: float,
+        unit: Optional[str] = None,
+        quality: float = 1.0,
+        timestamp: Optional[datetime] = None,
+        device_status: DeviceStatus = DeviceStatus.ONLINE
+    ):
+        """
+        Queue one reading. Raises IngestQueueFull when at capacity.
+
+        Args:
+            device_pk: Internal `Device.id`
+            value: Sensor reading
+            unit: Measurement unit
+            quality: Signal quality (0-1)
+            timestamp: Reading time (defaults to now)
+            device_status: Status to record on the device at flush time
+        """
+        if len(self._rows) >= self.max_pending:
+            self.rejected_total += 1
+            raise IngestQueueFull(f"Ingestion buffer full ({self.max_pending} rows pending)")
+
+        ts = timestamp or datetime.utcnow()
+        self._rows.append({
+            "device_id": device_pk,
+            "timestamp": ts,
+            "value": value,
+            "unit": unit,
+            "quality": quality
+        })
+        self._touched[device_pk] = (ts, device_status)
+        latest_values.update(device_pk, value, ts, quality)
+        self.accepted_total += 1
+
+        if not self.is_running:
+            # No flusher: behave as write-through
+            self.flush_now()
+        elif len(self._rows) >= self.flush_size:
+            self._wakeup.set()
+
+    async def put(self, device_pk: int, value: float, **kwargs):
+        """Queue one reading, waiting for a flush if the buffer is full."""
+        while len(self._rows) >= self.max_pending and self.is_running:
+            self._wakeup.set()
+            await asyncio.sleep(self.flush_interval / 10)
+        self.submit(device_pk, value, **kwargs)
+
+    # ------------------------------------------
+    # Flushing
+    # ------------------------------------------
+    def _swap(self) -> Tuple[List[Dict[str, Any]], Dict[int, Tuple[datetime, DeviceStatus]]]:
+        rows, self._rows = self._rows, []
+        touched, self._touched = self._touched, {}
+        return rows, touched
+
+    @staticmethod
+    def _persist(db: Session, rows: List[Dict[str, Any]], touched: Dict[int, Tuple[datetime, DeviceStatus]]):
+        """
+        Write operation for `db_writer`.
+
+        Inserts the raw rows, merges them into the rollup tables and updates
+        each touched device's last_seen/status. The single writer serializes
+        batches, so they never race on the same rollup bucket.
+        """
+        insert_readings(db, rows)
+        apply_rollups(db, rows)
+        db.execute(update(Device), [
+            {"id": pk, "last_seen": ts, "status": device_status}
+            for pk, (ts, device_status) in touched.items()
+        ])
+
+    def write_batch(self, rows: List[Dict[str, Any]], touched: Dict[int, Tuple[datetime, DeviceStatus]]):
+        """Persist readings in the writer's next transaction, blocking until committed."""
+        started = time.perf_counter()
+        db_writer.call(self._persist, rows, touched)
+        self._record_flush(rows, touched, started)
+
+    async def write(self, rows: List[Dict[str, Any]], touched: Dict[int, Tuple[datetime, DeviceStatus]]):
+        """Persist readings in the writer's next transaction without blocking the loop."""
+        started = time.perf_counter()
+        await db_writer.execute(self._persist, rows, touched)
+        self._record_flush(rows, touched, started)
+
+    def _record_flush(self, rows, touched, started: float):
+        live_metrics.record_readings(
+            (row["timestamp"] for row in rows),
+            {pk: device_status for pk, (_, device_status) in touched.items()}
+        )
+        self.flushed_total += len(rows)
+        self.flush_count += 1
+        self.last_flush_size = len(rows)
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    def flush_now(self):
+        """Synchronously flush everything pending."""
+        rows, touched = self._swap()
+        if rows:
+            self.write_batch(rows, touched)
+
+    async def flush(self):
+        """Flush pending rows off the event loop."""
+        async with self._lock:
+            rows, touched = self._swap()
+            if not rows:
+                return
+            try:
+                await self.write(rows, touched)
+            except Exception as e:
+                logger.error(f"Ingestion flush failed, re-queueing {len(rows)} rows: {e}")
+                self._rows[:0] = rows
+                for pk, entry in touched.items():
+                    self._touched.setdefault(pk, entry)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    # ------------------------------------------
+    # Lifecycle
+    # ------------------------------------------
+    def start(self):
+        """Start the background flusher on the running event loop."""
+        if self.is_running:
+            return
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Ingestion buffer started (flush_size={self.flush_size}, "
+            f"interval={self.flush_interval}s, max_pending={self.max_pending})"
+        )
+
+    async def stop(self):
+        """Stop the flusher and persist everything still pending."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await self.flush()
+        logger.info(f"Ingestion buffer stopped ({self.flushed_total} rows flushed)")
+
+    def stats(self) -> Dict[str, Any]:
+        """Buffer counters for monitoring."""
+        return {
+            "running": self.is_running,
+            "pending": self.pending,
+            "accepted_total": self.accepted_total,
+            "rejected_total": self.rejected_total,
+            "flushed_total": self.flushed_total,
+            "flush_count": self.flush_count,
+            "last_flush_size": self.last_flush_size,
+            "last_flush_ms": self.last_flush_ms
+        }
+
+
+# Process-wide buffer
+ingest_buffer = IngestionBuffer()
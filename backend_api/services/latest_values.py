@@ -0,0 +1,85 @@
+"""
+Latest Values - In-Memory Last Reading Per Device
+==================================================
+Last-value table updated on every ingested reading, used by the rules
+engine for cross-device conditions and by `/api/devices`.
+"""
+
+from typing import Dict, Any, Optional
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import config
+
+
+@dataclass(frozen=True)
+class LatestValue:
+    """Most recent reading of one device."""
+    value: float
+    timestamp: datetime
+    quality: float = 1.0
+
+
+class LatestValueTable:
+    """
+    Last reading per device, keyed by internal `Device.id`.
+
+    Entries older than `max_age_seconds` are treated as unknown by
+    `get`, so rules never act on a sensor that stopped reporting.
+    """
+
+    def __init__(self, max_age_seconds: Optional[float] = config.LATEST_VALUE_MAX_AGE):
+        self.max_age_seconds = max_age_seconds
+        self._values: Dict[int, LatestValue] = {}
+
+    def update(
+        self,
+        device_pk: int,
+        value: float,
+        timestamp: Optional[datetime] = None,
+        quality: float = 1.0
+    ) -> LatestValue:
+        """Record a reading unless a newer one is already stored."""
+        entry = LatestValue(value=value, timestamp=timestamp or datetime.utcnow(), quality=quality)
+        current = self._values.get(device_pk)
+        if current is None or entry.timestamp >= current.timestamp:
+            self._values[device_pk] = entry
+            return entry
+        return current
+
+    def peek(self, device_pk: int) -> Optional[LatestValue]:
+        """Stored entry regardless of age."""
+        return self._values.get(device_pk)
+
+    def is_stale(self, entry: LatestValue) -> bool:
+        if self.max_age_seconds is None:
+            return False
+        return datetime.utcnow() - entry.timestamp > timedelta(seconds=self.max_age_seconds)
+
+    def get(self, device_pk: int) -> Optional[LatestValue]:
+        """Entry if present and within the staleness bound."""
+        entry = self._values.get(device_pk)
+        if entry is None or self.is_stale(entry):
+            return None
+        return entry
+
+    def discard(self, device_pk: int):
+        self._values.pop(device_pk, None)
+
+    def snapshot(self, device_pk: int) -> Dict[str, Any]:
+        """Fields merged into device API responses."""
+        entry = self._values.get(device_pk)
+        if entry is None:
+            return {}
+        return {
+            "last_value": entry.value,
+            "last_value_at": entry.timestamp,
+            "last_quality": entry.quality
+        }
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+# Process-wide table
+latest_values = LatestValueTable()
@@ -0,0 +1,259 @@
+"""
+Live Metrics - Incremental Dashboard Counters
+==============================================
+In-memory counters behind `/api/stats` and `/analytics/overview`,
+updated by the ingest and alert paths and periodically reconciled
+against the database to correct drift.
+"""
+
+from typing import Dict, Any, Iterable, Optional
+from collections import deque
+from datetime import datetime, timedelta
+import threading
+import time
+from loguru import logger
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+
+import config
+from database import Device, Alert, Rule, SensorRollup, DeviceStatus, AlertSeverity
+from services.rollups import bucket_floor
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch(ts: datetime) -> float:
+    return (ts - _EPOCH).total_seconds()
+
+
+class SlidingCounter:
+    """
+    Event count over a trailing time window, kept in fixed-width buckets.
+
+    Buckets are ordered by start time and the running total is adjusted
+    as buckets expire, so `total()` is amortized O(1).
+    """
+
+    def __init__(self, window_seconds: float, bucket_seconds: float):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self._buckets: deque = deque()  # [bucket_start, count], ascending
+        self._total = 0
+
+    def add(self, at: float, n: int = 1):
+        """Count `n` events at epoch time `at`."""
+        start = at - at % self.bucket_seconds
+        buckets = self._buckets
+        if not buckets or buckets[-1][0] < start:
+            buckets.append([start, n])
+        elif buckets[-1][0] == start:
+            buckets[-1][1] += n
+        else:
+            # Out-of-order event: walk back to its bucket
+            for i in range(len(buckets) - 1, -1, -1):
+                if buckets[i][0] == start:
+                    buckets[i][1] += n
+                    break
+                if buckets[i][0] < start:
+                    buckets.insert(i + 1, [start, n])
+                    break
+            else:
+                buckets.appendleft([start, n])
+        self._total += n
+
+    def _expire(self, now: float):
+        cutoff = now - self.window_seconds
+        buckets = self._buckets
+        while buckets and buckets[0][0] + self.bucket_seconds <= cutoff:
+            self._total -= buckets.popleft()[1]
+
+    def total(self, now: Optional[float] = None) -> int:
+        self._expire(time.time() if now is None else now)
+        return self._total
+
+    def clear(self):
+        self._buckets.clear()
+        self._total = 0
+
+
+class LiveMetrics:
+    """
+    Process-wide dashboard counters.
+
+    Device status, open alerts by severity, rule totals and trailing
+    reading/alert counts are maintained incrementally. `reconcile`
+    recomputes everything from the database; it runs on first use,
+    after `invalidate` and periodically from the app lifespan.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._device_status: Dict[int, DeviceStatus] = {}
+        self._online = 0
+        self._open_alerts: Dict[AlertSeverity, int] = {s: 0 for s in AlertSeverity}
+        self._rules_total = 0
+        self._rules_active = 0
+        self._rule_triggers = 0
+
+        # Trailing windows keyed by reading/alert timestamp
+        self._data_24h = SlidingCounter(24 * 3600, 60)
+        self._data_7d = SlidingCounter(7 * 24 * 3600, 3600)
+        self._alerts_24h = SlidingCounter(24 * 3600, 60)
+        # Arrival rate, keyed by commit time
+        self._ingest_rate = SlidingCounter(config.LIVE_METRICS_RATE_WINDOW, 1)
+
+        self._dirty = True
+        self.reconciled_at: Optional[datetime] = None
+        self.reconcile_count = 0
+
+    def invalidate(self):
+        """Force a full reconcile on next read (e.g. after rule changes)."""
+        self._dirty = True
+
+    # ------------------------------------------
+    # Event hooks
+    # ------------------------------------------
+    def record_readings(self, timestamps: Iterable[datetime], statuses: Dict[int, DeviceStatus]):
+        """Count committed readings and apply the devices' new status."""
+        now = time.time()
+        with self._lock:
+            count = 0
+            for ts in timestamps:
+                at = _epoch(ts)
+                self._data_24h.add(at)
+                self._data_7d.add(at)
+                count += 1
+            if count:
+                self._ingest_rate.add(now, count)
+            for device_pk, device_status in statuses.items():
+                self._set_status(device_pk, device_status)
+
+    def _set_status(self, device_pk: int, device_status: Optional[DeviceStatus]):
+        previous = self._device_status.pop(device_pk, None)
+        if previous == DeviceStatus.ONLINE:
+            self._online -= 1
+        if device_status is not None:
+            self._device_status[device_pk] = device_status
+            if device_status == DeviceStatus.ONLINE:
+                self._online += 1
+
+    def set_device_status(self, device_pk: int, device_status: DeviceStatus):
+        with self._lock:
+            self._set_status(device_pk, device_status)
+
+    def remove_device(self, device_pk: int):
+        with self._lock:
+            self._set_status(device_pk, None)
+
+    def alert_opened(self, severity: AlertSeverity, created_at: Optional[datetime] = None):
+        with self._lock:
+            self._open_alerts[AlertSeverity(severity)] += 1
+            self._alerts_24h.add(_epoch(created_at or datetime.utcnow()))
+
+    def alert_resolved(self, severity: AlertSeverity):
+        with self._lock:
+            severity = AlertSeverity(severity)
+            self._open_alerts[severity] = max(self._open_alerts[severity] - 1, 0)
+
+    def rule_triggered(self, n: int = 1):
+        with self._lock:
+            self._rule_triggers += n
+
+    # ------------------------------------------
+    # Reconciliation
+    # ------------------------------------------
+    def reconcile(self, db: Session, pending_triggers: int = 0):
+        """
+        Recompute all counters from the database.
+
+        Reading windows are seeded from the 1m/1h rollups, so this costs a
+        handful of grouped queries regardless of `sensor_data` size.
+        `pending_triggers` are rule triggers not yet persisted.
+        """
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        since_24h = now - timedelta(hours=24)
+        since_7d = now - timedelta(days=7)
+
+        device_status = dict(db.query(Device.id, Device.status).all())
+
+        open_alerts = {s: 0 for s in AlertSeverity}
+        for severity, count in db.query(Alert.severity, func.count(Alert.id)).filter(
+            Alert.is_resolved == False
+        ).group_by(Alert.severity).all():
+            open_alerts[AlertSeverity(severity)] += count
+
+        rules_total, rules_active, rule_triggers = db.query(
+            func.count(Rule.id),
+            func.sum(case((Rule.is_active == True, 1), else_=0)),
+            func.sum(Rule.trigger_count)
+        ).one()
+
+        data_24h = SlidingCounter(24 * 3600, 60)
+        for bucket_start, count in db.query(SensorRollup.bucket_start, func.sum(SensorRollup.count)).filter(
+            SensorRollup.resolution == "1m",
+            SensorRollup.bucket_start >= bucket_floor(since_24h, "1m")
+        ).group_by(SensorRollup.bucket_start).order_by(SensorRollup.bucket_start).all():
+            data_24h.add(_epoch(bucket_start), int(count))
+
+        data_7d = SlidingCounter(7 * 24 * 3600, 3600)
+        for bucket_start, count in db.query(SensorRollup.bucket_start, func.sum(SensorRollup.count)).filter(
+            SensorRollup.resolution == "1h",
+            SensorRollup.bucket_start >= bucket_floor(since_7d, "1h")
+        ).group_by(SensorRollup.bucket_start).order_by(SensorRollup.bucket_start).all():
+            data_7d.add(_epoch(bucket_start), int(count))
+
+        alerts_24h = SlidingCounter(24 * 3600, 60)
+        for (created_at,) in db.query(Alert.created_at).filter(
+            Alert.created_at >= since_24h
+        ).order_by(Alert.created_at).yield_per(1000):
+            alerts_24h.add(_epoch(created_at))
+
+        with self._lock:
+            self._device_status = device_status
+            self._online = sum(1 for s in device_status.values() if s == DeviceStatus.ONLINE)
+            self._open_alerts = open_alerts
+            self._rules_total = rules_total
+            self._rules_active = rules_active or 0
+            self._rule_triggers = (rule_triggers or 0) + pending_triggers
+            self._data_24h = data_24h
+            self._data_7d = data_7d
+            self._alerts_24h = alerts_24h
+            self._dirty = False
+            self.reconciled_at = now
+            self.reconcile_count += 1
+
+        logger.debug(f"Live metrics reconciled in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def ensure_fresh(self, db: Session, pending_triggers: int = 0):
+        """Reconcile if never done or invalidated."""
+        if self._dirty or self.reconciled_at is None:
+            self.reconcile(db, pending_triggers)
+
+    # ------------------------------------------
+    # Reads
+    # ------------------------------------------
+    def snapshot(self) -> Dict[str, Any]:
+        """Current counters (O(1) amortized)."""
+        now = time.time()
+        with self._lock:
+            return {
+                "devices_total": len(self._device_status),
+                "devices_online": self._online,
+                "alerts_open": sum(self._open_alerts.values()),
+                "alerts_critical": self._open_alerts[AlertSeverity.CRITICAL],
+                "alerts_24h": self._alerts_24h.total(now),
+                "data_24h": self._data_24h.total(now),
+                "data_7d": self._data_7d.total(now),
+                "ingest_rate_per_second": round(
+                    self._ingest_rate.total(now) / config.LIVE_METRICS_RATE_WINDOW, 2
+                ),
+                "rules_total": self._rules_total,
+                "rules_active": self._rules_active,
+                "rule_triggers": self._rule_triggers,
+                "reconciled_at": self.reconciled_at.isoformat() if self.reconciled_at else None
+            }
+
+
+# Process-wide metrics
+live_metrics = LiveMetrics()
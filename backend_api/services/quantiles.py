@@ -0,0 +1,114 @@
+"""
+Streaming Quantiles - P² Estimator
+===================================
+Constant-memory quantile estimation (Jain & Chlamtac P² algorithm)
+used for medians over arbitrarily long sensor histories.
+"""
+
+from typing import Iterable, List, Optional
+
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile.
+
+    The first `exact_limit` observations are kept and give an exact
+    answer; past that the sample seeds five P² markers and memory stays
+    constant (O(1) time per observation).
+    """
+
+    def __init__(self, p: float = 0.5, exact_limit: int = 1024):
+        if not 0 < p < 1:
+            raise ValueError("Quantile must be between 0 and 1")
+        self.p = p
+        self.exact_limit = max(exact_limit, 5)
+        self.count = 0
+        self._sample: List[float] = []
+        self._q: List[float] = []
+        self._n: List[int] = []
+        self._desired: List[float] = []
+        self._increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x: float):
+        self.count += 1
+
+        if not self._q:
+            self._sample.append(x)
+            if len(self._sample) > self.exact_limit:
+                self._seed_markers()
+            return
+
+        q, n = self._q, self._n
+
+        # Find the cell containing x and adjust extreme markers
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Adjust the three middle markers
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                q[i] = candidate
+                n[i] += step
+
+    def _seed_markers(self):
+        """Switch from the exact sample to five P² markers."""
+        sample = sorted(self._sample)
+        last = len(sample) - 1
+        n = [round(last * inc) for inc in self._increments]
+        for i in range(1, 5):
+            n[i] = max(n[i], n[i - 1] + 1)
+        for i in range(3, -1, -1):
+            n[i] = min(n[i], n[i + 1] - 1)
+
+        self._n = n
+        self._q = [sample[i] for i in n]
+        self._desired = [last * inc for inc in self._increments]
+        self._sample = []
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self._q, self._n
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self) -> Optional[float]:
+        """Current estimate (None before any observation)."""
+        if self._q:
+            return self._q[2]
+        if not self._sample:
+            return None
+
+        # Exact, linearly interpolated (matches statistics.median for p=0.5)
+        sample = sorted(self._sample)
+        pos = self.p * (len(sample) - 1)
+        lo = int(pos)
+        hi = min(lo + 1, len(sample) - 1)
+        return sample[lo] + (sample[hi] - sample[lo]) * (pos - lo)
+
+
+def streaming_median(values: Iterable[float]) -> Optional[float]:
+    """Median estimate of a (possibly unbounded) stream of values."""
+    estimator = P2Quantile(0.5)
+    for value in values:
+        estimator.add(value)
+    return estimator.value
@@ -0,0 +1,589 @@
+"""
+Realtime Fan-Out - WebSocket Broadcaster
+=========================================
+Serializes each broadcast once and hands it to bounded per-client
+queues, each drained by its own writer task, so one slow client never
+delays the producer or the other clients. Clients may subscribe to
+topics (device_id, rubro, device_type, message type) and only receive
+matching messages. Sensor readings are batched into one frame per tick
+holding the latest value per device, sent as JSON or, if negotiated at
+connect time, as packed binary records.
+"""
+
+from typing import Dict, Any, Hashable, Iterable, List, Mapping, Optional, Set, Tuple, Union
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import itertools
+import json
+import struct
+from loguru import logger
+from fastapi import WebSocket
+
+import config
+
+# Slow-client policies (config.WS_SLOW_CLIENT_POLICY)
+POLICY_COALESCE = "coalesce"        # Replace a queued reading of the same device, else drop oldest
+POLICY_DROP_OLDEST = "drop_oldest"  # Drop the oldest queued message
+POLICY_DISCONNECT = "disconnect"    # Close the connection once its queue is full
+
+# Wire formats, chosen with /ws/realtime?format=...
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+
+# Binary sensor frame (little endian). Devices are referenced by index
+# into a dictionary sent beforehand as a JSON `device_dictionary` message.
+#   header: version u8, record count u16, base time epoch-ms i64
+#   record: device index u16, ms offset from base i32, value f32, quality u8 (0-255)
+BINARY_VERSION = 1
+FRAME_HEADER = struct.Struct("<BHq")
+FRAME_RECORD = struct.Struct("<HifB")
+FRAME_MAX_RECORDS = 0xFFFF    # u16 record count
+DEVICE_INDEX_SPACE = 0x10000  # u16 device index
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+# Message fields clients can subscribe on
+TOPIC_FIELDS = ("device_id", "rubro", "device_type", "type")
+
+Topic = Tuple[str, str]
+
+
+def message_topics(message: Dict[str, Any]) -> Set[Topic]:
+    """Topics a broadcast message is routed to."""
+    return {
+        (field, str(message[field]))
+        for field in TOPIC_FIELDS
+        if message.get(field) is not None
+    }
+
+
+def parse_topics(data: Mapping[str, Any]) -> Set[Topic]:
+    """
+    Topics from a subscribe request or connection query string.
+
+    Each field takes a single value, a comma-separated string or a list:
+    {"rubro": "carniceria", "device_id": ["TEMP-001", "TEMP-002"]}
+    """
+    topics: Set[Topic] = set()
+    for field in TOPIC_FIELDS:
+        values = data.get(field)
+        if values is None:
+            continue
+        if isinstance(values, str):
+            values = values.split(",")
+        topics.update((field, str(v).strip()) for v in values if str(v).strip())
+    return topics
+
+
+def epoch_ms(timestamp: Union[str, datetime, None]) -> int:
+    """Naive-UTC datetime or ISO string to epoch milliseconds."""
+    if timestamp is None:
+        timestamp = datetime.utcnow()
+    elif isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", ""))
+    return int((timestamp.replace(tzinfo=None) - _EPOCH).total_seconds() * 1000)
+
+
+def encode_frame(records: List[Tuple[int, int, float, float]]) -> bytes:
+    """Pack (device index, epoch-ms, value, quality 0-1) records into a binary frame."""
+    if len(records) > FRAME_MAX_RECORDS:
+        raise ValueError(f"A frame holds at most {FRAME_MAX_RECORDS} records")
+    base = min((r[1] for r in records), default=0)
+    parts = [FRAME_HEADER.pack(BINARY_VERSION, len(records), base)]
+    for index, at_ms, value, quality in records:
+        quality_byte = max(0, min(255, round((1.0 if quality is None else quality) * 255)))
+        parts.append(FRAME_RECORD.pack(index, at_ms - base, value, quality_byte))
+    return b"".join(parts)
+
+
+def decode_frame(data: bytes) -> List[Tuple[int, int, float, float]]:
+    """Inverse of `encode_frame` (quality back to 0-1, value as float32 precision)."""
+    version, count, base = FRAME_HEADER.unpack_from(data)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported frame version: {version}")
+    return [
+        (index, base + offset, value, quality / 255)
+        for index, offset, value, quality in FRAME_RECORD.iter_unpack(
+            data[FRAME_HEADER.size:FRAME_HEADER.size + count * FRAME_RECORD.size]
+        )
+    ]
+
+
+def coalesce_key(message: Dict[str, Any]) -> Optional[Hashable]:
+    """Key under which queued messages may replace each other (None = never)."""
+    if message.get("type") == "sensor_data" and "device_id" in message:
+        return ("sensor_data", message["device_id"])
+    return None
+
+
+class ClientConnection:
+    """One WebSocket client with its bounded outbound queue and writer task."""
+
+    def __init__(self, websocket: WebSocket, max_queue: int, policy: str, wire_format: str = FORMAT_JSON):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.policy = policy
+        self.wire_format = wire_format
+        self.known_devices: Dict[int, str] = {}  # Dictionary entries already queued: index -> device_id
+
+        self._pending: "OrderedDict[Hashable, Union[str, bytes]]" = OrderedDict()
+        self._pinned: Set[Hashable] = set()  # Queued keys that are never dropped
+        self._seq = itertools.count()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.topics: Set[Topic] = set()  # Empty = receive everything
+
+        # Counters
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._pending)
+
+    def offer(self, payload: Union[str, bytes], key: Optional[Hashable] = None, pinned: bool = False) -> bool:
+        """
+        Queue a serialized message without blocking.
+
+        A `pinned` message (e.g. a device dictionary later frames rely on)
+        is never dropped to make room; it may overfill the queue instead.
+        Returns False when the client overflowed under the disconnect policy.
+        """
+        if self.closed:
+            return False
+
+        if key is not None and self.policy == POLICY_COALESCE and key in self._pending:
+            self._pending[key] = payload
+            self.coalesced += 1
+            return True
+
+        if len(self._pending) >= self.max_queue:
+            if self.policy == POLICY_DISCONNECT:
+                return False
+            oldest = next((k for k in self._pending if k not in self._pinned), None)
+            if oldest is not None:
+                del self._pending[oldest]
+                self.dropped += 1
+
+        if key is None or self.policy != POLICY_COALESCE:
+            key = ("seq", next(self._seq))
+        if pinned:
+            self._pinned.add(key)
+        self._pending[key] = payload
+        self._ready.set()
+        return True
+
+    async def _writer(self, on_error):
+        try:
+            while True:
+                await self._ready.wait()
+                while self._pending:
+                    key, payload = self._pending.popitem(last=False)
+                    self._pinned.discard(key)
+                    if isinstance(payload, bytes):
+                        await self.websocket.send_bytes(payload)
+                    else:
+                        await self.websocket.send_text(payload)
+                    self.sent += 1
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"WebSocket writer stopped: {e}")
+            on_error(self)
+
+    def start(self, on_error):
+        self._task = asyncio.create_task(self._writer(on_error))
+
+    def close(self):
+        self.closed = True
+        self._pending.clear()
+        self._pinned.clear()
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+
+class ConnectionManager:
+    """
+    Manages WebSocket connections for real-time updates.
+
+    `broadcast` serializes once and enqueues to each recipient in O(1);
+    the network writes happen in each client's writer task. Recipients
+    are the unsubscribed clients plus those indexed under any of the
+    message's topics, so routing cost scales with relevant subscribers.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = config.WS_MAX_CONNECTIONS,
+        queue_size: int = config.WS_CLIENT_QUEUE_SIZE,
+        policy: str = config.WS_SLOW_CLIENT_POLICY,
+        frame_interval: float = config.WS_FRAME_INTERVAL,
+        frame_minmax: bool = config.WS_FRAME_MINMAX,
+        max_binary_devices: int = config.WS_BINARY_MAX_DEVICES
+    ):
+        self.max_connections = max_connections
+        self.queue_size = queue_size
+        self.policy = policy
+        self.frame_interval = frame_interval
+        self.frame_minmax = frame_minmax
+        self.max_binary_devices = max(1, min(max_binary_devices, DEVICE_INDEX_SPACE))
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self._wildcard: Set[ClientConnection] = set()
+        self._index: Dict[Topic, Set[ClientConnection]] = {}
+
+        # Binary wire format: device_id -> index (least recently used first),
+        # plus the dictionary entry of each index
+        self._device_index: "OrderedDict[str, int]" = OrderedDict()
+        self._device_entries: List[Dict[str, Any]] = []
+        self.dictionary_reused = 0
+
+        # Readings of the current tick, keyed by device_id
+        self._frame: Dict[str, Dict[str, Any]] = {}
+        self._frame_task: Optional[asyncio.Task] = None
+
+        self.broadcast_count = 0
+        self.frames_sent = 0
+        self.readings_framed = 0
+        self.evicted_total = 0
+        self._closed_totals = {"sent": 0, "dropped": 0, "coalesced": 0}
+
+    @property
+    def active_connections(self):
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket, wire_format: str = FORMAT_JSON) -> Optional[ClientConnection]:
+        """Accept a client and start its writer; None if at capacity or format unknown."""
+        await websocket.accept()
+        if wire_format not in (FORMAT_JSON, FORMAT_BINARY):
+            await websocket.close(code=1003)  # Unsupported data
+            logger.warning(f"WebSocket rejected: unknown format {wire_format!r}")
+            return None
+        if len(self.clients) >= self.max_connections:
+            await websocket.close(code=1013)  # Try again later
+            logger.warning(f"WebSocket rejected: {self.max_connections} connections open")
+            return None
+
+        client = ClientConnection(websocket, self.queue_size, self.policy, wire_format)
+        self.clients[websocket] = client
+        self._wildcard.add(client)
+        client.start(self._evict)
+        logger.info(f"WebSocket connected. Total: {len(self.clients)}")
+        return client
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client:
+            self.unsubscribe(client)
+            self._wildcard.discard(client)
+            client.close()
+            for counter in self._closed_totals:
+                self._closed_totals[counter] += getattr(client, counter)
+            logger.info(f"WebSocket disconnected. Total: {len(self.clients)}")
+
+    def _evict(self, client: ClientConnection):
+        if client.websocket in self.clients:
+            self.evicted_total += 1
+            self.disconnect(client.websocket)
+            asyncio.create_task(self._close(client.websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1008)
+        except Exception:
+            pass  # Already gone
+
+    # ------------------------------------------
+    # Subscriptions
+    # ------------------------------------------
+    def subscribe(self, client: ClientConnection, topics: Iterable[Topic]):
+        """Add topics; a client with any topic stops receiving everything."""
+        for topic in topics:
+            client.topics.add(topic)
+            self._index.setdefault(topic, set()).add(client)
+        if client.topics:
+            self._wildcard.discard(client)
+
+    def unsubscribe(self, client: ClientConnection, topics: Optional[Iterable[Topic]] = None):
+        """Remove topics (all when None); with none left the client receives everything."""
+        for topic in list(client.topics if topics is None else topics):
+            client.topics.discard(topic)
+            subscribers = self._index.get(topic)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._index[topic]
+        if not client.topics and client.websocket in self.clients:
+            self._wildcard.add(client)
+
+    def handle_message(self, client: ClientConnection, text: str):
+        """
+        Apply a client control message.
+
+        {"action": "subscribe", "rubro": "carniceria", "type": "alert"}
+        {"action": "unsubscribe", "device_id": "TEMP-001"}
+        {"action": "unsubscribe"}  (clear all topics)
+        """
+        try:
+            request = json.loads(text)
+            action = request.get("action")
+        except (ValueError, AttributeError):
+            self.send(client, {"type": "error", "detail": "Invalid JSON message"})
+            return
+
+        if action == "subscribe":
+            self.subscribe(client, parse_topics(request))
+        elif action == "unsubscribe":
+            topics = parse_topics(request)
+            self.unsubscribe(client, topics or None)
+        else:
+            self.send(client, {"type": "error", "detail": f"Unknown action: {action}"})
+            return
+
+        self.send(client, {"type": "subscriptions", "topics": self.describe(client)})
+
+    @staticmethod
+    def describe(client: ClientConnection) -> Dict[str, list]:
+        topics: Dict[str, list] = {}
+        for field, value in sorted(client.topics):
+            topics.setdefault(field, []).append(value)
+        return topics
+
+    def recipients(self, message: Dict[str, Any]) -> Set[ClientConnection]:
+        matched = set(self._wildcard)
+        for topic in message_topics(message):
+            subscribers = self._index.get(topic)
+            if subscribers:
+                matched |= subscribers
+        return matched
+
+    # ------------------------------------------
+    # Sending
+    # ------------------------------------------
+    def send(self, client: ClientConnection, message: Dict[str, Any]):
+        """Queue a message for a single client."""
+        if not client.offer(json.dumps(message, default=str)):
+            self._evict(client)
+
+    def publish(self, message: Dict[str, Any]):
+        """Serialize once and enqueue to every matching client without awaiting I/O."""
+        self.broadcast_count += 1
+        if self.frames_running and message.get("type") == "sensor_data":
+            self._add_to_frame(message)
+            return
+
+        clients = self.recipients(message)
+        if not clients:
+            return
+        payload = binary = None
+        key = coalesce_key(message)
+        for client in clients:
+            if client.wire_format == FORMAT_BINARY and message.get("type") == "sensor_data":
+                # Single reading as a one-record frame
+                if binary is None:
+                    binary = self._encode_entries([{"message": message}])
+                self._offer_binary(client, binary)
+                continue
+            if payload is None:
+                payload = json.dumps(message, default=str)
+            if not client.offer(payload, key):
+                logger.warning("Disconnecting slow WebSocket client (queue full)")
+                self._evict(client)
+
+    async def broadcast(self, message: Dict[str, Any]):
+        """Broadcast message to all connected clients."""
+        self.publish(message)
+
+    # ------------------------------------------
+    # Frames
+    # ------------------------------------------
+    @property
+    def frames_running(self) -> bool:
+        return self._frame_task is not None and not self._frame_task.done()
+
+    def _add_to_frame(self, message: Dict[str, Any]):
+        value = message.get("value")
+        entry = self._frame.get(message["device_id"])
+        if entry is None:
+            self._frame[message["device_id"]] = {"message": message, "count": 1, "min": value, "max": value}
+            return
+        entry["message"] = message
+        entry["count"] += 1
+        if value is not None:
+            entry["min"] = value if entry["min"] is None else min(entry["min"], value)
+            entry["max"] = value if entry["max"] is None else max(entry["max"], value)
+
+    def _device_slot(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Dictionary entry of the message's device.
+
+        Once `max_binary_devices` indexes are taken, the least recently
+        used one is given to the new device. Entries are replaced, never
+        mutated, so frames already encoded keep the entries they referenced.
+        """
+        device_id = message["device_id"]
+        index = self._device_index.get(device_id)
+        if index is not None:
+            self._device_index.move_to_end(device_id)
+            return self._device_entries[index]
+
+        if len(self._device_entries) < self.max_binary_devices:
+            index = len(self._device_entries)
+            self._device_entries.append({})
+        else:
+            _, index = self._device_index.popitem(last=False)
+            self.dictionary_reused += 1
+        self._device_index[device_id] = index
+        entry = self._device_entries[index] = {
+            "index": index,
+            "device_id": device_id,
+            "device_name": message.get("device_name"),
+            "device_type": message.get("device_type"),
+            "unit": message.get("unit")
+        }
+        return entry
+
+    def _encode_entries(self, entries: List[Dict[str, Any]]) -> List[Tuple[bytes, List[Dict[str, Any]], str]]:
+        """
+        Pack frame entries as (binary frame, dictionary entries it references,
+        those entries serialized as one `device_dictionary` message).
+
+        Split so that no frame exceeds the u16 record count or references
+        more devices than the dictionary holds.
+        """
+        chunk = min(FRAME_MAX_RECORDS, self.max_binary_devices)
+        encoded = []
+        for start in range(0, len(entries), chunk):
+            part = entries[start:start + chunk]
+            devices = [self._device_slot(e["message"]) for e in part]
+            records = [
+                (device["index"], epoch_ms(e["message"].get("timestamp")), float(e["message"]["value"]), e["message"].get("quality"))
+                for device, e in zip(devices, part)
+            ]
+            devices = list({device["index"]: device for device in devices}.values())
+            dictionary = json.dumps({"type": "device_dictionary", "devices": devices}, default=str)
+            encoded.append((encode_frame(records), devices, dictionary))
+        return encoded
+
+    def _offer_binary(self, client: ClientConnection, encoded: List[Tuple[bytes, List[Dict[str, Any]], str]]):
+        """Queue dictionary entries the client lacks (never dropped), then each packed frame."""
+        known = client.known_devices
+        for frame, devices, dictionary in encoded:
+            missing = [d for d in devices if known.get(d["index"]) != d["device_id"]]
+            if missing:
+                if len(missing) < len(devices):
+                    dictionary = json.dumps({"type": "device_dictionary", "devices": missing}, default=str)
+                if not client.offer(dictionary, pinned=True):
+                    self._evict(client)
+                    return
+                known.update((d["index"], d["device_id"]) for d in missing)
+            if not client.offer(frame):
+                self._evict(client)
+                return
+
+    def _frame_reading(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        message = entry["message"]
+        reading = {
+            field: message[field]
+            for field in ("device_id", "device_name", "value", "unit", "quality", "timestamp")
+            if message.get(field) is not None
+        }
+        if self.frame_minmax and entry["count"] > 1:
+            reading.update(min=entry["min"], max=entry["max"], count=entry["count"])
+        return reading
+
+    def flush_frame(self):
+        """
+        Send the readings gathered this tick as one `sensor_frame` per client.
+
+        Each client gets the readings its subscriptions match; clients
+        with the same selection share one serialized payload.
+        """
+        entries, self._frame = list(self._frame.values()), {}
+        if not entries:
+            return
+
+        selections: Dict[ClientConnection, list] = {}
+        for index, entry in enumerate(entries):
+            for client in self.recipients(entry["message"]):
+                selections.setdefault(client, []).append(index)
+
+        readings: Dict[int, Dict[str, Any]] = {}
+        payloads: Dict[Tuple[int, ...], str] = {}
+        binaries: Dict[Tuple[int, ...], List[Tuple[bytes, List[Dict[str, Any]], str]]] = {}
+        timestamp = datetime.utcnow().isoformat()
+        for client, indexes in selections.items():
+            key = tuple(indexes)
+            if client.wire_format == FORMAT_BINARY:
+                if key not in binaries:
+                    binaries[key] = self._encode_entries([entries[i] for i in indexes])
+                self._offer_binary(client, binaries[key])
+                continue
+
+            payload = payloads.get(key)
+            if payload is None:
+                for i in indexes:
+                    if i not in readings:
+                        readings[i] = self._frame_reading(entries[i])
+                payload = payloads[key] = json.dumps({
+                    "type": "sensor_frame",
+                    "timestamp": timestamp,
+                    "readings": [readings[i] for i in indexes]
+                }, default=str)
+            if not client.offer(payload):
+                self._evict(client)
+
+        self.frames_sent += 1
+        self.readings_framed += len(entries)
+
+    async def _run_frames(self):
+        while True:
+            await asyncio.sleep(self.frame_interval)
+            self.flush_frame()
+
+    def start(self):
+        """Start the frame ticker on the running event loop (no-op if frames are disabled)."""
+        if self.frame_interval > 0 and not self.frames_running:
+            self._frame_task = asyncio.create_task(self._run_frames())
+            logger.info(f"Realtime frames every {self.frame_interval}s")
+
+    async def stop(self):
+        """Stop the ticker and send what is pending."""
+        if self._frame_task:
+            self._frame_task.cancel()
+            try:
+                await self._frame_task
+            except asyncio.CancelledError:
+                pass
+            self._frame_task = None
+            self.flush_frame()
+
+    def stats(self) -> Dict[str, Any]:
+        """Fan-out counters for monitoring."""
+        clients = list(self.clients.values())
+        return {
+            "connections": len(clients),
+            "unfiltered": len(self._wildcard),
+            "topics": len(self._index),
+            "policy": self.policy,
+            "broadcasts": self.broadcast_count,
+            "frame_interval": self.frame_interval if self.frames_running else 0,
+            "frames_sent": self.frames_sent,
+            "readings_framed": self.readings_framed,
+            "queued": sum(c.queued for c in clients),
+            "sent": self._closed_totals["sent"] + sum(c.sent for c in clients),
+            "dropped": self._closed_totals["dropped"] + sum(c.dropped for c in clients),
+            "coalesced": self._closed_totals["coalesced"] + sum(c.coalesced for c in clients),
+            "evicted_total": self.evicted_total,
+            "binary_devices": len(self._device_index),
+            "dictionary_reused": self.dictionary_reused
+        }
+
+
+# Process-wide connection manager
+manager = ConnectionManager()
@@ -5,11 +5,11 @@ Sistema completo de generación de reportes PDF, Excel y CSV
 """
 
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import json
-import statistics
 from io import BytesIO, StringIO
 import csv
+from sqlalchemy import func, case, and_
 
 class ReportGenerator:
     """Generador de reportes avanzado para el sistema IoT."""
@@ -68,7 +68,9 @@ class ReportGenerator:
     def generate_device_report(self, device_id: str, days: int = 7) -> Dict[str, Any]:
         """Genera reporte detallado de un dispositivo."""
         
-        from ..database import Device, SensorData, Alert
+        from database import Device, sensor_data_between
+        from services.rollups import window_stats
+        from services.quantiles import streaming_median
         
         device = self.db.query(Device).filter(Device.device_id == device_id).first()
         
@@ -78,30 +80,27 @@ class ReportGenerator:
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Obtener datos del sensor
-        sensor_data = self.db.query(SensorData).filter(
-            SensorData.device_id == device.id,
-            SensorData.timestamp >= start_date
-        ).all()
-        
-        # Obtener alertas
-        alerts = self.db.query(Alert).filter(
-            Alert.device_id == device.id,
-            Alert.created_at >= start_date
-        ).all()
+        # Agregados desde las tablas de rollup
+        window = window_stats(self.db, start_date, end_date, [device.id]).get(device.id)
         
-        # Calcular estadísticas
-        values = [d.value for d in sensor_data]
+        # Conteo de alertas agrupado por severidad
+        alerts = self._count_alerts(start_date, end_date, device_pk=device.id)
         
+        # Calcular estadísticas (mediana con estimador streaming de memoria constante)
         statistics_data = {}
-        if values:
+        if window:
+            raw = sensor_data_between(self.db, start_date)
+            median = streaming_median(v for (v,) in self.db.query(raw.value).filter(
+                raw.device_id == device.id,
+                raw.timestamp >= start_date
+            ).yield_per(1000))
             statistics_data = {
-                "count": len(values),
-                "min": round(min(values), 2),
-                "max": round(max(values), 2),
-                "avg": round(statistics.mean(values), 2),
-                "median": round(statistics.median(values), 2),
-                "std_dev": round(statistics.stdev(values), 2) if len(values) > 1 else 0
+                "count": window.count,
+                "min": round(window.min, 2),
+                "max": round(window.max, 2),
+                "avg": round(window.mean, 2),
+                "median": round(median, 2) if median is not None else None,
+                "std_dev": round(window.std_dev, 2)
             }
         
         report = {
@@ -120,16 +119,11 @@ class ReportGenerator:
             },
             "generated_at": datetime.utcnow().isoformat(),
             "statistics": statistics_data,
-            "data_points": len(sensor_data),
-            "alerts_count": len(alerts),
-            "alerts_by_severity": {
-                "critical": sum(1 for a in alerts if a.severity == "critical"),
-                "error": sum(1 for a in alerts if a.severity == "error"),
-                "warning": sum(1 for a in alerts if a.severity == "warning"),
-                "info": sum(1 for a in alerts if a.severity == "info")
-            },
+            "data_points": window.count if window else 0,
+            "alerts_count": alerts["total"],
+            "alerts_by_severity": alerts["by_severity"],
             "uptime_percentage": self._calculate_uptime(device, start_date, end_date),
-            "data_quality_avg": round(statistics.mean([d.quality for d in sensor_data if d.quality]), 2) if sensor_data else 0
+            "data_quality_avg": round(window.quality_avg, 2) if window else 0
         }
         
         return report
@@ -175,56 +169,43 @@ class ReportGenerator:
     def _get_daily_summary(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         """Obtiene resumen del día."""
         
-        from ..database import Device, SensorData, Alert
-        
-        total_devices = self.db.query(Device).count()
-        online_devices = self.db.query(Device).filter(Device.status == "online").count()
+        from services.rollups import window_stats, total_stats
         
-        data_points = self.db.query(SensorData).filter(
-            SensorData.timestamp >= start_date,
-            SensorData.timestamp < end_date
-        ).count()
+        total_devices, online_devices = self._count_devices()
         
-        alerts = self.db.query(Alert).filter(
-            Alert.created_at >= start_date,
-            Alert.created_at < end_date
-        ).count()
+        data_points = total_stats(window_stats(self.db, start_date, end_date)).count
         
-        critical_alerts = self.db.query(Alert).filter(
-            Alert.created_at >= start_date,
-            Alert.created_at < end_date,
-            Alert.severity == "critical"
-        ).count()
+        alerts = self._count_alerts(start_date, end_date)
         
         return {
             "total_devices": total_devices,
             "online_devices": online_devices,
             "data_points_collected": data_points,
-            "total_alerts": alerts,
-            "critical_alerts": critical_alerts,
+            "total_alerts": alerts["total"],
+            "critical_alerts": alerts["by_severity"]["critical"],
             "system_availability": round((online_devices / total_devices * 100) if total_devices > 0 else 0, 2)
         }
     
     def _get_devices_summary(self, start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
         """Obtiene resumen de dispositivos."""
         
-        from ..database import Device, SensorData, Alert
+        from database import Device, Alert
+        from services.rollups import window_stats
         
-        devices = self.db.query(Device).all()
+        devices = self.db.query(
+            Device.id, Device.device_id, Device.name, Device.device_type, Device.status
+        ).all()
+        per_device = window_stats(self.db, start_date, end_date)
+        alerts_per_device = dict(
+            self.db.query(Alert.device_id, func.count(Alert.id)).filter(
+                Alert.created_at >= start_date,
+                Alert.created_at < end_date
+            ).group_by(Alert.device_id).all()
+        )
         summary = []
         
         for device in devices:
-            readings = self.db.query(SensorData).filter(
-                SensorData.device_id == device.id,
-                SensorData.timestamp >= start_date,
-                SensorData.timestamp < end_date
-            ).count()
-            
-            alerts = self.db.query(Alert).filter(
-                Alert.device_id == device.id,
-                Alert.created_at >= start_date,
-                Alert.created_at < end_date
-            ).count()
+            readings = per_device[device.id].count if device.id in per_device else 0
             
             summary.append({
                 "id": device.device_id,
@@ -232,7 +213,7 @@ class ReportGenerator:
                 "type": device.device_type,
                 "status": device.status,
                 "readings": readings,
-                "alerts": alerts
+                "alerts": alerts_per_device.get(device.id, 0)
             })
         
         return summary
@@ -240,55 +221,42 @@ class ReportGenerator:
     def _get_alerts_summary(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         """Obtiene resumen de alertas."""
         
-        from ..database import Alert
+        alerts = self._count_alerts(start_date, end_date)
+        alerts["average_resolution_time"] = "N/A"  # Calcular si hay timestamps
         
-        alerts = self.db.query(Alert).filter(
-            Alert.created_at >= start_date,
-            Alert.created_at < end_date
-        ).all()
-        
-        return {
-            "total": len(alerts),
-            "by_severity": {
-                "critical": sum(1 for a in alerts if a.severity == "critical"),
-                "error": sum(1 for a in alerts if a.severity == "error"),
-                "warning": sum(1 for a in alerts if a.severity == "warning"),
-                "info": sum(1 for a in alerts if a.severity == "info")
-            },
-            "resolved": sum(1 for a in alerts if a.is_resolved),
-            "unresolved": sum(1 for a in alerts if not a.is_resolved),
-            "average_resolution_time": "N/A"  # Calcular si hay timestamps
-        }
+        return alerts
     
     def _get_rules_summary(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         """Obtiene resumen de reglas."""
         
-        from ..database import Rule
+        from database import Rule
+        
+        total, active, total_triggers = self.db.query(
+            func.count(Rule.id),
+            func.sum(case((Rule.is_active == True, 1), else_=0)),
+            func.sum(Rule.trigger_count)
+        ).one()
         
-        rules = self.db.query(Rule).all()
+        most_triggered = self.db.query(Rule.name).order_by(
+            Rule.trigger_count.desc(), Rule.id
+        ).limit(1).scalar()
         
         return {
-            "total": len(rules),
-            "active": sum(1 for r in rules if r.is_active),
-            "inactive": sum(1 for r in rules if not r.is_active),
-            "total_triggers": sum(r.trigger_count for r in rules),
-            "most_triggered": max(rules, key=lambda r: r.trigger_count).name if rules else "N/A"
+            "total": total,
+            "active": active or 0,
+            "inactive": total - (active or 0),
+            "total_triggers": total_triggers or 0,
+            "most_triggered": most_triggered or "N/A"
         }
     
     def _get_weekly_summary(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         """Obtiene resumen semanal."""
         
-        from ..database import SensorData, Alert
+        from services.rollups import window_stats, total_stats
         
-        data_points = self.db.query(SensorData).filter(
-            SensorData.timestamp >= start_date,
-            SensorData.timestamp < end_date
-        ).count()
+        data_points = total_stats(window_stats(self.db, start_date, end_date)).count
         
-        alerts = self.db.query(Alert).filter(
-            Alert.created_at >= start_date,
-            Alert.created_at < end_date
-        ).count()
+        alerts = self._count_alerts(start_date, end_date)["total"]
         
         return {
             "total_data_points": data_points,
@@ -300,14 +268,38 @@ class ReportGenerator:
     def _get_trends(self, start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
         """Obtiene tendencias del período."""
         
+        from database import Alert, SensorRollup
+        from services.rollups import bucket_floor
+        
+        # Días calendario que intersectan el período
+        days = [bucket_floor(start_date, "1d")]
+        while days[-1] + timedelta(days=1) < end_date:
+            days.append(days[-1] + timedelta(days=1))
+        
+        # Lecturas por día desde los rollups diarios (una consulta)
+        data_per_day = dict(
+            self.db.query(SensorRollup.bucket_start, func.sum(SensorRollup.count)).filter(
+                SensorRollup.resolution == "1d",
+                SensorRollup.bucket_start >= days[0],
+                SensorRollup.bucket_start < days[-1] + timedelta(days=1)
+            ).group_by(SensorRollup.bucket_start).all()
+        )
+        
+        # Alertas por día: un SUM(CASE ...) por día en una sola consulta
+        alerts_per_day = self.db.query(*[
+            func.sum(case(
+                (and_(Alert.created_at >= day, Alert.created_at < day + timedelta(days=1)), 1),
+                else_=0
+            ))
+            for day in days
+        ]).one()
+        
         trends = []
-        for day in range(7):
-            date = start_date + timedelta(days=day)
-            # Aquí iría la lógica para obtener datos por día
+        for day, alerts in zip(days, alerts_per_day):
             trends.append({
-                "date": date.strftime("%Y-%m-%d"),
-                "data_points": 0,  # Placeholder
-                "alerts": 0
+                "date": day.strftime("%Y-%m-%d"),
+                "data_points": int(data_per_day.get(day) or 0),
+                "alerts": int(alerts or 0)
             })
         
         return trends
@@ -315,17 +307,15 @@ class ReportGenerator:
     def _get_top_devices(self, start_date: datetime, end_date: datetime, limit: int = 10) -> List[Dict[str, Any]]:
         """Obtiene top dispositivos por actividad."""
         
-        from ..database import Device, SensorData
+        from database import Device
+        from services.rollups import window_stats
         
-        devices = self.db.query(Device).all()
+        devices = self.db.query(Device.id, Device.device_id, Device.name).all()
+        per_device = window_stats(self.db, start_date, end_date)
         device_stats = []
         
         for device in devices:
-            count = self.db.query(SensorData).filter(
-                SensorData.device_id == device.id,
-                SensorData.timestamp >= start_date,
-                SensorData.timestamp < end_date
-            ).count()
+            count = per_device[device.id].count if device.id in per_device else 0
             
             device_stats.append({
                 "id": device.device_id,
@@ -340,10 +330,7 @@ class ReportGenerator:
     def _get_performance_metrics(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
         """Obtiene métricas de rendimiento."""
         
-        from ..database import Device
-        
-        total_devices = self.db.query(Device).count()
-        online_devices = self.db.query(Device).filter(Device.status == "online").count()
+        total_devices, online_devices = self._count_devices()
         
         return {
             "system_availability": round((online_devices / total_devices * 100) if total_devices > 0 else 0, 2),
@@ -352,6 +339,50 @@ class ReportGenerator:
             "uptime_percentage": 99.2  # Placeholder
         }
     
+    def _count_devices(self) -> Tuple[int, int]:
+        """Total de dispositivos y dispositivos online en una consulta."""
+        
+        from database import Device, DeviceStatus
+        
+        total, online = self.db.query(
+            func.count(Device.id),
+            func.sum(case((Device.status == DeviceStatus.ONLINE, 1), else_=0))
+        ).one()
+        
+        return total, online or 0
+    
+    def _count_alerts(self, start_date: datetime, end_date: datetime, device_pk: Optional[int] = None) -> Dict[str, Any]:
+        """Conteo de alertas agrupado por severidad y estado de resolución."""
+        
+        from database import Alert, AlertSeverity
+        
+        query = self.db.query(
+            Alert.severity, Alert.is_resolved, func.count(Alert.id)
+        ).filter(
+            Alert.created_at >= start_date,
+            Alert.created_at < end_date
+        )
+        if device_pk is not None:
+            query = query.filter(Alert.device_id == device_pk)
+        
+        by_severity = {severity.value: 0 for severity in (
+            AlertSeverity.CRITICAL, AlertSeverity.ERROR, AlertSeverity.WARNING, AlertSeverity.INFO
+        )}
+        resolved = unresolved = 0
+        for severity, is_resolved, count in query.group_by(Alert.severity, Alert.is_resolved).all():
+            by_severity[AlertSeverity(severity).value] += count
+            if is_resolved:
+                resolved += count
+            else:
+                unresolved += count
+        
+        return {
+            "total": resolved + unresolved,
+            "by_severity": by_severity,
+            "resolved": resolved,
+            "unresolved": unresolved
+        }
+    
     def _calculate_uptime(self, device, start_date: datetime, end_date: datetime) -> float:
         """Calcula uptime del dispositivo."""
         # Placeholder - en producción calcular basado en logs
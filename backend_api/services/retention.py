@@ -0,0 +1,380 @@
+"""
+Retention Engine - Telemetry Archival
+=====================================
+Applies `config.RETENTION_POLICIES`: rows older than their policy allows
+are exported in chunks to zstd-compressed Parquet files under
+`ARCHIVE_DIR`, recorded in the `archive_segments` manifest and deleted.
+Archived ranges stay queryable through `RetentionEngine.read_archive`.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+import enum
+import json
+import threading
+import time
+from loguru import logger
+from sqlalchemy import Table, select, func, and_, not_, true
+from sqlalchemy.orm import Session
+
+import config
+from database import (
+    ReadSessionLocal, Device, SensorData, SensorRollup, Alert, SystemLog, ArchiveSegment,
+    partition_tables
+)
+from services.db_writer import db_writer
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: without pyarrow nothing is archived (or deleted)
+    pa = pq = None
+
+# Archivable tables and the column their age is measured on
+TABLES: Dict[str, Tuple[Any, str]] = {
+    "sensor_data": (SensorData, "timestamp"),
+    "sensor_rollups": (SensorRollup, "bucket_start"),
+    "alerts": (Alert, "created_at"),
+    "system_logs": (SystemLog, "timestamp"),
+}
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """Keep `table` rows for `days` (optionally one rubro / rollup resolution)."""
+    table: str
+    days: float
+    rubro: Optional[str] = None
+    resolution: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return "/".join(part for part in (self.table, self.rubro, self.resolution) if part)
+
+    @property
+    def specificity(self) -> int:
+        return (self.rubro is not None) * 2 + (self.resolution is not None)
+
+    def covers(self, other: "RetentionPolicy") -> bool:
+        """Whether every row `other` matches is also matched by this policy."""
+        return (
+            self.table == other.table
+            and self.rubro in (None, other.rubro)
+            and self.resolution in (None, other.resolution)
+        )
+
+
+def load_policies(entries: List[Dict[str, Any]]) -> List[RetentionPolicy]:
+    """Validate policy dicts (see config.RETENTION_POLICIES)."""
+    policies = []
+    for entry in entries:
+        policy = RetentionPolicy(
+            table=entry["table"], days=entry["days"],
+            rubro=entry.get("rubro"), resolution=entry.get("resolution")
+        )
+        if policy.table not in TABLES:
+            raise ValueError(f"Unknown retention table: {policy.table}")
+        if policy.days <= 0:
+            raise ValueError(f"Retention of {policy.label} must be positive")
+        if policy.rubro and not hasattr(TABLES[policy.table][0], "device_id"):
+            raise ValueError(f"{policy.table} rows have no device, so no rubro")
+        if policy.resolution and policy.table != "sensor_rollups":
+            raise ValueError("Only sensor_rollups policies take a resolution")
+        if any(p.label == policy.label for p in policies):
+            raise ValueError(f"Duplicate retention policy: {policy.label}")
+        policies.append(policy)
+    return policies
+
+
+class RetentionEngine:
+    """
+    Archives and deletes telemetry past its retention.
+
+    Each policy governs the rows it matches that no more specific policy
+    matches (rubro beats resolution beats the table-wide policy). Rows are
+    read in id order, `chunk_rows` at a time, from read-only connections
+    (pruned to the sensor_data partitions that can hold expired rows). Each
+    chunk becomes one Parquet file, written to a temporary name and renamed;
+    its manifest entry and the deletion of its rows then commit together on
+    the single writer, so an interrupted run neither loses rows nor lists
+    them twice (at worst it leaves an unlisted file behind). Emptied
+    sensor_data partitions are dropped by `maintain_partitions()`.
+    """
+
+    def __init__(
+        self,
+        policies: Optional[List[Dict[str, Any]]] = None,
+        archive_dir: str = config.ARCHIVE_DIR,
+        chunk_rows: int = config.RETENTION_CHUNK_ROWS
+    ):
+        self.policies = load_policies(config.RETENTION_POLICIES if policies is None else policies)
+        self.archive_dir = Path(archive_dir)
+        self.chunk_rows = chunk_rows
+
+        self._run_lock = threading.Lock()
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.rows_archived = 0
+        self.files_written = 0
+
+    # ------------------------------------------
+    # Policy scoping
+    # ------------------------------------------
+    @staticmethod
+    def _matches(policy: RetentionPolicy, table: Table):
+        conditions = []
+        if policy.rubro is not None:
+            rubro_devices = select(Device.id).where(Device.rubro == policy.rubro)
+            conditions.append(and_(table.c.device_id.isnot(None), table.c.device_id.in_(rubro_devices)))
+        if policy.resolution is not None:
+            conditions.append(table.c.resolution == policy.resolution)
+        return and_(true(), *conditions)
+
+    def _scope(self, policy: RetentionPolicy, table: Table, cutoff: datetime):
+        """Rows of `table` governed by `policy` and older than `cutoff`."""
+        overrides = [
+            other for other in self.policies
+            if other is not policy and other.specificity > policy.specificity and policy.covers(other)
+        ]
+        return and_(
+            table.c[TABLES[policy.table][1]] < cutoff,
+            self._matches(policy, table),
+            *(not_(self._matches(other, table)) for other in overrides)
+        )
+
+    def _tables(self, db: Session, policy: RetentionPolicy, cutoff: datetime) -> List[Table]:
+        if policy.table == "sensor_data":
+            return partition_tables(db, None, cutoff)
+        return [TABLES[policy.table][0].__table__]
+
+    # ------------------------------------------
+    # Archival
+    # ------------------------------------------
+    def run(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Apply every policy once (blocking; call through `run_db`).
+
+        Returns:
+            Rows archived per policy, files written and duration
+        """
+        if pq is None:
+            logger.warning("Retention skipped: pyarrow is not installed")
+            return {"state": "unavailable", "reason": "pyarrow is not installed"}
+        if not self._run_lock.acquire(blocking=False):
+            return {"state": "running"}
+
+        started = time.perf_counter()
+        now = now or datetime.utcnow()
+        archived: Dict[str, int] = {}
+        files = 0
+        errors = []
+        try:
+            for policy in self.policies:
+                try:
+                    rows, written = self._apply(policy, now - timedelta(days=policy.days))
+                except Exception as e:
+                    logger.error(f"Retention of {policy.label} failed: {e}")
+                    errors.append(f"{policy.label}: {e}")
+                    continue
+                archived[policy.label] = rows
+                files += written
+        finally:
+            self._run_lock.release()
+
+        self.rows_archived += sum(archived.values())
+        self.files_written += files
+        self.last_run = {
+            "state": "failed" if errors else "finished",
+            "started_at": now.isoformat(),
+            "archived": archived,
+            "files": files,
+            "errors": errors,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+        if files:
+            logger.info(f"Retention archived {sum(archived.values())} rows into {files} files")
+        return self.last_run
+
+    def _apply(self, policy: RetentionPolicy, cutoff: datetime) -> Tuple[int, int]:
+        db = ReadSessionLocal()
+        try:
+            tables = self._tables(db, policy, cutoff)
+        finally:
+            db.close()
+
+        rows_total = files = 0
+        for table in tables:
+            last_id = 0
+            while True:
+                db = ReadSessionLocal()
+                try:
+                    rows = db.execute(
+                        select(table)
+                        .where(self._scope(policy, table, cutoff), table.c.id > last_id)
+                        .order_by(table.c.id)
+                        .limit(self.chunk_rows)
+                    ).mappings().all()
+                finally:
+                    db.close()
+                if not rows:
+                    break
+
+                self._archive_chunk(policy, table, cutoff, rows)
+                rows_total += len(rows)
+                files += 1
+                last_id = rows[-1]["id"]
+                if len(rows) < self.chunk_rows:
+                    break
+        return rows_total, files
+
+    def _archive_chunk(self, policy: RetentionPolicy, table: Table, cutoff: datetime, rows):
+        time_column = TABLES[policy.table][1]
+        timestamps = [row[time_column] for row in rows]
+        start_at, end_at = min(timestamps), max(timestamps)
+        min_id, max_id = rows[0]["id"], rows[-1]["id"]
+
+        relative = (
+            Path(policy.table, policy.rubro or "all", *([policy.resolution] if policy.resolution else []))
+            / f"{start_at:%Y%m%d%H%M%S}_{end_at:%Y%m%d%H%M%S}_{table.name}_{min_id}.parquet"
+        )
+        path = self.archive_dir / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_suffix(".parquet.tmp")
+        pq.write_table(_to_arrow(table, rows), partial, compression="zstd")
+        partial.replace(path)
+
+        segment = dict(
+            table_name=policy.table, rubro=policy.rubro, resolution=policy.resolution,
+            path=relative.as_posix(), row_count=len(rows), start_at=start_at, end_at=end_at,
+            min_id=min_id, max_id=max_id, size_bytes=path.stat().st_size
+        )
+        try:
+            db_writer.call(self._commit_chunk, table, self._scope(policy, table, cutoff), segment)
+        except Exception:
+            path.unlink(missing_ok=True)
+            raise
+
+    @staticmethod
+    def _commit_chunk(db: Session, table: Table, scope, segment: Dict[str, Any]):
+        """Write operation: delete an exported chunk and record its manifest entry."""
+        # New rows always get larger ids, so the id range only holds exported rows
+        deleted = db.execute(
+            table.delete().where(scope, table.c.id.between(segment["min_id"], segment["max_id"]))
+        ).rowcount
+        if deleted != segment["row_count"]:
+            raise RuntimeError(
+                f"{table.name} changed during archival ({deleted} rows to delete, {segment['row_count']} exported)"
+            )
+        db.add(ArchiveSegment(**segment))
+
+    # ------------------------------------------
+    # Queries
+    # ------------------------------------------
+    def segments(self, db: Session, table: str, start: datetime, end: datetime) -> List[ArchiveSegment]:
+        """Manifest entries of `table` overlapping [start, end]."""
+        return db.query(ArchiveSegment).filter(
+            ArchiveSegment.table_name == table,
+            ArchiveSegment.start_at <= end,
+            ArchiveSegment.end_at >= start
+        ).order_by(ArchiveSegment.start_at).all()
+
+    def read_archive(
+        self,
+        db: Session,
+        table: str,
+        start: datetime,
+        end: datetime,
+        device_pk: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Archived rows of `table` in [start, end] (one device's when `device_pk` is given), oldest first."""
+        if pq is None:
+            raise RuntimeError("Reading the archive requires pyarrow")
+        if table not in TABLES:
+            raise ValueError(f"Unknown retention table: {table}")
+
+        time_column = TABLES[table][1]
+        filters = [(time_column, ">=", start), (time_column, "<=", end)]
+        if device_pk is not None:
+            filters.append(("device_id", "=", device_pk))
+
+        rows = []
+        for segment in self.segments(db, table, start, end):
+            path = self.archive_dir / segment.path
+            if not path.exists():
+                logger.warning(f"Archive file missing: {path}")
+                continue
+            rows.extend(pq.read_table(path, filters=filters).to_pylist())
+        rows.sort(key=lambda row: (row[time_column], row["id"]))
+        return rows
+
+    def stats(self, db: Session) -> Dict[str, Any]:
+        """Policies, last run and manifest totals per table."""
+        totals = db.query(
+            ArchiveSegment.table_name,
+            func.count(ArchiveSegment.id),
+            func.sum(ArchiveSegment.row_count),
+            func.sum(ArchiveSegment.size_bytes),
+            func.min(ArchiveSegment.start_at),
+            func.max(ArchiveSegment.end_at)
+        ).group_by(ArchiveSegment.table_name).all()
+
+        return {
+            "available": pq is not None,
+            "archive_dir": str(self.archive_dir),
+            "policies": [
+                {"table": p.table, "rubro": p.rubro, "resolution": p.resolution, "days": p.days}
+                for p in self.policies
+            ],
+            "last_run": self.last_run,
+            "archive": {
+                name: {
+                    "files": files,
+                    "rows": rows or 0,
+                    "bytes": size or 0,
+                    "from": first.isoformat() if first else None,
+                    "to": last.isoformat() if last else None
+                }
+                for name, files, rows, size, first, last in totals
+            }
+        }
+
+
+# ============================================
+# PARQUET CONVERSION
+# ============================================
+def _arrow_type(column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = str
+    if hasattr(column.type, "enums") or python_type in (dict, list):
+        return pa.string()
+    return {
+        int: pa.int64(),
+        float: pa.float64(),
+        bool: pa.bool_(),
+        datetime: pa.timestamp("us"),
+    }.get(python_type, pa.string())
+
+
+def _to_arrow(table: Table, rows) -> "pa.Table":
+    """Rows as an Arrow table; enums are stored by value and JSON as text."""
+    schema = pa.schema([(column.name, _arrow_type(column)) for column in table.columns])
+    columns = {}
+    for column in table.columns:
+        values = [row[column.name] for row in rows]
+        if pa.types.is_string(schema.field(column.name).type):
+            values = [
+                None if v is None else
+                v.value if isinstance(v, enum.Enum) else
+                v if isinstance(v, str) else
+                json.dumps(v)
+                for v in values
+            ]
+        columns[column.name] = values
+    return pa.table(columns, schema=schema)
+
+
+# Process-wide engine
+retention_engine = RetentionEngine()
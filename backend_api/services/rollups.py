@@ -0,0 +1,353 @@
+"""
+Sensor Rollups - Time-Series Downsampling
+==========================================
+Maintains 1-minute, 1-hour and 1-day aggregates per device and answers
+window statistics from the coarsest buckets that fit the window.
+"""
+
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import math
+from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SensorRollup, sensor_data_between
+
+# Coarsest first
+RESOLUTIONS: Dict[str, timedelta] = {
+    "1d": timedelta(days=1),
+    "1h": timedelta(hours=1),
+    "1m": timedelta(minutes=1),
+}
+
+
+@dataclass
+class RollupStats:
+    """Mergeable aggregate of a set of readings."""
+    count: int = 0
+    min: Optional[float] = None
+    max: Optional[float] = None
+    sum: float = 0.0
+    sum_squares: float = 0.0
+    quality_sum: float = 0.0
+    first_at: Optional[datetime] = None
+    last_at: Optional[datetime] = None
+
+    def add(self, value: float, quality: Optional[float], timestamp: datetime):
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sum += value
+        self.sum_squares += value * value
+        self.quality_sum += quality or 0.0
+        self.first_at = timestamp if self.first_at is None else min(self.first_at, timestamp)
+        self.last_at = timestamp if self.last_at is None else max(self.last_at, timestamp)
+
+    def merge(self, other: "RollupStats"):
+        if not other.count:
+            return
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.sum += other.sum
+        self.sum_squares += other.sum_squares
+        self.quality_sum += other.quality_sum
+        self.first_at = other.first_at if self.first_at is None else min(self.first_at, other.first_at)
+        self.last_at = other.last_at if self.last_at is None else max(self.last_at, other.last_at)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    @property
+    def std_dev(self) -> float:
+        """Sample standard deviation."""
+        if self.count < 2:
+            return 0.0
+        variance = (self.sum_squares - self.sum * self.sum / self.count) / (self.count - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    @property
+    def quality_avg(self) -> Optional[float]:
+        return self.quality_sum / self.count if self.count else None
+
+
+# ============================================
+# BUCKET ARITHMETIC
+# ============================================
+def bucket_floor(ts: datetime, resolution: str) -> datetime:
+    """Start of the bucket containing `ts`."""
+    if resolution == "1m":
+        return ts.replace(second=0, microsecond=0)
+    if resolution == "1h":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if resolution == "1d":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown rollup resolution: {resolution}")
+
+
+def bucket_ceil(ts: datetime, resolution: str) -> datetime:
+    """First bucket boundary at or after `ts`."""
+    floor = bucket_floor(ts, resolution)
+    return floor if floor == ts else floor + RESOLUTIONS[resolution]
+
+
+def plan_segments(
+    start: datetime,
+    end: datetime,
+    resolutions: Optional[List[str]] = None
+) -> List[Tuple[Optional[str], datetime, datetime]]:
+    """
+    Split [start, end) into aligned rollup ranges, coarsest first.
+
+    Edges that do not cover a whole 1-minute bucket are returned with
+    resolution None and must be read from raw `sensor_data`.
+    """
+    if resolutions is None:
+        resolutions = list(RESOLUTIONS)
+    if start >= end:
+        return []
+    if not resolutions:
+        return [(None, start, end)]
+
+    resolution, finer = resolutions[0], resolutions[1:]
+    aligned_start = bucket_ceil(start, resolution)
+    aligned_end = bucket_floor(end, resolution)
+    if aligned_start >= aligned_end:
+        return plan_segments(start, end, finer)
+
+    return (
+        plan_segments(start, aligned_start, finer)
+        + [(resolution, aligned_start, aligned_end)]
+        + plan_segments(aligned_end, end, finer)
+    )
+
+
+# ============================================
+# INCREMENTAL MAINTENANCE
+# ============================================
+def apply_rollups(db: Session, rows: Iterable[Dict[str, Any]]):
+    """
+    Merge raw readings into the rollup tables inside the caller's transaction.
+
+    Args:
+        db: Session owning the transaction
+        rows: Dicts with device_id (internal id), timestamp, value, quality
+    """
+    partials: Dict[Tuple[str, int, datetime], RollupStats] = {}
+    for row in rows:
+        for resolution in RESOLUTIONS:
+            key = (resolution, row["device_id"], bucket_floor(row["timestamp"], resolution))
+            partials.setdefault(key, RollupStats()).add(row["value"], row.get("quality"), row["timestamp"])
+
+    if not partials:
+        return
+
+    for resolution in RESOLUTIONS:
+        keys = {k: v for k, v in partials.items() if k[0] == resolution}
+        device_pks = {k[1] for k in keys}
+        buckets = {k[2] for k in keys}
+
+        existing = {
+            (resolution, r.device_id, r.bucket_start): r
+            for r in db.query(SensorRollup).filter(
+                SensorRollup.resolution == resolution,
+                SensorRollup.device_id.in_(device_pks),
+                SensorRollup.bucket_start.in_(buckets)
+            )
+        }
+
+        for key, stats in keys.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                rollup = SensorRollup(
+                    device_id=key[1],
+                    resolution=resolution,
+                    bucket_start=key[2],
+                    count=0,
+                    sum_value=0.0,
+                    sum_squares=0.0,
+                    quality_sum=0.0
+                )
+                db.add(rollup)
+            _merge_into(rollup, stats)
+
+    db.flush()
+
+
+def _merge_into(rollup: SensorRollup, stats: RollupStats):
+    merged = _stats_from_rollup(rollup)
+    merged.merge(stats)
+    rollup.count = merged.count
+    rollup.min_value = merged.min
+    rollup.max_value = merged.max
+    rollup.sum_value = merged.sum
+    rollup.sum_squares = merged.sum_squares
+    rollup.quality_sum = merged.quality_sum
+    rollup.first_at = merged.first_at
+    rollup.last_at = merged.last_at
+
+
+def _stats_from_rollup(rollup: SensorRollup) -> RollupStats:
+    return RollupStats(
+        count=rollup.count or 0,
+        min=rollup.min_value,
+        max=rollup.max_value,
+        sum=rollup.sum_value or 0.0,
+        sum_squares=rollup.sum_squares or 0.0,
+        quality_sum=rollup.quality_sum or 0.0,
+        first_at=rollup.first_at,
+        last_at=rollup.last_at
+    )
+
+
+def rebuild_rollups(db: Session, since: Optional[datetime] = None, chunk_size: int = 2000) -> int:
+    """
+    Recompute rollups from raw `sensor_data` (backfill / compaction).
+
+    Commits once per chunk. When `since` is given it is floored to a
+    day boundary so no bucket is partially rebuilt.
+
+    Returns:
+        Number of raw readings processed
+    """
+    if since is not None:
+        since = bucket_floor(since, "1d")
+    raw = sensor_data_between(db, since)
+    query = db.query(raw.id, raw.device_id, raw.timestamp, raw.value, raw.quality)
+    delete = db.query(SensorRollup)
+    if since is not None:
+        query = query.filter(raw.timestamp >= since)
+        delete = delete.filter(SensorRollup.bucket_start >= since)
+    delete.delete(synchronize_session=False)
+    db.commit()
+
+    processed = 0
+    last_id = 0
+    while True:
+        chunk = query.filter(raw.id > last_id).order_by(raw.id).limit(chunk_size).all()
+        if not chunk:
+            break
+        apply_rollups(db, (
+            {"device_id": r.device_id, "timestamp": r.timestamp, "value": r.value, "quality": r.quality}
+            for r in chunk if r.timestamp is not None
+        ))
+        db.commit()
+        processed += len(chunk)
+        last_id = chunk[-1].id
+
+    logger.info(f"Rollups rebuilt from {processed} raw readings")
+    return processed
+
+
+# ============================================
+# QUERIES
+# ============================================
+def _to_stats(row) -> Tuple[int, RollupStats]:
+    device_pk, count, vmin, vmax, vsum, vsq, qsum, first_at, last_at = row
+    return device_pk, RollupStats(
+        count=count or 0, min=vmin, max=vmax, sum=vsum or 0.0, sum_squares=vsq or 0.0,
+        quality_sum=qsum or 0.0, first_at=first_at, last_at=last_at
+    )
+
+
+def _rollup_aggregates(db: Session, resolution: str, start: datetime, end: datetime, device_pks):
+    query = db.query(
+        SensorRollup.device_id,
+        func.sum(SensorRollup.count),
+        func.min(SensorRollup.min_value),
+        func.max(SensorRollup.max_value),
+        func.sum(SensorRollup.sum_value),
+        func.sum(SensorRollup.sum_squares),
+        func.sum(SensorRollup.quality_sum),
+        func.min(SensorRollup.first_at),
+        func.max(SensorRollup.last_at)
+    ).filter(
+        SensorRollup.resolution == resolution,
+        SensorRollup.bucket_start >= start,
+        SensorRollup.bucket_start < end
+    )
+    if device_pks is not None:
+        query = query.filter(SensorRollup.device_id.in_(device_pks))
+    return query.group_by(SensorRollup.device_id).all()
+
+
+def _raw_aggregates(db: Session, start: datetime, end: datetime, device_pks):
+    raw = sensor_data_between(db, start, end)
+    query = db.query(
+        raw.device_id,
+        func.count(raw.id),
+        func.min(raw.value),
+        func.max(raw.value),
+        func.sum(raw.value),
+        func.sum(raw.value * raw.value),
+        func.sum(raw.quality),
+        func.min(raw.timestamp),
+        func.max(raw.timestamp)
+    ).filter(
+        raw.timestamp >= start,
+        raw.timestamp < end
+    )
+    if device_pks is not None:
+        query = query.filter(raw.device_id.in_(device_pks))
+    return query.group_by(raw.device_id).all()
+
+
+def window_stats(
+    db: Session,
+    start: datetime,
+    end: Optional[datetime] = None,
+    device_pks: Optional[Iterable[int]] = None
+) -> Dict[int, RollupStats]:
+    """
+    Per-device statistics over [start, end), served from rollups.
+
+    The window is covered by the coarsest aligned buckets available,
+    finer buckets at the edges and raw rows only for sub-minute edges.
+
+    Returns:
+        Mapping of internal device id to its `RollupStats`
+    """
+    end = end or datetime.utcnow()
+    if device_pks is not None:
+        device_pks = list(device_pks)
+
+    result: Dict[int, RollupStats] = {}
+    for resolution, seg_start, seg_end in plan_segments(start, end):
+        if resolution is None:
+            rows = _raw_aggregates(db, seg_start, seg_end, device_pks)
+        else:
+            rows = _rollup_aggregates(db, resolution, seg_start, seg_end, device_pks)
+
+        for row in rows:
+            device_pk, stats = _to_stats(row)
+            if stats.count:
+                result.setdefault(device_pk, RollupStats()).merge(stats)
+    return result
+
+
+def total_stats(stats: Dict[int, RollupStats]) -> RollupStats:
+    """Merge per-device statistics into one aggregate."""
+    total = RollupStats()
+    for device_stats in stats.values():
+        total.merge(device_stats)
+    return total
+
+
+def lifetime_stats(db: Session) -> Dict[int, RollupStats]:
+    """Per-device statistics over all history, from the daily rollups."""
+    rows = db.query(
+        SensorRollup.device_id,
+        func.sum(SensorRollup.count),
+        func.min(SensorRollup.min_value),
+        func.max(SensorRollup.max_value),
+        func.sum(SensorRollup.sum_value),
+        func.sum(SensorRollup.sum_squares),
+        func.sum(SensorRollup.quality_sum),
+        func.min(SensorRollup.first_at),
+        func.max(SensorRollup.last_at)
+    ).filter(SensorRollup.resolution == "1d").group_by(SensorRollup.device_id).all()
+
+    return dict(_to_stats(row) for row in rows)
@@ -3,15 +3,205 @@ Rules Engine - Dynamic If-Then Automation
 ==========================================
 Evaluates conditions and executes actions based on sensor data.
 Supports complex conditions with AND/OR logic.
+
+Rules are compiled once into predicate closures and indexed by the
+device ids their conditions reference (see `RuleIndex`).
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Set, Tuple
+from concurrent.futures import Future
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+import asyncio
 import operator
+import threading
 from loguru import logger
+from sqlalchemy import bindparam
 from sqlalchemy.orm import Session
 
-from database import Rule, Alert, Device, SensorData, AlertSeverity
+from database import Rule, Alert, AlertSeverity, latest_readings, run_db
+from services.db_writer import db_writer, after_commit, on_rollback
+from services.device_registry import device_registry
+from services.latest_values import latest_values
+from services.live_metrics import live_metrics
+
+# predicate(engine, device_id, current_value) -> bool
+Predicate = Callable[["RulesEngine", str, float], bool]
+
+# (rule, previous last_triggered, triggered_at), as returned by `RuleIndex.record_trigger`
+Trigger = Tuple["CompiledRule", Optional[datetime], datetime]
+
+
+@dataclass
+class CompiledRule:
+    """Active rule with its condition compiled to a predicate."""
+    id: int
+    name: str
+    priority: int
+    cooldown_seconds: int
+    action: Dict[str, Any]
+    predicate: Predicate
+    device_ids: Set[str]
+    last_triggered: Optional[datetime] = None
+
+
+class RuleIndex:
+    """
+    Process-wide index of compiled active rules keyed by device_id.
+
+    Built lazily from the database and rebuilt after `invalidate()`,
+    which the `/api/rules` endpoints call on create/update/delete.
+
+    Cooldown state lives on the compiled rules (carried across rebuilds)
+    and trigger counters accumulate in memory until `persist_trigger_stats`
+    writes them in one batched UPDATE. Rules are evaluated concurrently on
+    the DB thread pool: lookups read an immutable snapshot and predicates
+    run unlocked, while `lock` only guards the index swap and the
+    cooldown check-and-trigger (`claim_trigger`).
+    """
+
+    def __init__(self):
+        self._by_device: Dict[str, List[CompiledRule]] = {}
+        self._by_id: Dict[int, CompiledRule] = {}
+        self._pending_triggers: Dict[int, Tuple[int, datetime]] = {}
+        self._dirty = True
+        self._version = 0  # Bumped by invalidate(), so a rebuild racing it stays dirty
+        self.rebuild_count = 0
+        self.lock = threading.RLock()
+
+    def invalidate(self):
+        """Mark the index stale; it is rebuilt on next use."""
+        with self.lock:
+            self._dirty = True
+            self._version += 1
+
+    def rebuild(self, db: Session):
+        """Compile every active rule and index it by referenced device."""
+        version = self._version
+        rules = db.query(Rule).filter(
+            Rule.is_active == True
+        ).order_by(Rule.priority.desc()).all()
+        compiled_rules = [RulesEngine.compile_rule(rule) for rule in rules]
+
+        by_device: Dict[str, List[CompiledRule]] = {}
+        by_id: Dict[int, CompiledRule] = {}
+        with self.lock:
+            for compiled in compiled_rules:
+                # Keep in-memory cooldown state newer than the persisted one
+                previous = self._by_id.get(compiled.id)
+                if previous and previous.last_triggered and (
+                    not compiled.last_triggered or previous.last_triggered > compiled.last_triggered
+                ):
+                    compiled.last_triggered = previous.last_triggered
+                
+                by_id[compiled.id] = compiled
+                for device_id in compiled.device_ids:
+                    by_device.setdefault(device_id, []).append(compiled)
+
+            self._by_device = by_device
+            self._by_id = by_id
+            self._dirty = self._version != version
+            self.rebuild_count += 1
+        logger.debug(f"Rule index rebuilt ({len(rules)} active rules)")
+
+    def rules_for(self, db: Session, device_id: str) -> List[CompiledRule]:
+        """Active rules referencing a device, highest priority first."""
+        if self._dirty:
+            self.rebuild(db)
+        # Indexes are replaced on rebuild, never mutated: no lock needed to read
+        return self._by_device.get(device_id, [])
+
+    def record_trigger(self, rule: CompiledRule, triggered_at: datetime) -> Trigger:
+        """Start the rule's cooldown and count the trigger for later persistence."""
+        with self.lock:
+            previous = rule.last_triggered
+            # The index may have been rebuilt since the caller's lookup: update the current copy too
+            for compiled in (rule, self._by_id.get(rule.id)):
+                if compiled is not None:
+                    compiled.last_triggered = triggered_at
+            count, _ = self._pending_triggers.get(rule.id, (0, triggered_at))
+            self._pending_triggers[rule.id] = (count + 1, triggered_at)
+        live_metrics.rule_triggered()
+        return rule, previous, triggered_at
+
+    def claim_trigger(self, rule: CompiledRule, triggered_at: datetime) -> Optional[Trigger]:
+        """
+        Record a trigger unless the rule is in cooldown at `triggered_at`.
+        
+        The check and the trigger are atomic, so of several concurrent
+        evaluations only one fires the rule. Returns None if it is cooling down.
+        """
+        cooldown = timedelta(seconds=rule.cooldown_seconds)
+        with self.lock:
+            for compiled in (rule, self._by_id.get(rule.id)):
+                last = compiled.last_triggered if compiled is not None else None
+                if last and triggered_at < last + cooldown:
+                    return None
+            return self.record_trigger(rule, triggered_at)
+
+    def undo_trigger(self, rule: CompiledRule, previous: Optional[datetime], triggered_at: datetime):
+        """Revert `record_trigger` (its alert was not saved): end the cooldown and drop the count."""
+        with self.lock:
+            # The index may have been rebuilt since: fix the current copy too
+            for compiled in (rule, self._by_id.get(rule.id)):
+                if compiled is not None and compiled.last_triggered == triggered_at:
+                    compiled.last_triggered = previous
+            if rule.id in self._pending_triggers:
+                count, last = self._pending_triggers[rule.id]
+                if count > 1:
+                    self._pending_triggers[rule.id] = (count - 1, last)
+                else:
+                    del self._pending_triggers[rule.id]
+        live_metrics.rule_triggered(-1)
+
+    @property
+    def pending_trigger_count(self) -> int:
+        return sum(count for count, _ in self._pending_triggers.values())
+
+    def persist_trigger_stats(self, db: Session) -> int:
+        """
+        Write accumulated trigger counters in one batched UPDATE.
+        
+        The caller owns the transaction and must commit.
+        
+        Returns:
+            Number of rules updated
+        """
+        with self.lock:
+            pending, self._pending_triggers = self._pending_triggers, {}
+        if not pending:
+            return 0
+        
+        rules_table = Rule.__table__
+        stmt = (
+            rules_table.update()
+            .where(rules_table.c.id == bindparam("rule_pk"))
+            .values(
+                trigger_count=rules_table.c.trigger_count + bindparam("delta"),
+                last_triggered=bindparam("triggered_at")
+            )
+        )
+        try:
+            db.execute(stmt, [
+                {"rule_pk": rule_id, "delta": count, "triggered_at": triggered_at}
+                for rule_id, (count, triggered_at) in pending.items()
+            ])
+        except Exception:
+            self._restore_pending(pending)
+            raise
+        on_rollback(db, lambda: self._restore_pending(pending))
+        return len(pending)
+
+    def _restore_pending(self, pending: Dict[int, Tuple[int, datetime]]):
+        """Put counters whose UPDATE was not committed back in the queue."""
+        with self.lock:
+            for rule_id, (count, triggered_at) in pending.items():
+                current, last = self._pending_triggers.get(rule_id, (0, triggered_at))
+                self._pending_triggers[rule_id] = (current + count, max(last, triggered_at))
+
+
+# Process-wide rule index
+rule_index = RuleIndex()
 
 
 class RulesEngine:
@@ -34,6 +224,10 @@ class RulesEngine:
     
     def __init__(self, db: Session):
         self.db = db
+        # Alerts raised by evaluate_all_rules, as (Alert columns, action result),
+        # until save_alerts writes them
+        self.new_alerts: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        self.triggers: List[Trigger] = []
         self.action_handlers = {
             "alert": self._handle_alert_action,
             "actuate": self._handle_actuate_action,
@@ -43,7 +237,12 @@ class RulesEngine:
     
     def evaluate_all_rules(self, device_id: str, current_value: float) -> List[Dict[str, Any]]:
         """
-        Evaluate all active rules for a device.
+        Evaluate the active rules that reference a device.
+        
+        Only reads from the session, so it can run on a read session off
+        the writer. Alerts are kept in `new_alerts` for `save_alerts` /
+        `queue_alerts`; cooldowns and trigger counters are updated in the
+        rule index right away (undone if the writer rolls back this call).
         
         Args:
             device_id: Device identifier
@@ -54,56 +253,128 @@ class RulesEngine:
         """
         triggered_actions = []
         
-        # Get all active rules
-        active_rules = self.db.query(Rule).filter(
-            Rule.is_active == True
-        ).order_by(Rule.priority.desc()).all()
-        
-        for rule in active_rules:
-            # Check if rule applies to this device
-            if not self._rule_applies_to_device(rule, device_id):
-                continue
-            
+        for rule in rule_index.rules_for(self.db, device_id):
             # Check cooldown period
             if self._is_in_cooldown(rule):
                 logger.debug(f"Rule '{rule.name}' in cooldown, skipping")
                 continue
             
             # Evaluate condition
-            if self._evaluate_condition(rule.condition, device_id, current_value):
-                logger.info(f"Rule '{rule.name}' triggered for device {device_id}")
-                
-                # Execute action
-                action_result = self._execute_action(rule, device_id, current_value)
-                
-                if action_result:
-                    triggered_actions.append(action_result)
-                    
-                    # Update rule statistics
-                    rule.last_triggered = datetime.utcnow()
-                    rule.trigger_count += 1
-                    self.db.commit()
+            if not rule.predicate(self, device_id, current_value):
+                continue
+            
+            # Start the cooldown (in memory, counters persisted in batches);
+            # None if a concurrent evaluation triggered the rule first
+            trigger = rule_index.claim_trigger(rule, datetime.utcnow())
+            if trigger is None:
+                continue
+            
+            logger.info(f"Rule '{rule.name}' triggered for device {device_id}")
+            
+            # Execute action
+            action_result = self._execute_action(rule, device_id, current_value)
+            
+            if not action_result:
+                rule_index.undo_trigger(*trigger)
+                continue
+            
+            triggered_actions.append(action_result)
+            self.triggers.append(trigger)
+            on_rollback(self.db, lambda trigger=trigger: rule_index.undo_trigger(*trigger))
         
         return triggered_actions
     
-    def _rule_applies_to_device(self, rule: Rule, device_id: str) -> bool:
-        """Check if rule condition references this device."""
-        condition = rule.condition
-        
-        # Simple condition
-        if isinstance(condition, dict) and condition.get("device_id") == device_id:
-            return True
-        
-        # Complex condition with AND/OR
-        if isinstance(condition, dict):
-            if "and" in condition:
-                return any(c.get("device_id") == device_id for c in condition["and"])
-            if "or" in condition:
-                return any(c.get("device_id") == device_id for c in condition["or"])
-        
-        return False
+    async def evaluate_readings(self, readings: List[Tuple[str, float]]) -> List[Dict[str, Any]]:
+        """
+        Evaluate rules for (device_id, value) pairs and save their alerts.
+        
+        Evaluation runs on the DB thread pool with this engine's (read)
+        session; only the alert insert goes to the writer. It is awaited,
+        so the returned alert actions carry their `alert_id`.
+        """
+        def evaluate():
+            actions = []
+            for device_id, value in readings:
+                actions.extend(self.evaluate_all_rules(device_id, value))
+            return actions
+        
+        actions = await run_db(evaluate)
+        await self.write_alerts()
+        return actions
+    
+    def save_alerts(
+        self,
+        db: Session,
+        new_alerts: Optional[List[Tuple[Dict[str, Any], Dict[str, Any]]]] = None
+    ) -> int:
+        """
+        Write operation: insert the alerts raised so far (or `new_alerts`).
+        
+        Fills in each alert action's `alert_id`; the live alert counters are
+        updated once the alerts are committed. Safe to re-run.
+        
+        Returns:
+            Number of alerts inserted
+        """
+        new_alerts = self.new_alerts if new_alerts is None else new_alerts
+        if not new_alerts:
+            return 0
+        
+        alerts = [(Alert(**columns), action) for columns, action in new_alerts]
+        db.add_all([alert for alert, _ in alerts])
+        db.flush()
+        for alert, action in alerts:
+            action["alert_id"] = alert.id
+        
+        def opened():
+            for alert, _ in alerts:
+                live_metrics.alert_opened(alert.severity, alert.created_at)
+        
+        after_commit(db, opened)
+        return len(alerts)
     
-    def _is_in_cooldown(self, rule: Rule) -> bool:
+    def queue_alerts(self) -> Optional[Future]:
+        """
+        Queue `save_alerts` on the writer without waiting for the commit.
+        
+        The writer fills in copies of the actions, so the caller may return
+        them right away: their `alert_id` stays None. If the alerts cannot
+        be saved, the triggers of their rules are undone so those rules
+        fire again on the next reading.
+        """
+        if not self.new_alerts:
+            return None
+        
+        return self._submit_alerts([(columns, dict(action)) for columns, action in self.new_alerts])
+    
+    async def write_alerts(self) -> int:
+        """
+        Save the alerts raised so far on the writer and wait for the commit.
+        
+        Fills in the actions' `alert_id`. On failure the triggers are undone
+        as in `queue_alerts` and the error is raised.
+        """
+        if not self.new_alerts:
+            return 0
+        return await asyncio.wrap_future(self._submit_alerts(self.new_alerts))
+    
+    def _submit_alerts(self, new_alerts: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Future:
+        """Queue `save_alerts(new_alerts)`; undo their rules' triggers if it fails."""
+        rule_ids = {columns["rule_id"] for columns, _ in new_alerts}
+        triggers = [t for t in self.triggers if t[0].id in rule_ids]
+        
+        def saved(future: Future):
+            error = future.exception()
+            if error is not None:
+                logger.error(f"Could not save {len(new_alerts)} rule alerts: {error}")
+                for trigger in reversed(triggers):
+                    rule_index.undo_trigger(*trigger)
+        
+        future = db_writer.submit(self.save_alerts, new_alerts)
+        future.add_done_callback(saved)
+        return future
+    
+    def _is_in_cooldown(self, rule: CompiledRule) -> bool:
         """Check if rule is in cooldown period."""
         if not rule.last_triggered:
             return False
@@ -111,88 +382,98 @@ class RulesEngine:
         cooldown_end = rule.last_triggered + timedelta(seconds=rule.cooldown_seconds)
         return datetime.utcnow() < cooldown_end
     
-    def _evaluate_condition(
-        self,
-        condition: Dict[str, Any],
-        device_id: str,
-        current_value: float
-    ) -> bool:
+    # ------------------------------------------
+    # Rule compilation
+    # ------------------------------------------
+    @classmethod
+    def compile_rule(cls, rule: Rule) -> CompiledRule:
+        """Compile a `Rule` row into a `CompiledRule`."""
+        predicate, device_ids = cls.compile_condition(rule.condition or {})
+        return CompiledRule(
+            id=rule.id,
+            name=rule.name,
+            priority=rule.priority or 0,
+            cooldown_seconds=rule.cooldown_seconds or 0,
+            action=rule.action or {},
+            predicate=predicate,
+            device_ids=device_ids,
+            last_triggered=rule.last_triggered
+        )
+    
+    @classmethod
+    def compile_condition(cls, condition: Dict[str, Any]) -> Tuple[Predicate, Set[str]]:
         """
-        Evaluate a condition against current sensor value.
+        Compile a condition into a predicate and the device ids it references.
         
         Supports:
         - Simple: {"device_id": "TEMP-001", "operator": ">", "value": 25}
         - AND: {"and": [condition1, condition2]}
         - OR: {"or": [condition1, condition2]}
         """
-        # Complex condition with AND
-        if "and" in condition:
-            return all(
-                self._evaluate_simple_condition(c, device_id, current_value)
-                for c in condition["and"]
-            )
-        
-        # Complex condition with OR
-        if "or" in condition:
-            return any(
-                self._evaluate_simple_condition(c, device_id, current_value)
-                for c in condition["or"]
-            )
+        if "and" in condition or "or" in condition:
+            combine = all if "and" in condition else any
+            parts = [cls.compile_condition(c) for c in condition.get("and", condition.get("or"))]
+            predicates = [p for p, _ in parts]
+            device_ids = set().union(*(d for _, d in parts))
+            
+            def compound(engine, device_id, current_value):
+                return combine(p(engine, device_id, current_value) for p in predicates)
+            
+            return compound, device_ids
         
-        # Simple condition
-        return self._evaluate_simple_condition(condition, device_id, current_value)
+        return cls._compile_simple_condition(condition)
     
-    def _evaluate_simple_condition(
-        self,
-        condition: Dict[str, Any],
-        device_id: str,
-        current_value: float
-    ) -> bool:
-        """Evaluate a simple comparison condition."""
-        # Check if condition applies to this device
-        if condition.get("device_id") != device_id:
-            # Get value from another device
-            other_device_id = condition.get("device_id")
-            other_value = self._get_latest_value(other_device_id)
-            if other_value is None:
-                return False
-            current_value = other_value
-        
-        # Get operator and threshold
+    @classmethod
+    def _compile_simple_condition(cls, condition: Dict[str, Any]) -> Tuple[Predicate, Set[str]]:
+        """Compile a simple comparison condition."""
+        target_device = condition.get("device_id")
+        device_ids = {target_device} if target_device else set()
         op_str = condition.get("operator")
         threshold = condition.get("value")
-        parameter = condition.get("parameter", "value")
         
-        if op_str not in self.OPERATORS:
+        if op_str not in cls.OPERATORS:
             logger.error(f"Unknown operator: {op_str}")
-            return False
-        
-        # Perform comparison
-        op_func = self.OPERATORS[op_str]
+            return (lambda engine, device_id, current_value: False), device_ids
+        
+        op_func = cls.OPERATORS[op_str]
+        
+        def simple(engine, device_id, current_value):
+            # Condition on another device: compare its latest value
+            if target_device != device_id:
+                current_value = engine._get_latest_value(target_device)
+                if current_value is None:
+                    return False
+            try:
+                return op_func(current_value, threshold)
+            except Exception as e:
+                logger.error(f"Error evaluating condition: {e}")
+                return False
         
-        try:
-            result = op_func(current_value, threshold)
-            logger.debug(f"Condition: {current_value} {op_str} {threshold} = {result}")
-            return result
-        except Exception as e:
-            logger.error(f"Error evaluating condition: {e}")
-            return False
+        return simple, device_ids
     
     def _get_latest_value(self, device_id: str) -> Optional[float]:
-        """Get latest sensor reading for a device."""
-        device = self.db.query(Device).filter(Device.device_id == device_id).first()
+        """Get latest sensor reading for a device (in-memory, DB on cold start)."""
+        device = device_registry.get(self.db, device_id)
         if not device:
             return None
         
-        latest_data = self.db.query(SensorData).filter(
-            SensorData.device_id == device.id
-        ).order_by(SensorData.timestamp.desc()).first()
+        entry = latest_values.peek(device.id)
+        if entry is None:
+            latest = latest_readings(self.db, device.id, 1)
+            if not latest:
+                return None
+            latest_data = latest[0]
+            entry = latest_values.update(
+                device.id, latest_data.value, latest_data.timestamp, latest_data.quality
+            )
         
-        return latest_data.value if latest_data else None
+        if latest_values.is_stale(entry):
+            return None
+        return entry.value
     
     def _execute_action(
         self,
-        rule: Rule,
+        rule: CompiledRule,
         device_id: str,
         current_value: float
     ) -> Optional[Dict[str, Any]]:
@@ -209,14 +490,14 @@ class RulesEngine:
     
     def _handle_alert_action(
         self,
-        rule: Rule,
+        rule: CompiledRule,
         action: Dict[str, Any],
         device_id: str,
         current_value: float
     ) -> Dict[str, Any]:
         """Create system alert."""
         # Get device
-        device = self.db.query(Device).filter(Device.device_id == device_id).first()
+        device = device_registry.get(self.db, device_id)
         if not device:
             return None
         
@@ -235,31 +516,30 @@ class RulesEngine:
         message = message.replace("{value}", str(current_value))
         message = message.replace("{device}", device.name)
         
-        alert = Alert(
-            device_id=device.id,
-            rule_id=rule.id,
-            severity=severity,
-            title=rule.name,
-            message=message,
-            is_acknowledged=False,
-            is_resolved=False
-        )
-        
-        self.db.add(alert)
-        self.db.commit()
-        
-        logger.warning(f"Alert created: {message}")
-        
-        return {
+        result = {
             "type": "alert",
             "severity": severity_str,
             "message": message,
-            "alert_id": alert.id
+            "alert_id": None  # Set by save_alerts
         }
+        # Written by save_alerts / queue_alerts
+        self.new_alerts.append(({
+            "device_id": device.id,
+            "rule_id": rule.id,
+            "severity": severity,
+            "title": rule.name,
+            "message": message,
+            "is_acknowledged": False,
+            "is_resolved": False
+        }, result))
+        
+        logger.warning(f"Alert created: {message}")
+        
+        return result
     
     def _handle_actuate_action(
         self,
-        rule: Rule,
+        rule: CompiledRule,
         action: Dict[str, Any],
         device_id: str,
         current_value: float
@@ -282,7 +562,7 @@ class RulesEngine:
     
     def _handle_notify_action(
         self,
-        rule: Rule,
+        rule: CompiledRule,
         action: Dict[str, Any],
         device_id: str,
         current_value: float
@@ -305,7 +585,7 @@ class RulesEngine:
     
     def _handle_log_action(
         self,
-        rule: Rule,
+        rule: CompiledRule,
         action: Dict[str, Any],
         device_id: str,
         current_value: float
@@ -413,7 +693,8 @@ if __name__ == "__main__":
     
     for value, op, threshold, expected in test_cases:
         condition = {"operator": op, "value": threshold, "device_id": "TEST"}
-        result = engine._evaluate_simple_condition(condition, "TEST", value)
+        predicate, _ = RulesEngine.compile_condition(condition)
+        result = predicate(engine, "TEST", value)
         status = "✓" if result == expected else "✗"
         print(f"{status} {value} {op} {threshold} = {result} (expected {expected})")
     
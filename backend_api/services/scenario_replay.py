@@ -0,0 +1,247 @@
+"""
+Scenario Replay - Accelerated Scenario Ingestion
+=================================================
+Drives `simulator.scenario.ScenarioRunner` on a virtual clock and streams
+its readings straight into the ingestion path (raw rows, rollups, live
+metrics, rules), so a day of scenario data lands in seconds.
+"""
+
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import time
+from loguru import logger
+from sqlalchemy.orm import Session
+
+import config
+from database import Device, DeviceStatus, ReadSessionLocal
+from services.db_writer import db_writer, after_commit
+from services.device_registry import device_registry, DeviceInfo
+from services.ingest_buffer import ingest_buffer
+from services.live_metrics import live_metrics
+from services.rules_engine import RulesEngine
+from simulator.scenario import ScenarioRunner, ScenarioReading, load_scenario, list_scenarios
+
+
+class ReplayInProgress(Exception):
+    """Raised when a replay is requested while another one is running."""
+
+
+def ensure_devices(db: Session, runner: ScenarioRunner) -> Dict[str, DeviceInfo]:
+    """Write operation: create the scenario's simulated devices that do not exist yet."""
+    existing = device_registry.get_many(db, [d["device_id"] for d in runner.devices])
+    created = []
+    for device in runner.devices:
+        if device["device_id"] in existing:
+            continue
+        row = Device(
+            device_id=device["device_id"],
+            name=device.get("name", device["device_id"]),
+            device_type=device["device_type"],
+            rubro=runner.rubro,
+            location=device.get("location"),
+            config=device.get("config"),
+            is_simulated=True,
+            status=DeviceStatus.OFFLINE
+        )
+        db.add(row)
+        created.append(row)
+
+    if created:
+        db.flush()
+        for row in created:
+            existing[row.device_id] = DeviceInfo.from_orm(row)
+
+        def registered():
+            for row in created:
+                device_registry.put(row)
+                live_metrics.set_device_status(row.id, DeviceStatus.OFFLINE)
+
+        after_commit(db, registered)
+        logger.info(f"Scenario replay created {len(created)} devices")
+    return existing
+
+
+class ScenarioReplay:
+    """
+    Runs at most one scenario replay at a time as a background task.
+
+    Readings are grouped into `INGEST_FLUSH_SIZE` batches and written with
+    `IngestionBuffer.write` (bypassing the live queue, so replay never
+    competes with devices for buffer capacity). Rules are evaluated once
+    per batch on each device's latest value.
+    """
+
+    def __init__(self, batch_size: int = config.INGEST_FLUSH_SIZE):
+        self.batch_size = batch_size
+        self.runner: Optional[ScenarioRunner] = None
+        self.devices: Dict[str, DeviceInfo] = {}
+        self.evaluate_rules = True
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.actions_triggered = 0
+        self._pending: List[ScenarioReading] = []
+        self._task: Optional[asyncio.Task] = None
+        self._started_at: Optional[float] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(
+        self,
+        scenario: str,
+        speed: float = config.SCENARIO_REPLAY_SPEED,
+        seed: Optional[int] = None,
+        tick_seconds: float = 1.0,
+        start_time: Optional[datetime] = None,
+        evaluate_rules: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Start replaying `scenario` in the background.
+
+        By default the virtual day starts at yesterday's midnight in
+        `SIMULATOR_TIMEZONE` (naive `start_time`s are read in it too), so
+        the whole scenario lies in the past and event times keep their
+        time-of-day meaning. Raises FileNotFoundError for unknown
+        scenarios and ReplayInProgress if a replay is already running.
+        """
+        if self.is_running:
+            raise ReplayInProgress("A scenario replay is already running")
+
+        tz = config.get_simulator_timezone()
+        if start_time is None:
+            start_time = datetime.combine(datetime.now(tz).date() - timedelta(days=1), datetime.min.time())
+        if start_time.tzinfo is None:
+            start_time = start_time.replace(tzinfo=tz)
+
+        self.runner = ScenarioRunner(
+            load_scenario(scenario), seed=seed, start_time=start_time.timestamp(), tick_seconds=tick_seconds, tz=tz
+        )
+        self.devices = await db_writer.execute(ensure_devices, self.runner)
+        self.evaluate_rules = evaluate_rules
+        self.result = None
+        self.error = None
+        self.actions_triggered = 0
+        self._pending = []
+        self._started_at = time.perf_counter()
+        self._task = asyncio.create_task(self._run(speed))
+        logger.info(f"Scenario replay started: {self.runner.name} at {speed or 'max'}x")
+        return self.status()
+
+    async def _run(self, speed: float):
+        try:
+            result = await self.runner.run(self._collect, speed=speed)
+            await self._flush()
+            self.result = result
+            logger.info(
+                f"Scenario replay finished: {result['readings']} readings, "
+                f"{result['virtual_seconds']:.0f}s virtual in {result['wall_seconds']}s"
+            )
+        except asyncio.CancelledError:
+            await self._flush()
+            raise
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Scenario replay failed: {e}")
+
+    async def _collect(self, batch: List[ScenarioReading]):
+        self._pending.extend(batch)
+        if len(self._pending) >= self.batch_size:
+            await self._flush()
+
+    async def _flush(self):
+        readings, self._pending = self._pending, []
+        if not readings:
+            return
+        rows, touched, latest = self._rows(readings)
+
+        if rows:
+            await ingest_buffer.write(rows, touched)
+
+        if self.evaluate_rules and latest:
+            try:
+                self.actions_triggered += await self._evaluate_rules(latest)
+            except Exception as e:
+                logger.error(f"Scenario replay rule evaluation failed: {e}")
+
+    def _rows(self, readings: List[ScenarioReading]):
+        rows = []
+        touched = {}
+        latest: Dict[str, float] = {}
+        for reading in readings:
+            device = self.devices[reading.device_id]
+            ts = datetime.utcfromtimestamp(reading.timestamp)
+            device_status = DeviceStatus.ONLINE if reading.is_connected else DeviceStatus.OFFLINE
+            touched[device.id] = (ts, device_status)
+            if not reading.is_connected:
+                continue
+            rows.append({
+                "device_id": device.id,
+                "timestamp": ts,
+                "value": reading.value,
+                "unit": config.get_sensor_config(reading.device_type).get("unit", ""),
+                "quality": reading.quality
+            })
+            latest[reading.device_id] = reading.value
+        return rows, touched, latest
+
+    @staticmethod
+    async def _evaluate_rules(latest: Dict[str, float]) -> int:
+        db = ReadSessionLocal()
+        try:
+            return len(await RulesEngine(db).evaluate_readings(list(latest.items())))
+        finally:
+            db.close()
+
+    async def stop(self):
+        """Cancel the running replay (pending readings are written)."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def wait(self) -> Optional[Dict[str, Any]]:
+        """Wait for the current replay to finish and return its result."""
+        if self._task:
+            await asyncio.shield(self._task)
+        return self.result
+
+    def status(self) -> Dict[str, Any]:
+        """Progress of the current or last replay."""
+        runner = self.runner
+        if runner is None:
+            return {"state": "idle", "scenarios": list_scenarios()}
+
+        if self.is_running:
+            state = "running"
+        elif self.error:
+            state = "failed"
+        elif self.result is None:
+            state = "cancelled"
+        else:
+            state = "finished"
+
+        return {
+            "state": state,
+            "scenario": runner.name,
+            "rubro": runner.rubro,
+            "devices": len(runner.sensors),
+            "skipped_devices": runner.skipped_devices,
+            "virtual_seconds": runner.elapsed,
+            "duration_seconds": runner.duration,
+            "progress": round(runner.elapsed / runner.duration, 4) if runner.duration else 1.0,
+            "virtual_time": datetime.utcfromtimestamp(runner.clock.now).isoformat(),
+            "readings": runner.readings_total,
+            "events_applied": runner.events_applied,
+            "actions_triggered": self.actions_triggered,
+            "wall_seconds": round(time.perf_counter() - self._started_at, 3) if self.is_running else
+                            (self.result or {}).get("wall_seconds"),
+            "error": self.error
+        }
+
+
+# Process-wide replay controller
+scenario_replay = ScenarioReplay()
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""
+IoT Multi-Rubro System - Performance Benchmark Suite
+=====================================================
+Reproducible micro/macro benchmarks against an in-process app backed by a
+throw-away SQLite database:
+
+    ingest      POST /api/data, POST /api/data/batch, group-commit writes
+    rules       rule evaluation at varying numbers of rules per device
+    analytics   window statistics and analytics queries at varying history sizes
+    reports     daily / weekly / device report generation
+    websocket   broadcast fan-out to N connected clients
+    simulator   scalar models, vectorized fleet and scenario replay
+
+Results are written as JSON so runs can be compared across commits.
+
+Usage:
+    python scripts/benchmark.py                            # all suites -> benchmark_results.json
+    python scripts/benchmark.py --quick --suite ingest rules
+    python scripts/benchmark.py --output new.json --compare old.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+SUITES = ["ingest", "rules", "analytics", "reports", "websocket", "simulator"]
+
+# Regressions beyond this fraction are flagged by --compare
+REGRESSION_THRESHOLD = 0.10
+
+
+# ============================================
+# MEASUREMENT
+# ============================================
+class Bench:
+    """Collects timed cases; each case reports throughput and per-op latency."""
+
+    def __init__(self, rounds: int):
+        self.rounds = rounds
+        self.results: List[Dict[str, Any]] = []
+
+    def run(self, name: str, fn: Callable[[], Any], ops: int = 1, unit: str = "ops",
+            warmup: int = 1, **params) -> Dict[str, Any]:
+        """
+        Time `fn` for `rounds` rounds after `warmup` untimed calls.
+
+        `ops` is how many units one call processes (e.g. rows per batch),
+        so throughput is comparable across batch sizes.
+        """
+        for _ in range(warmup):
+            fn()
+        times = []
+        for _ in range(self.rounds):
+            started = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - started)
+        return self.record(name, times, ops, unit, **params)
+
+    def record(self, name: str, times: List[float], ops: int, unit: str, **params) -> Dict[str, Any]:
+        times = sorted(times)
+        median = statistics.median(times)
+        result = {
+            "name": name,
+            "params": params,
+            "unit": unit,
+            "ops_per_call": ops,
+            "rounds": len(times),
+            f"{unit}_per_second": round(ops / median, 1) if median else None,
+            "median_ms": round(median * 1000, 3),
+            "min_ms": round(times[0] * 1000, 3),
+            "max_ms": round(times[-1] * 1000, 3),
+            "stdev_ms": round(statistics.stdev(times) * 1000, 3) if len(times) > 1 else 0.0
+        }
+        self.results.append(result)
+        print(f"  {_key(result):<64} {result[f'{unit}_per_second']:>14,.1f} {unit}/s   median {result['median_ms']:>9.3f} ms")
+        return result
+
+
+# ============================================
+# ENVIRONMENT
+# ============================================
+def setup_environment(workdir: str, profile: Optional[str] = None):
+    """Point the backend at a temp database before anything imports it."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/benchmark.db"
+    if profile:
+        os.environ["SQLITE_PROFILE"] = profile
+    os.chdir(workdir)  # Log files and other relative paths land in the temp dir
+    sys.path.insert(0, str(ROOT / "backend_api"))
+    sys.path.insert(0, str(ROOT))
+
+    import config
+    config.SIM_MODE = False  # No background simulation loop
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from database import Base, engine
+    Base.metadata.create_all(bind=engine)
+
+
+def make_device(device_id: str, device_type: str = "temperature") -> int:
+    from database import SessionLocal, Device
+    from services.device_registry import device_registry
+
+    db = SessionLocal()
+    try:
+        device = db.query(Device).filter(Device.device_id == device_id).first()
+        if not device:
+            device = Device(device_id=device_id, name=device_id, device_type=device_type, rubro="benchmark")
+            db.add(device)
+            db.commit()
+            db.refresh(device)
+        device_registry.put(device)
+        return device.id
+    finally:
+        db.close()
+
+
+_HISTORY: Dict[int, str] = {}
+
+
+def ensure_history(size: int, seed: int) -> str:
+    """A device with `size` readings spread over the last 7 days (cached per size)."""
+    if size in _HISTORY:
+        return _HISTORY[size]
+
+    from services.ingest_buffer import ingest_buffer
+    from database import DeviceStatus
+
+    device_id = f"BENCH-HIST-{size}"
+    pk = make_device(device_id)
+    rng = random.Random(seed + size)
+    now = datetime.utcnow()
+    step = timedelta(days=7) / size
+    chunk = 5000
+    started = time.perf_counter()
+    for offset in range(0, size, chunk):
+        rows = [
+            {
+                "device_id": pk,
+                "timestamp": now - timedelta(days=7) + step * i,
+                "value": 20.0 + rng.gauss(0, 2),
+                "unit": "°C",
+                "quality": 1.0
+            }
+            for i in range(offset, min(offset + chunk, size))
+        ]
+        ingest_buffer.write_batch(rows, {pk: (rows[-1]["timestamp"], DeviceStatus.ONLINE)})
+    print(f"  (seeded {size:,} readings for {device_id} in {time.perf_counter() - started:.1f}s)")
+    _HISTORY[size] = device_id
+    return device_id
+
+
+# ============================================
+# SUITES
+# ============================================
+def bench_ingest(bench: Bench, args):
+    from fastapi.testclient import TestClient
+    from database import DeviceStatus
+    from services.ingest_buffer import ingest_buffer
+    import main
+
+    device_ids = [f"BENCH-INGEST-{i}" for i in range(10)]
+    pks = [make_device(device_id) for device_id in device_ids]
+    rng = random.Random(args.seed)
+
+    with TestClient(main.app) as client:
+        requests = 50 if args.quick else 200
+
+        def single():
+            for i in range(requests):
+                client.post("/api/data", json={
+                    "device_id": device_ids[i % len(device_ids)], "value": rng.uniform(0, 30), "unit": "°C"
+                })
+
+        bench.run("ingest.http_single", single, ops=requests, unit="requests")
+
+        for size in ([100, 1000] if args.quick else [100, 1000, 5000]):
+            body = {"readings": [
+                {"device_id": device_ids[i % len(device_ids)], "value": rng.uniform(0, 30)}
+                for i in range(size)
+            ]}
+            bench.run("ingest.http_batch", lambda: client.post("/api/data/batch", json=body),
+                      ops=size, unit="readings", batch_size=size)
+
+    for size in [100, 1000, 5000]:
+        def write():
+            now = datetime.utcnow()
+            rows = [
+                {"device_id": pks[i % len(pks)], "timestamp": now, "value": float(i), "unit": "°C", "quality": 1.0}
+                for i in range(size)
+            ]
+            ingest_buffer.write_batch(rows, {pk: (now, DeviceStatus.ONLINE) for pk in pks})
+
+        bench.run("ingest.group_commit", write, ops=size, unit="rows", batch_size=size)
+
+    # Many small concurrent writers (requests, rules, CRM): each committing
+    # on its own connection vs queued through the single writer thread
+    from concurrent.futures import ThreadPoolExecutor
+    from database import SessionLocal, insert_readings
+    from services.db_writer import db_writer
+
+    writers, per_writer = 8, (25 if args.quick else 100)
+
+    def insert(db, pk):
+        insert_readings(db, [{"device_id": pk, "timestamp": datetime.utcnow(), "value": 1.0, "unit": "°C"}])
+
+    def direct(pk):
+        for _ in range(per_writer):
+            db = SessionLocal()
+            try:
+                insert(db, pk)
+                db.commit()
+            finally:
+                db.close()
+
+    def queued(pk):
+        for _ in range(per_writer):
+            db_writer.call(insert, pk)
+
+    db_writer.start()
+    try:
+        for mode, worker in (("direct", direct), ("single_writer", queued)):
+            def concurrent():
+                with ThreadPoolExecutor(writers) as pool:
+                    list(pool.map(worker, pks[:writers]))
+
+            bench.run("ingest.concurrent_writes", concurrent, ops=writers * per_writer, unit="writes",
+                      writers=writers, mode=mode)
+    finally:
+        asyncio.run(db_writer.stop())
+
+
+def bench_rules(bench: Bench, args):
+    from database import SessionLocal, Rule
+    from services.rules_engine import RulesEngine, rule_index
+
+    device_id = "BENCH-RULES"
+    make_device(device_id)
+    evaluations = 200 if args.quick else 1000
+
+    for count in ([10, 100] if args.quick else [10, 100, 1000]):
+        db = SessionLocal()
+        try:
+            db.query(Rule).filter(Rule.name.like("bench-%")).delete(synchronize_session=False)
+            db.add_all([
+                Rule(
+                    name=f"bench-{i}",
+                    # Never true, so this measures matching/evaluation without alert writes
+                    condition={"device_id": device_id, "operator": ">", "value": 1e9 + i},
+                    action={"type": "alert", "severity": "warning", "message": "bench"},
+                    is_active=True
+                )
+                for i in range(count)
+            ])
+            db.commit()
+            rule_index.invalidate()
+
+            engine = RulesEngine(db)
+            engine.evaluate_all_rules(device_id, 1.0)  # Build the index outside the timing
+
+            def evaluate():
+                for i in range(evaluations):
+                    engine.evaluate_all_rules(device_id, float(i))
+
+            bench.run("rules.evaluate", evaluate, ops=evaluations, unit="evaluations", rules=count)
+        finally:
+            db.query(Rule).filter(Rule.name.like("bench-%")).delete(synchronize_session=False)
+            db.commit()
+            rule_index.invalidate()
+            db.close()
+
+
+def _history_sizes(args) -> List[int]:
+    return [1000, 10000] if args.quick else [10000, 100000]
+
+
+def bench_analytics(bench: Bench, args):
+    from fastapi.testclient import TestClient
+    from database import SessionLocal
+    from services.device_registry import device_registry
+    from services.rollups import window_stats
+    from api import analytics
+    import main
+
+    client = TestClient(main.app)
+    for size in _history_sizes(args):
+        device_id = ensure_history(size, args.seed)
+        db = SessionLocal()
+        try:
+            pk = device_registry.get(db, device_id).id
+            now = datetime.utcnow()
+            for hours in (24, 168):
+                bench.run("analytics.window_stats", lambda: window_stats(db, now - timedelta(hours=hours), now, [pk]),
+                          unit="queries", history=size, hours=hours)
+                bench.run("analytics.device", lambda: analytics.get_device_analytics(device_id, hours, db),
+                          unit="queries", history=size, hours=hours)
+            bench.run("analytics.trends", lambda: analytics.get_trends(7, db), unit="queries", history=size)
+            bench.run("analytics.overview", lambda: analytics.get_analytics_overview(db), unit="queries", history=size)
+            bench.run("api.data_recent", lambda: client.get(f"/api/data/{device_id}?limit=1000&hours=24"),
+                      unit="requests", history=size)
+            bench.run("api.stats", lambda: client.get("/api/stats"), unit="requests", history=size)
+        finally:
+            db.close()
+
+
+def bench_reports(bench: Bench, args):
+    from database import SessionLocal
+    from services.report_generator import ReportGenerator
+
+    size = _history_sizes(args)[-1]
+    device_id = ensure_history(size, args.seed)
+    db = SessionLocal()
+    try:
+        generator = ReportGenerator(db)
+        bench.run("reports.daily", generator.generate_daily_report, unit="reports", history=size)
+        bench.run("reports.weekly", generator.generate_weekly_report, unit="reports", history=size)
+        bench.run("reports.device", lambda: generator.generate_device_report(device_id, 7),
+                  unit="reports", history=size)
+    finally:
+        db.close()
+
+
+class _SinkWebSocket:
+    """WebSocket stand-in that accepts everything instantly."""
+
+    def __init__(self):
+        self.received = 0
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, payload: str):
+        self.received += 1
+
+    async def send_bytes(self, payload: bytes):
+        self.received += 1
+
+
+def bench_websocket(bench: Bench, args):
+    from services.realtime import ConnectionManager
+
+    messages = 200 if args.quick else 1000
+
+    async def fan_out(client_count: int, wire_format: str) -> float:
+        manager = ConnectionManager(max_connections=client_count, queue_size=messages * 2,
+                                    policy="drop_oldest", frame_interval=0)
+        sockets = [_SinkWebSocket() for _ in range(client_count)]
+        for websocket in sockets:
+            await manager.connect(websocket, wire_format)
+
+        started = time.perf_counter()
+        for i in range(messages):
+            await manager.broadcast({
+                "type": "sensor_data", "device_id": f"WS-{i}", "device_type": "temperature",
+                "rubro": "benchmark", "value": float(i), "timestamp": datetime.utcnow().isoformat()
+            })
+        expected = messages * (2 if wire_format == "binary" else 1)  # Binary adds a dictionary message
+        while sum(ws.received for ws in sockets) < expected * client_count:
+            await asyncio.sleep(0)
+        elapsed = time.perf_counter() - started
+
+        for websocket in sockets:
+            manager.disconnect(websocket)
+        return elapsed
+
+    for client_count in ([10, 100] if args.quick else [10, 100, 1000]):
+        for wire_format in ("json", "binary"):
+            times = [asyncio.run(fan_out(client_count, wire_format)) for _ in range(bench.rounds)]
+            bench.record("websocket.fan_out", times, messages * client_count, "deliveries",
+                         clients=client_count, format=wire_format)
+
+
+def bench_simulator(bench: Bench, args):
+    from simulator.sensor_models import create_sensor, SENSOR_MODELS
+    from simulator.fleet import FleetSimulator
+    from simulator.scenario import ScenarioRunner, load_scenario
+
+    reads = 10000 if args.quick else 50000
+    for sensor_type in SENSOR_MODELS:
+        # No random failures: a failed sensor short-circuits read()
+        sensor = create_sensor(sensor_type, f"SIM-{sensor_type}", seed=args.seed, failure_probability=0.0)
+
+        def read():
+            for _ in range(reads):
+                sensor.read()
+
+        bench.run("simulator.scalar_read", read, ops=reads, unit="readings", sensor_type=sensor_type)
+
+    for per_type in ([1250, 12500] if args.quick else [1250, 12500, 125000]):
+        fleet = FleetSimulator(seed=args.seed, start_time=0.0)
+        for sensor_type in SENSOR_MODELS:
+            fleet.add_fleet(sensor_type, [f"{sensor_type}-{i}" for i in range(per_type)])
+        clock = iter(range(1, 10 ** 9))
+        bench.run("simulator.fleet_step", lambda: fleet.step(now=float(next(clock))),
+                  ops=fleet.size, unit="readings", sensors=fleet.size)
+
+    hours = 1 if args.quick else 6
+    scenario = load_scenario("carniceria_completo")
+
+    def replay():
+        runner = ScenarioRunner(scenario, seed=args.seed, start_time=0.0, duration=hours * 3600)
+        for _ in runner.ticks():
+            pass
+
+    runner = ScenarioRunner(scenario, seed=args.seed, duration=hours * 3600)
+    bench.run("simulator.scenario_replay", replay, ops=len(runner.sensors) * hours * 3600,
+              unit="readings", scenario="carniceria_completo", virtual_hours=hours)
+
+
+SUITE_FUNCTIONS = {
+    "ingest": bench_ingest,
+    "rules": bench_rules,
+    "analytics": bench_analytics,
+    "reports": bench_reports,
+    "websocket": bench_websocket,
+    "simulator": bench_simulator,
+}
+
+
+# ============================================
+# REPORTING
+# ============================================
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _key(result: Dict[str, Any]) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]"
+
+
+def compare(current: List[Dict[str, Any]], baseline_path: str) -> List[Dict[str, Any]]:
+    """Throughput ratios against a previous results file; flags regressions."""
+    with open(baseline_path) as f:
+        baseline = {_key(r): r for r in json.load(f)["results"]}
+
+    rows = []
+    print(f"\nComparison with {baseline_path} (threshold {REGRESSION_THRESHOLD:.0%}):")
+    for result in current:
+        previous = baseline.get(_key(result))
+        rate_key = f"{result['unit']}_per_second"
+        if not previous or not previous.get(rate_key) or not result.get(rate_key):
+            continue
+        ratio = result[rate_key] / previous[rate_key]
+        flag = "REGRESSION" if ratio < 1 - REGRESSION_THRESHOLD else ("faster" if ratio > 1 + REGRESSION_THRESHOLD else "")
+        rows.append({"case": _key(result), "ratio": round(ratio, 3), "flag": flag})
+        print(f"  {_key(result):<72} x{ratio:6.2f} {flag}")
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the performance benchmark suite")
+    parser.add_argument("--suite", nargs="+", choices=SUITES, default=SUITES)
+    parser.add_argument("--output", default="benchmark_results.json", help="Results JSON path")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    parser.add_argument("--rounds", type=int, default=5, help="Timed rounds per case")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes for a fast smoke run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--profile", help="SQLite storage profile (default: SQLITE_PROFILE / config)")
+    parser.add_argument("--workdir", help="Directory for the temp database (default: system temp dir)")
+    parser.add_argument("--keep-db", action="store_true", help="Keep the temp database directory")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    output = Path(args.output).resolve()
+    baseline = str(Path(args.compare).resolve()) if args.compare else None
+    random.seed(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="iot-bench-", dir=args.workdir)
+    setup_environment(workdir, args.profile)
+    import config
+
+    bench = Bench(rounds=args.rounds)
+    started = time.perf_counter()
+    for suite in args.suite:
+        print(f"\n[{suite}]")
+        SUITE_FUNCTIONS[suite](bench, args)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "suites": args.suite,
+            "quick": args.quick,
+            "rounds": args.rounds,
+            "seed": args.seed,
+            "sqlite_profile": config.SQLITE_PROFILE,
+            "duration_s": round(time.perf_counter() - started, 1)
+        },
+        "results": bench.results
+    }
+    if baseline:
+        report["comparison"] = compare(bench.results, baseline)
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output} ({len(bench.results)} cases, {report['meta']['duration_s']}s)")
+
+    if not args.keep_db:
+        import shutil
+        from database import engine
+        engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+    else:
+        print(f"Database kept in {workdir}")
+
+    regressions = [row for row in report.get("comparison", []) if row["flag"] == "REGRESSION"]
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
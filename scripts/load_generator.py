@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+IoT Multi-Rubro System - ESP32 Fleet Load Generator
+====================================================
+Emulates thousands of ESP32 nodes running `iot_firmware/main/main.ino`:
+each node registers itself (POST /api/devices) and then POSTs its reading
+to /api/data every DATA_SEND_INTERVAL, with the firmware's exact payloads.
+
+Nodes are sharded across worker processes, each running an asyncio loop.
+Reports sustained requests/s, p50/p95/p99 latency and error rates.
+
+Usage:
+    python scripts/load_generator.py --nodes 2000 --duration 60
+    python scripts/load_generator.py --nodes 10000 --processes 8 --interval 5 --jitter 0.5 --json out.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+# Firmware defaults (iot_firmware/main/config.h)
+DATA_SEND_INTERVAL = 5.0  # seconds
+SENSOR_UNIT = "units"
+DEVICE_NAME = "ESP32 Sensor Node"
+DEVICE_RUBRO = "carniceria"
+DEVICE_LOCATION = "Main Room"
+DEVICE_TYPES = ["temperature", "humidity", "motion"]
+
+
+# ============================================
+# FIRMWARE PAYLOADS
+# ============================================
+def arduino_random(rng: random.Random, low: int, high: int) -> int:
+    """Arduino `random(min, max)`: integer in [min, max)."""
+    return rng.randrange(low, high)
+
+
+def read_sensor(device_type: str, rng: random.Random) -> float:
+    """Simulated readings from main.ino (SIMULATE_SENSOR)."""
+    if device_type == "temperature":
+        return 20.0 + arduino_random(rng, -50, 50) / 10.0
+    if device_type == "humidity":
+        return min(max(60.0 + arduino_random(rng, -100, 100) / 10.0, 0.0), 100.0)
+    if device_type == "motion":
+        return 1.0 if arduino_random(rng, 0, 100) < 10 else 0.0
+    return float(arduino_random(rng, 0, 4096))  # Generic analogRead * SENSOR_SCALE
+
+
+def registration_payload(device_id: str, device_type: str) -> Dict[str, Any]:
+    """Body of registerDevice()."""
+    return {
+        "device_id": device_id,
+        "name": DEVICE_NAME,
+        "device_type": device_type,
+        "rubro": DEVICE_RUBRO,
+        "location": DEVICE_LOCATION
+    }
+
+
+def data_payload(device_id: str, value: float) -> Dict[str, Any]:
+    """Body of sendDataToBackend()."""
+    return {
+        "device_id": device_id,
+        "value": value,
+        "unit": SENSOR_UNIT,
+        "quality": 1.0
+    }
+
+
+# ============================================
+# STATISTICS
+# ============================================
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    # Smallest value with at least p% of the values at or below it (p * n first: exact for integers)
+    rank = max(math.ceil(p * len(sorted_values) / 100.0) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Recorder:
+    """Latencies and outcomes of requests completed inside the measured window."""
+
+    def __init__(self, measure_from: float, measure_until: float):
+        self.measure_from = measure_from
+        self.measure_until = measure_until
+        self.latencies_ms: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.late_sends = 0
+
+    def record(self, started: float, finished: float, status_code: Optional[int] = None,
+               error: Optional[str] = None):
+        if not self.measure_from <= started < self.measure_until:
+            return
+        if error is not None:
+            self.errors[error] += 1
+            return
+        self.statuses[status_code] += 1
+        if 200 <= status_code < 300:
+            self.latencies_ms.append((finished - started) * 1000.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latencies_ms": self.latencies_ms,
+            "statuses": dict(self.statuses),
+            "errors": dict(self.errors),
+            "late_sends": self.late_sends
+        }
+
+
+# ============================================
+# WORKER PROCESS
+# ============================================
+async def _post(client: httpx.AsyncClient, recorder: Recorder, path: str, payload: Dict[str, Any]) -> Optional[int]:
+    started = time.time()
+    try:
+        response = await client.post(path, json=payload)
+    except httpx.HTTPError as e:
+        recorder.record(started, time.time(), error=type(e).__name__)
+        return None
+    recorder.record(started, time.time(), status_code=response.status_code)
+    return response.status_code
+
+
+async def _register(client: httpx.AsyncClient, nodes: List[Dict[str, Any]], concurrency: int) -> Counter:
+    """Register every node (201 = created, 400 = already exists, as in the firmware)."""
+    outcomes: Counter = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def register(node):
+        async with semaphore:
+            try:
+                response = await client.post("/api/devices", json=registration_payload(node["device_id"], node["device_type"]))
+                outcomes["ok" if response.status_code in (201, 400) else f"http_{response.status_code}"] += 1
+            except httpx.HTTPError as e:
+                outcomes[type(e).__name__] += 1
+
+    await asyncio.gather(*(register(node) for node in nodes))
+    return outcomes
+
+
+async def _node_loop(client: httpx.AsyncClient, recorder: Recorder, node: Dict[str, Any],
+                     start: float, stop: float, interval: float, jitter: float, rng: random.Random):
+    """One ESP32: fixed send schedule from a random boot offset, +/- jitter per send."""
+    next_send = start + rng.uniform(0, interval)
+    while True:
+        send_at = next_send + rng.uniform(-jitter, jitter)
+        if send_at >= stop:
+            return
+        delay = send_at - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif delay < -interval:
+            recorder.late_sends += 1  # Responses (or the generator) cannot keep up
+
+        value = read_sensor(node["device_type"], rng)
+        await _post(client, recorder, "/api/data", data_payload(node["device_id"], value))
+        next_send += interval
+
+
+async def _run_shard(nodes: List[Dict[str, Any]], options: Dict[str, Any]) -> Dict[str, Any]:
+    limits = httpx.Limits(
+        max_connections=options["max_connections"],
+        # The firmware opens a new connection per request (http.begin/http.end)
+        max_keepalive_connections=options["max_connections"] if options["keep_alive"] else 0
+    )
+    async with httpx.AsyncClient(base_url=options["url"], limits=limits, timeout=options["timeout"]) as client:
+        registration = await _register(client, nodes, options["max_connections"]) if options["register"] else Counter()
+
+        start = max(time.time(), options["start_at"])
+        measure_from = start + options["warmup"]
+        stop = measure_from + options["duration"]
+        recorder = Recorder(measure_from, stop)
+
+        rng = random.Random(options["seed"])
+        await asyncio.gather(*(
+            _node_loop(client, recorder, node, start, stop, options["interval"], options["jitter"],
+                       random.Random(rng.random()))
+            for node in nodes
+        ))
+
+    result = recorder.to_dict()
+    result["registration"] = dict(registration)
+    return result
+
+
+def _worker(nodes: List[Dict[str, Any]], options: Dict[str, Any]) -> Dict[str, Any]:
+    return asyncio.run(_run_shard(nodes, options))
+
+
+# ============================================
+# DRIVER
+# ============================================
+def build_nodes(count: int, prefix: str, device_types: List[str]) -> List[Dict[str, Any]]:
+    return [
+        {"device_id": f"{prefix}-{i:05d}", "device_type": device_types[i % len(device_types)]}
+        for i in range(1, count + 1)
+    ]
+
+
+def run_load(args) -> Dict[str, Any]:
+    nodes = build_nodes(args.nodes, args.prefix, args.device_types)
+    processes = max(1, min(args.processes, len(nodes)))
+    shards = [nodes[i::processes] for i in range(processes)]
+
+    # Registration happens before the shared start time so all shards send together
+    options_base = {
+        "url": args.url,
+        "interval": args.interval,
+        "jitter": args.jitter,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "timeout": args.timeout,
+        "keep_alive": args.keep_alive,
+        "register": not args.no_register,
+        "max_connections": args.max_connections,
+        "start_at": time.time() + args.startup_delay,
+    }
+
+    started = time.time()
+    if processes == 1:
+        results = [_worker(shards[0], {**options_base, "seed": args.seed})]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [
+                pool.submit(_worker, shard, {**options_base, "seed": None if args.seed is None else args.seed * 1000 + i})
+                for i, shard in enumerate(shards)
+            ]
+            results = [future.result() for future in futures]
+
+    return summarize(results, args, processes, time.time() - started)
+
+
+def summarize(results: List[Dict[str, Any]], args, processes: int, wall_seconds: float) -> Dict[str, Any]:
+    latencies = sorted(latency for r in results for latency in r["latencies_ms"])
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    registration: Counter = Counter()
+    for r in results:
+        statuses.update({int(k): v for k, v in r["statuses"].items()})
+        errors.update(r["errors"])
+        registration.update(r["registration"])
+
+    ok = sum(v for k, v in statuses.items() if 200 <= k < 300)
+    http_errors = sum(v for k, v in statuses.items() if not 200 <= k < 300)
+    transport_errors = sum(errors.values())
+    total = ok + http_errors + transport_errors
+
+    return {
+        "url": args.url,
+        "nodes": args.nodes,
+        "processes": processes,
+        "interval_s": args.interval,
+        "jitter_s": args.jitter,
+        "keep_alive": args.keep_alive,
+        "measured_s": args.duration,
+        "wall_s": round(wall_seconds, 2),
+        "offered_rps": round(args.nodes / args.interval, 1),
+        "sustained_rps": round(ok / args.duration, 1),
+        "requests": total,
+        "ok": ok,
+        "error_rate": round((http_errors + transport_errors) / total, 5) if total else None,
+        "http_status": {str(k): v for k, v in sorted(statuses.items())},
+        "transport_errors": dict(errors),
+        "late_sends": sum(r["late_sends"] for r in results),
+        "registration": dict(registration),
+        "latency_ms": {
+            "p50": _round(percentile(latencies, 50)),
+            "p95": _round(percentile(latencies, 95)),
+            "p99": _round(percentile(latencies, 99)),
+            "max": _round(latencies[-1] if latencies else None),
+            "mean": _round(sum(latencies) / len(latencies) if latencies else None)
+        }
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+def print_report(report: Dict[str, Any]):
+    latency = report["latency_ms"]
+    print("\n" + "=" * 60)
+    print("  ESP32 Fleet Load Test")
+    print("=" * 60)
+    print(f"  Target:          {report['url']}")
+    print(f"  Nodes:           {report['nodes']} over {report['processes']} process(es), "
+          f"every {report['interval_s']}s ±{report['jitter_s']}s")
+    print(f"  Offered load:    {report['offered_rps']} req/s")
+    print(f"  Sustained:       {report['sustained_rps']} req/s over {report['measured_s']}s")
+    print(f"  Requests:        {report['requests']} ({report['ok']} ok)")
+    print(f"  Error rate:      {report['error_rate']:.3%}" if report["error_rate"] is not None else "  Error rate:      n/a")
+    print(f"  Latency (ms):    p50={latency['p50']}  p95={latency['p95']}  p99={latency['p99']}  max={latency['max']}")
+    if report["http_status"]:
+        print(f"  HTTP status:     {report['http_status']}")
+    if report["transport_errors"]:
+        print(f"  Transport errs:  {report['transport_errors']}")
+    if report["late_sends"]:
+        print(f"  ⚠ {report['late_sends']} sends ran more than one interval late (server or generator saturated)")
+    print("=" * 60)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Emulate an ESP32 fleet against the ingest API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API base URL")
+    parser.add_argument("--nodes", type=int, default=1000, help="Number of emulated ESP32 nodes")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--interval", type=float, default=DATA_SEND_INTERVAL, help="Send interval per node (s)")
+    parser.add_argument("--jitter", type=float, default=0.25, help="Uniform ± jitter per send (s)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Measured window (s)")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured ramp-up (s)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Request timeout (s)")
+    parser.add_argument("--max-connections", type=int, default=256, help="Concurrent connections per process")
+    parser.add_argument("--keep-alive", action="store_true", help="Reuse connections (the firmware does not)")
+    parser.add_argument("--no-register", action="store_true", help="Skip POST /api/devices")
+    parser.add_argument("--prefix", default="LOAD", help="Device id prefix")
+    parser.add_argument("--device-types", nargs="+", default=DEVICE_TYPES)
+    parser.add_argument("--startup-delay", type=float, default=1.0, help="Delay before the shared start (s)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="Write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run_load(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -237,7 +237,7 @@ def test_data_posting() -> bool:
             timeout=5
         )
         
-        if response.status_code == 201:
+        if response.status_code == 202:
             print_success("Sensor data posting working")
             test_results["passed"].append("Data posting")
             return True
@@ -17,6 +17,7 @@ from .sensor_models import (
     create_sensor,
     SENSOR_MODELS,
 )
+from .fleet import SensorFleet, FleetSimulator, FleetReadings
 
 __version__ = "1.0.0"
 __all__ = [
@@ -31,4 +32,7 @@ __all__ = [
     "DistanceSensor",
     "create_sensor",
     "SENSOR_MODELS",
+    "SensorFleet",
+    "FleetSimulator",
+    "FleetReadings",
 ]
@@ -0,0 +1,329 @@
+"""
+Vectorized Fleet Simulator
+==========================
+Array-based counterpart of `sensor_models` for load testing. All sensors
+of one type live in NumPy arrays (parameters, drift, failure state) and
+the whole fleet advances in one batched step.
+"""
+
+import numpy as np
+import time
+import math
+import inspect
+from typing import Dict, Any, Optional, List, Sequence, Tuple, Callable
+from dataclasses import dataclass
+from datetime import datetime, tzinfo
+
+from .sensor_models import BaseSensorModel, SENSOR_MODELS, SeedLike, sensor_rng
+
+
+@dataclass
+class FleetReadings:
+    """One step of a fleet: parallel arrays indexed like `sensor_ids`."""
+    sensor_type: str
+    sensor_ids: List[str]
+    values: np.ndarray
+    quality: np.ndarray
+    is_connected: np.ndarray
+    timestamp: float
+
+    def __len__(self) -> int:
+        return len(self.sensor_ids)
+
+    def rows(self):
+        """Iterate (sensor_id, value, quality, is_connected) as Python scalars."""
+        return zip(self.sensor_ids, self.values.tolist(), self.quality.tolist(), self.is_connected.tolist())
+
+
+def _model_defaults(sensor_type: str) -> Dict[str, Any]:
+    """Constructor defaults of the scalar model (single source of truth)."""
+    defaults = {}
+    for cls in (BaseSensorModel, SENSOR_MODELS[sensor_type]):
+        for name, param in inspect.signature(cls.__init__).parameters.items():
+            if param.default is not inspect.Parameter.empty and not isinstance(param.default, (tuple, type(None))):
+                defaults[name] = param.default
+    return defaults
+
+
+class SensorFleet:
+    """
+    N sensors of a single type simulated as arrays.
+
+    Parameters may be scalars (shared) or sequences of length N. The
+    per-type base functions mirror the scalar models in `sensor_models`.
+    `rng` is a seed or Generator; seeds give a stream keyed by the type.
+    `tz` is the site's time zone, as for the scalar models.
+    """
+
+    def __init__(
+        self,
+        sensor_type: str,
+        sensor_ids: Sequence[str],
+        rng: SeedLike = None,
+        start_time: Optional[float] = None,
+        tz: Optional[tzinfo] = None,
+        **params
+    ):
+        if sensor_type not in _BASE_FUNCTIONS:
+            raise ValueError(f"Unknown sensor type: {sensor_type}")
+
+        self.sensor_type = sensor_type
+        self.sensor_ids = list(sensor_ids)
+        self.size = len(self.sensor_ids)
+        self.rng = sensor_rng(rng, sensor_type)
+        self.tz = tz
+
+        self.start_time = time.time() if start_time is None else start_time
+        self.last_time = self.start_time
+
+        # Parameters as float arrays (bools become 0/1)
+        self.business_hours = params.pop("business_hours", (9, 21))
+        values = _model_defaults(sensor_type)
+        values.update(params)
+        self.params: Dict[str, np.ndarray] = {
+            name: np.broadcast_to(np.asarray(value, dtype=float), (self.size,)).copy()
+            for name, value in values.items()
+        }
+
+        # Shared state
+        self.drift_offset = np.zeros(self.size)
+        self.is_failed = np.zeros(self.size, dtype=bool)
+        self.values = np.zeros(self.size)
+        self.quality = np.ones(self.size)
+
+        # Per-type state
+        self.state: Dict[str, np.ndarray] = {}
+        _INIT_FUNCTIONS.get(sensor_type, lambda fleet: None)(self)
+
+    def step(self, now: Optional[float] = None) -> FleetReadings:
+        """Advance every sensor to `now` (epoch seconds, default wall clock)."""
+        now = time.time() if now is None else now
+        dt = now - self.last_time
+        self.last_time = now
+        p, rng, n = self.params, self.rng, self.size
+
+        # Failures are permanent until reset()
+        self.is_failed |= rng.random(n) < p["failure_probability"]
+        healthy = ~self.is_failed
+
+        self.drift_offset += rng.normal(0.0, 1.0, n) * p["drift_rate"] * dt
+
+        base = _BASE_FUNCTIONS[self.sensor_type](self, now - self.start_time, now)
+        noisy = base + rng.normal(0.0, 1.0, n) * p["noise_level"] * np.abs(base) + self.drift_offset
+
+        self.values = np.where(healthy, noisy, self.values)
+        self.quality = np.where(healthy, np.clip(1.0 - np.abs(self.drift_offset) / 10.0, 0.0, 1.0), 0.0)
+
+        return FleetReadings(
+            sensor_type=self.sensor_type,
+            sensor_ids=self.sensor_ids,
+            values=self.values,
+            quality=self.quality,
+            is_connected=healthy,
+            timestamp=now
+        )
+
+    def reset(self, now: Optional[float] = None):
+        """Reset drift and failures of the whole fleet."""
+        self.is_failed[:] = False
+        self.drift_offset[:] = 0.0
+        self.start_time = self.last_time = time.time() if now is None else now
+
+
+# ============================================
+# PER-TYPE BASE VALUES (vectorized)
+# ============================================
+def _init_temperature(fleet: SensorFleet):
+    fleet.state["last_value"] = fleet.params["base_temp"].copy()
+
+
+def _temperature(fleet: SensorFleet, t: float, now: float) -> np.ndarray:
+    p = fleet.params
+    target = p["base_temp"] + p["amplitude"] * np.sin(2 * math.pi * t / p["period"])
+    last = fleet.state["last_value"]
+    last += (target - last) * p["thermal_inertia"]
+    return last.copy()
+
+
+def _humidity(fleet: SensorFleet, t: float, now: float) -> np.ndarray:
+    humidity = fleet.params["base_humidity"] + fleet.rng.normal(0.0, 0.5, fleet.size)
+    return np.clip(humidity, 0, 100)
+
+
+def _init_weight(fleet: SensorFleet):
+    fleet.state["true_weight"] = fleet.params["tare_weight"].copy()
+
+
+def _weight(fleet: SensorFleet, t: float, now: float) -> np.ndarray:
+    p, rng, n = fleet.params, fleet.rng, fleet.size
+    weight = fleet.state["true_weight"]
+    changes = rng.random(n) < 0.01
+    weight += np.where(changes, rng.uniform(-5, 5, n), 0.0)
+    np.clip(weight, 0, p["max_capacity"], out=weight)
+    return weight * (1 + p["temp_coefficient"] * rng.uniform(-2, 2, n))
+
+
+def _flow(fleet: SensorFleet, t: float, now: float) -> np.ndarray:
+    p = fleet.params
+    base_flow = p["max_flow"] * (0.9 + 0.1 * math.sin(t * 10))
+    turbulence = fleet.rng.uniform(-1, 1, fleet.size) * p["pulse_noise"] * p["max_flow"]
+    flow = np.clip(base_flow + turbulence, 0, p["max_flow"] * 1.1)
+    return np.where(p["valve_open"] > 0, flow, 0.0)
+
+
+def _init_motion(fleet: SensorFleet):
+    fleet.state["last_motion_time"] = np.zeros(fleet.size)
+    fleet.state["motion_duration"] = np.zeros(fleet.size)
+
+
+def _motion(fleet: SensorFleet, t: float, now: float) -> np.ndarray:
+    s, rng, n = fleet.state, fleet.rng, fleet.size
+    active = now - s["last_motion_time"] < s["motion_duration"]
+
+    hour = datetime.fromtimestamp(now, fleet.tz).hour
+    start, end = fleet.business_hours
+    probability = fleet.params["peak_probability"] * (1.0 if start <= hour < end else 0.1)
+
+    triggered = ~active & (rng.random(n) < probability)
+    s["last_motion_time"] = np.where(triggered, now, s["last_motion_time"])
+    s["motion_duration"] = np.where(triggered, rng.uniform(2, 10, n), s["motion_duration"])
+    return (active | triggered).astype(float)
+
+
+def _luminosity(fleet: SensorFleet, t: float, now: float) -> np.ndarray:
+    p = fleet.params
+    hour_of_day = (t / 3600) % 24
+    if 6 <= hour_of_day <= 18:
+        natural = np.full(fleet.size, 50000 * math.sin(math.pi * (hour_of_day - 6) / 12))
+    else:
+        natural = fleet.rng.uniform(0, 10, fleet.size)
+    return np.maximum(0, natural + np.where(p["artificial_light"] > 0, p["artificial_lux"], 0.0))
+
+
+def _init_soil_moisture(fleet: SensorFleet):
+    fleet.state["moisture"] = fleet.params["initial_moisture"].copy()
+    fleet.state["last_update"] = np.full(fleet.size, fleet.start_time)
+
+
+def _soil_moisture(fleet: SensorFleet, t: float, now: float) -> np.ndarray:
+    p, s = fleet.params, fleet.state
+    dt_hours = (now - s["last_update"]) / 3600.0
+    moisture = s["moisture"]
+    moisture += (np.where(p["is_watering"] > 0, 10.0, 0.0) - p["evaporation_rate"]) * dt_hours
+    np.clip(moisture, 0, 100, out=moisture)
+    s["last_update"][:] = now
+    return moisture.copy()
+
+
+def _distance(fleet: SensorFleet, t: float, now: float) -> np.ndarray:
+    p, rng, n = fleet.params, fleet.rng, fleet.size
+    detected = rng.random(n) < 0.05
+    return np.where(detected, rng.uniform(20, p["detection_threshold"], n), p["max_distance"])
+
+
+_BASE_FUNCTIONS: Dict[str, Callable[[SensorFleet, float, float], np.ndarray]] = {
+    "temperature": _temperature,
+    "humidity": _humidity,
+    "weight": _weight,
+    "flow": _flow,
+    "motion": _motion,
+    "luminosity": _luminosity,
+    "soil_moisture": _soil_moisture,
+    "distance": _distance,
+}
+
+_INIT_FUNCTIONS: Dict[str, Callable[[SensorFleet], None]] = {
+    "temperature": _init_temperature,
+    "weight": _init_weight,
+    "motion": _init_motion,
+    "soil_moisture": _init_soil_moisture,
+}
+
+
+# ============================================
+# MULTI-TYPE FLEET
+# ============================================
+class FleetSimulator:
+    """
+    Fleets of every sensor type, stepped together.
+
+    Each fleet draws from its own stream derived from `seed`, so results
+    do not depend on the order fleets are added.
+    """
+
+    def __init__(self, seed: SeedLike = None, start_time: Optional[float] = None, tz: Optional[tzinfo] = None):
+        self.seed = seed
+        self.start_time = time.time() if start_time is None else start_time
+        self.tz = tz
+        self.fleets: Dict[str, SensorFleet] = {}
+
+    @classmethod
+    def from_devices(
+        cls,
+        devices: Sequence[Tuple[str, str, Optional[Dict[str, Any]]]],
+        seed: SeedLike = None,
+        start_time: Optional[float] = None,
+        tz: Optional[tzinfo] = None
+    ) -> "FleetSimulator":
+        """
+        Build fleets from (sensor_id, sensor_type, config) tuples.
+
+        Per-device config values override the model defaults; devices
+        of unknown types are skipped.
+        """
+        simulator = cls(seed=seed, start_time=start_time, tz=tz)
+        grouped: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for sensor_id, sensor_type, config in devices:
+            if sensor_type in _BASE_FUNCTIONS:
+                grouped.setdefault(sensor_type, []).append((sensor_id, config or {}))
+
+        for sensor_type, members in grouped.items():
+            defaults = _model_defaults(sensor_type)
+            params = {
+                name: [config.get(name, default) for _, config in members]
+                for name, default in defaults.items()
+            }
+            simulator.add_fleet(sensor_type, [sensor_id for sensor_id, _ in members], **params)
+        return simulator
+
+    def add_fleet(self, sensor_type: str, sensor_ids: Sequence[str], **params) -> SensorFleet:
+        fleet = SensorFleet(sensor_type, sensor_ids, rng=self.seed, start_time=self.start_time, tz=self.tz, **params)
+        self.fleets[sensor_type] = fleet
+        return fleet
+
+    @property
+    def size(self) -> int:
+        return sum(fleet.size for fleet in self.fleets.values())
+
+    def step(self, now: Optional[float] = None) -> List[FleetReadings]:
+        now = time.time() if now is None else now
+        return [fleet.step(now) for fleet in self.fleets.values()]
+
+
+# ============================================
+# BENCHMARK
+# ============================================
+def benchmark(sensors_per_type: int = 12500, steps: int = 20, seed: int = 0) -> Dict[str, float]:
+    """Throughput of a fleet covering every sensor type (sensor readings per second)."""
+    simulator = FleetSimulator(seed=seed, start_time=0.0)
+    for sensor_type in _BASE_FUNCTIONS:
+        simulator.add_fleet(sensor_type, [f"{sensor_type}-{i}" for i in range(sensors_per_type)])
+
+    started = time.perf_counter()
+    for step in range(1, steps + 1):
+        simulator.step(now=float(step))
+    elapsed = time.perf_counter() - started
+
+    readings = simulator.size * steps
+    return {
+        "sensors": simulator.size,
+        "steps": steps,
+        "seconds": round(elapsed, 4),
+        "readings_per_second": round(readings / elapsed)
+    }
+
+
+if __name__ == "__main__":
+    result = benchmark()
+    print(f"Fleet of {result['sensors']} sensors x {result['steps']} steps: "
+          f"{result['readings_per_second']:,} readings/s")
@@ -7,11 +7,19 @@ Each sensor type includes noise, drift, and failure modes.
 
 import numpy as np
 import time
-from typing import Dict, Any, Optional, List
+import zlib
+from typing import Dict, Any, Optional, List, Callable, Union
 from dataclasses import dataclass, field
 from abc import ABC, abstractmethod
+from datetime import datetime, tzinfo
 import math
 
+# Seed, seed sequence or ready Generator
+SeedLike = Union[None, int, np.random.SeedSequence, np.random.Generator]
+
+# Scalar draws are served from blocks of this size
+NOISE_BLOCK_SIZE = 256
+
 
 @dataclass
 class SensorState:
@@ -23,24 +31,98 @@ class SensorState:
     last_error: Optional[str] = None
 
 
+def sensor_rng(seed: SeedLike, sensor_id: str) -> np.random.Generator:
+    """
+    Independent random stream for one sensor.
+    
+    The stream is derived from `seed` and the sensor id, so it does not
+    depend on creation order and sensors can be generated in parallel.
+    A Generator is used as given; None draws fresh OS entropy.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if seed is None:
+        return np.random.default_rng()
+    
+    key = zlib.crc32(sensor_id.encode())
+    if isinstance(seed, np.random.SeedSequence):
+        sequence = np.random.SeedSequence(seed.entropy, spawn_key=tuple(seed.spawn_key) + (key,))
+    else:
+        sequence = np.random.SeedSequence(seed, spawn_key=(key,))
+    return np.random.default_rng(sequence)
+
+
+class RandomBlock:
+    """
+    Scalar random draws served from pre-drawn blocks.
+    
+    Drawing one value per call from a Generator is dominated by call
+    overhead; blocks amortize it while keeping the sequence reproducible.
+    """
+    
+    def __init__(self, rng: np.random.Generator, size: int = NOISE_BLOCK_SIZE):
+        self.rng = rng
+        self.size = size
+        self._normals: List[float] = []
+        self._normal_pos = 0
+        self._uniforms: List[float] = []
+        self._uniform_pos = 0
+    
+    def normal(self, scale: float = 1.0) -> float:
+        """Normal draw with mean 0 and standard deviation `scale`."""
+        if self._normal_pos >= len(self._normals):
+            self._normals = self.rng.standard_normal(self.size).tolist()
+            self._normal_pos = 0
+        value = self._normals[self._normal_pos]
+        self._normal_pos += 1
+        return value * scale
+    
+    def random(self) -> float:
+        """Uniform draw in [0, 1)."""
+        if self._uniform_pos >= len(self._uniforms):
+            self._uniforms = self.rng.random(self.size).tolist()
+            self._uniform_pos = 0
+        value = self._uniforms[self._uniform_pos]
+        self._uniform_pos += 1
+        return value
+    
+    def uniform(self, low: float, high: float) -> float:
+        """Uniform draw in [low, high)."""
+        return low + (high - low) * self.random()
+
+
 class BaseSensorModel(ABC):
-    """Base class for all sensor models."""
+    """
+    Base class for all sensor models.
+    
+    `seed` gives the sensor its own random stream (see `sensor_rng`) and
+    `clock` replaces `time.time`, so runs can be replayed bit-for-bit.
+    `tz` is the site's time zone for time-of-day behaviour (None = host
+    local time, like `ScenarioRunner`'s virtual day).
+    """
     
     def __init__(
         self,
         sensor_id: str,
         noise_level: float = 0.05,
         drift_rate: float = 0.001,
-        failure_probability: float = 0.0001
+        failure_probability: float = 0.0001,
+        seed: SeedLike = None,
+        clock: Optional[Callable[[], float]] = None,
+        tz: Optional[tzinfo] = None
     ):
         self.sensor_id = sensor_id
         self.noise_level = noise_level
         self.drift_rate = drift_rate
         self.failure_probability = failure_probability
+        self.rng = sensor_rng(seed, sensor_id)
+        self.random = RandomBlock(self.rng)
+        self.clock = clock or time.time
+        self.tz = tz
         self.drift_offset = 0.0
         self.is_failed = False
-        self.start_time = time.time()
-        self.state = SensorState(value=0.0, timestamp=time.time())
+        self.start_time = self.clock()
+        self.state = SensorState(value=0.0, timestamp=self.start_time)
         
     @abstractmethod
     def _compute_base_value(self, t: float) -> float:
@@ -49,23 +131,23 @@ class BaseSensorModel(ABC):
     
     def _add_noise(self, value: float) -> float:
         """Add white noise to sensor reading."""
-        noise = np.random.normal(0, self.noise_level * abs(value))
+        noise = self.random.normal(self.noise_level * abs(value))
         return value + noise
     
     def _update_drift(self, dt: float):
         """Update sensor drift over time."""
-        self.drift_offset += np.random.normal(0, self.drift_rate) * dt
+        self.drift_offset += self.random.normal(self.drift_rate) * dt
     
     def _check_failure(self) -> bool:
         """Randomly simulate sensor failure."""
-        if np.random.random() < self.failure_probability:
+        if self.random.random() < self.failure_probability:
             self.is_failed = True
             return True
         return False
     
     def read(self) -> SensorState:
         """Read current sensor value."""
-        current_time = time.time()
+        current_time = self.clock()
         dt = current_time - self.state.timestamp
         
         # Check for failure
@@ -101,7 +183,7 @@ class BaseSensorModel(ABC):
         """Reset sensor to initial state."""
         self.is_failed = False
         self.drift_offset = 0.0
-        self.start_time = time.time()
+        self.start_time = self.clock()
 
 
 class TemperatureSensor(BaseSensorModel):
@@ -167,7 +249,7 @@ class HumiditySensor(BaseSensorModel):
             humidity += temp_delta * self.temp_correlation
         else:
             # Random walk
-            humidity += np.random.normal(0, 0.5)
+            humidity += self.random.normal(0.5)
         
         return np.clip(humidity, 0, 100)
 
@@ -195,12 +277,12 @@ class WeightSensor(BaseSensorModel):
     def _compute_base_value(self, t: float) -> float:
         """Weight with thermal drift compensation."""
         # Simulate slow weight changes (loading/unloading)
-        if np.random.random() < 0.01:  # 1% chance per reading
-            self.true_weight += np.random.uniform(-5, 5)
+        if self.random.random() < 0.01:  # 1% chance per reading
+            self.true_weight += self.random.uniform(-5, 5)
             self.true_weight = np.clip(self.true_weight, 0, self.max_capacity)
         
         # Temperature-induced drift (assume room temp variations)
-        temp_drift = self.true_weight * self.temp_coefficient * np.random.uniform(-2, 2)
+        temp_drift = self.true_weight * self.temp_coefficient * self.random.uniform(-2, 2)
         
         return self.true_weight + temp_drift
 
@@ -235,7 +317,7 @@ class FlowSensor(BaseSensorModel):
         
         # Turbulent flow with random pulses
         base_flow = self.max_flow * (0.9 + 0.1 * math.sin(t * 10))
-        turbulence = np.random.uniform(-self.pulse_noise, self.pulse_noise) * self.max_flow
+        turbulence = self.random.uniform(-self.pulse_noise, self.pulse_noise) * self.max_flow
         
         return np.clip(base_flow + turbulence, 0, self.max_flow * 1.1)
 
@@ -261,15 +343,14 @@ class MotionSensor(BaseSensorModel):
         
     def _compute_base_value(self, t: float) -> float:
         """Binary motion detection with time-based probability."""
-        current_time = time.time()
+        current_time = self.clock()
         
         # Check if still in motion duration
         if current_time - self.last_motion_time < self.motion_duration:
             return 1.0
         
-        # Get current hour
-        from datetime import datetime
-        current_hour = datetime.now().hour
+        # Get current hour at the site
+        current_hour = datetime.fromtimestamp(current_time, self.tz).hour
         
         # Calculate probability based on time
         if self.business_hours[0] <= current_hour < self.business_hours[1]:
@@ -278,9 +359,9 @@ class MotionSensor(BaseSensorModel):
             probability = self.peak_probability * 0.1  # Low activity outside hours
         
         # Detect motion
-        if np.random.random() < probability:
+        if self.random.random() < probability:
             self.last_motion_time = current_time
-            self.motion_duration = np.random.uniform(2, 10)  # 2-10 seconds
+            self.motion_duration = self.random.uniform(2, 10)  # 2-10 seconds
             return 1.0
         
         return 0.0
@@ -315,7 +396,7 @@ class LuminositySensor(BaseSensorModel):
             # Peak at noon
             natural_lux = 50000 * math.sin(math.pi * (hour_of_day - 6) / 12)
         else:  # Nighttime
-            natural_lux = np.random.uniform(0, 10)  # Moonlight/streetlights
+            natural_lux = self.random.uniform(0, 10)  # Moonlight/streetlights
         
         # Add artificial light if enabled
         if self.artificial_light:
@@ -344,7 +425,7 @@ class SoilMoistureSensor(BaseSensorModel):
         self.moisture = initial_moisture
         self.evaporation_rate = evaporation_rate
         self.is_watering = is_watering
-        self.last_update = time.time()
+        self.last_update = self.start_time
         
     def set_watering(self, enabled: bool):
         """Start/stop watering."""
@@ -352,7 +433,7 @@ class SoilMoistureSensor(BaseSensorModel):
         
     def _compute_base_value(self, t: float) -> float:
         """Moisture level with evaporation and watering."""
-        current_time = time.time()
+        current_time = self.clock()
         dt_hours = (current_time - self.last_update) / 3600.0
         
         # Evaporation
@@ -388,8 +469,8 @@ class DistanceSensor(BaseSensorModel):
     def _compute_base_value(self, t: float) -> float:
         """Distance measurement with person detection."""
         # Simulate person passing (< threshold)
-        if np.random.random() < 0.05:  # 5% chance
-            return np.random.uniform(20, self.detection_threshold)
+        if self.random.random() < 0.05:  # 5% chance
+            return self.random.uniform(20, self.detection_threshold)
         else:
             # No person detected
             return self.max_distance
@@ -410,13 +491,18 @@ SENSOR_MODELS = {
 }
 
 
-def create_sensor(sensor_type: str, sensor_id: str, **kwargs) -> BaseSensorModel:
-    """Factory function to create sensor instances."""
+def create_sensor(sensor_type: str, sensor_id: str, seed: SeedLike = None, **kwargs) -> BaseSensorModel:
+    """
+    Factory function to create sensor instances.
+    
+    Sensors created with the same integer `seed` get independent,
+    reproducible streams keyed by `sensor_id`.
+    """
     sensor_class = SENSOR_MODELS.get(sensor_type)
     if not sensor_class:
         raise ValueError(f"Unknown sensor type: {sensor_type}")
     
-    return sensor_class(sensor_id=sensor_id, **kwargs)
+    return sensor_class(sensor_id=sensor_id, seed=seed, **kwargs)
 
 
 # ============================================
@@ -0,0 +1,22 @@
+"""
+Shared pytest setup: point every database, archive and log path at a
+throwaway directory before the backend modules are imported, so test runs
+never read or write the ./iot_multirubro*.db files in the working tree.
+"""
+
+import os
+import shutil
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp(prefix="iot_multirubro_tests_")
+
+
+def pytest_configure(config):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'test.db')}"
+    os.environ["TELEMETRY_DATABASE_PATH"] = os.path.join(_tmp_dir, "test_telemetry.db")
+    os.environ["ARCHIVE_DIR"] = os.path.join(_tmp_dir, "archive")
+    os.environ["LOG_FILE"] = os.path.join(_tmp_dir, "test.log")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
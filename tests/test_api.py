@@ -13,24 +13,30 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent / "backend_api"))
 
 from main import app
-from database import Base, engine, SessionLocal
-
-# Test client
-client = TestClient(app)
 
 
 @pytest.fixture(scope="module")
-def test_db():
-    """Setup test database."""
-    Base.metadata.create_all(bind=engine)
-    yield
-    Base.metadata.drop_all(bind=engine)
+def client():
+    """Test client running the app lifespan (schema, writer, buffers) on the test database."""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_simulator_is_imported_once():
+    """The simulation loop and scenario replay share one `simulator` package."""
+    import main
+    from simulator import sensor_models
+    from services.scenario_replay import ScenarioRunner
+    
+    assert main.create_sensor is sensor_models.create_sensor
+    assert ScenarioRunner.__module__ == "simulator.scenario"
+    assert "sensor_models" not in sys.modules
 
 
 # ============================================
 # HEALTH CHECK TESTS
 # ============================================
-def test_health_check():
+def test_health_check(client):
     """Test health endpoint."""
     response = client.get("/health")
     assert response.status_code == 200
@@ -39,7 +45,7 @@ def test_health_check():
     assert data["status"] == "healthy"
 
 
-def test_stats_endpoint():
+def test_stats_endpoint(client):
     """Test statistics endpoint."""
     response = client.get("/api/stats")
     assert response.status_code == 200
@@ -48,10 +54,32 @@ def test_stats_endpoint():
     assert "alerts" in data
 
 
+def test_analytics_overview(client):
+    """Analytics router is mounted and shares the live counters behind /api/stats."""
+    created = client.post("/api/devices", json={
+        "device_id": "TEST-ANALYTICS",
+        "name": "Analytics Sensor",
+        "device_type": "temperature"
+    })
+    assert created.status_code == 201
+    
+    before = client.get("/api/analytics/overview")
+    assert before.status_code == 200
+    
+    batch = {"readings": [{"device_id": "TEST-ANALYTICS", "value": 20.0 + i} for i in range(3)]}
+    assert client.post("/api/data/batch", json=batch).status_code == 201
+    
+    overview = client.get("/api/analytics/overview").json()
+    stats = client.get("/api/stats").json()
+    assert overview["data"]["last_24h"] == before.json()["data"]["last_24h"] + 3
+    assert overview["data"]["last_24h"] == stats["data"]["points_24h"]
+    assert overview["devices"]["total"] == stats["devices"]["total"]
+
+
 # ============================================
 # DEVICE TESTS
 # ============================================
-def test_list_devices():
+def test_list_devices(client):
     """Test listing devices."""
     response = client.get("/api/devices")
     assert response.status_code == 200
@@ -59,7 +87,7 @@ def test_list_devices():
     assert isinstance(devices, list)
 
 
-def test_create_device():
+def test_create_device(client):
     """Test creating a new device."""
     device_data = {
         "device_id": "TEST-001",
@@ -80,7 +108,7 @@ def test_create_device():
         assert data["name"] == "Test Sensor"
 
 
-def test_get_device():
+def test_get_device(client):
     """Test getting device details."""
     # First create device
     device_data = {
@@ -98,7 +126,7 @@ def test_get_device():
         assert data["device_id"] == "TEST-002"
 
 
-def test_delete_device():
+def test_delete_device(client):
     """Test deleting a device."""
     # Create device first
     device_data = {
@@ -116,7 +144,7 @@ def test_delete_device():
 # ============================================
 # SENSOR DATA TESTS
 # ============================================
-def test_post_sensor_data():
+def test_post_sensor_data(client):
     """Test posting sensor data."""
     # Ensure device exists
     device_data = {
@@ -135,10 +163,75 @@ def test_post_sensor_data():
     }
     
     response = client.post("/api/data", json=sensor_data)
-    assert response.status_code in [201, 404]
+    assert response.status_code in [202, 404]
 
 
-def test_get_sensor_data():
+def test_post_sensor_data_batch(client):
+    """Test posting a batch of readings across devices."""
+    created = client.post("/api/devices", json={
+        "device_id": "TEST-BATCH",
+        "name": "Batch Sensor",
+        "device_type": "temperature"
+    })
+    assert created.status_code == 201
+    
+    batch = {
+        "readings": [
+            {"device_id": "TEST-BATCH", "value": 21.0, "unit": "°C"},
+            {"device_id": "TEST-BATCH", "value": 21.5, "unit": "°C"},
+            {"device_id": "NO-SUCH-DEVICE", "value": 1.0}
+        ]
+    }
+    
+    response = client.post("/api/data/batch", json=batch)
+    assert response.status_code == 201
+    data = response.json()
+    assert data["accepted"] == 2
+    assert data["rejected"] == 1
+    assert [r["status"] for r in data["results"]] == ["accepted", "accepted", "rejected"]
+    
+    history = client.get("/api/data/TEST-BATCH?limit=10").json()
+    assert history["count"] == 2
+    
+    device = client.get("/api/devices/TEST-BATCH").json()
+    assert device["last_value"] == 21.5
+
+
+def test_batch_rule_alerts(client):
+    """Batch readings fire rules and return the committed alert ids."""
+    created = client.post("/api/devices", json={
+        "device_id": "TEST-BATCH-RULE",
+        "name": "Batch Rule Sensor",
+        "device_type": "temperature"
+    })
+    assert created.status_code == 201
+    
+    rule_data = {
+        "name": "Batch Rule Test",
+        "condition": {"device_id": "TEST-BATCH-RULE", "operator": ">", "value": 100},
+        "action": {"type": "alert", "severity": "warning", "message": "Batch over 100"},
+        "cooldown_seconds": 3600
+    }
+    create_response = client.post("/api/rules", json=rule_data)
+    assert create_response.status_code == 201
+    rule_id = create_response.json()["id"]
+    
+    batch = {"readings": [{"device_id": "TEST-BATCH-RULE", "value": value} for value in (50.0, 150.0)]}
+    data = client.post("/api/data/batch", json=batch).json()
+    assert data["actions_triggered"] == 1
+    alert_id = data["actions"][0]["alert_id"]
+    assert isinstance(alert_id, int)
+    
+    alerts = client.get("/api/alerts?limit=100").json()
+    assert any(alert["id"] == alert_id for alert in alerts)
+    
+    # In cooldown: nothing fires on the next batch
+    assert client.post("/api/data/batch", json=batch).json()["actions_triggered"] == 0
+    
+    client.put(f"/api/rules/{rule_id}", json={**rule_data, "is_active": False})
+
+
+def test_get_sensor_data(client):
     """Test retrieving sensor data."""
     response = client.get("/api/data/TEST-SENSOR?limit=10")
     assert response.status_code in [200, 404]
@@ -147,7 +240,7 @@ def test_get_sensor_data():
 # ============================================
 # RULES TESTS
 # ============================================
-def test_list_rules():
+def test_list_rules(client):
     """Test listing rules."""
     response = client.get("/api/rules")
     assert response.status_code == 200
@@ -155,7 +248,7 @@ def test_list_rules():
     assert isinstance(rules, list)
 
 
-def test_create_rule():
+def test_create_rule(client):
     """Test creating automation rule."""
     rule_data = {
         "name": "Test Rule",
@@ -183,7 +276,40 @@ def test_create_rule():
         assert data["name"] == "Test Rule"
 
 
-def test_delete_rule():
+def test_rule_triggers_after_creation(client):
+    """Test new rules are picked up by the rule index immediately."""
+    created = client.post("/api/devices", json={
+        "device_id": "TEST-RULE-DEV",
+        "name": "Rule Device",
+        "device_type": "temperature"
+    })
+    assert created.status_code == 201
+    
+    rule_data = {
+        "name": "Rule Index Test",
+        "condition": {"device_id": "TEST-RULE-DEV", "operator": ">", "value": 100},
+        "action": {"type": "log", "message": "over 100"},
+        "cooldown_seconds": 0
+    }
+    create_response = client.post("/api/rules", json=rule_data)
+    assert create_response.status_code == 201
+    rule_id = create_response.json()["id"]
+    
+    response = client.post("/api/data", json={"device_id": "TEST-RULE-DEV", "value": 150.0})
+    assert response.status_code == 202
+    assert response.json()["actions_triggered"] == 1
+    
+    # Below the threshold nothing fires
+    response = client.post("/api/data", json={"device_id": "TEST-RULE-DEV", "value": 50.0})
+    assert response.json()["actions_triggered"] == 0
+    
+    assert client.delete(f"/api/rules/{rule_id}").status_code == 200
+    response = client.post("/api/data", json={"device_id": "TEST-RULE-DEV", "value": 150.0})
+    assert response.status_code == 202
+    assert response.json()["actions_triggered"] == 0
+
+
+def test_delete_rule(client):
     """Test deleting a rule."""
     # Create rule first
     rule_data = {
@@ -205,7 +331,7 @@ def test_delete_rule():
 # ============================================
 # ALERTS TESTS
 # ============================================
-def test_list_alerts():
+def test_list_alerts(client):
     """Test listing alerts."""
     response = client.get("/api/alerts")
     assert response.status_code == 200
@@ -213,7 +339,7 @@ def test_list_alerts():
     assert isinstance(alerts, list)
 
 
-def test_list_unresolved_alerts():
+def test_list_unresolved_alerts(client):
     """Test filtering unresolved alerts."""
     response = client.get("/api/alerts?unresolved_only=true")
     assert response.status_code == 200
@@ -222,7 +348,7 @@ def test_list_unresolved_alerts():
 # ============================================
 # VALIDATION TESTS
 # ============================================
-def test_invalid_device_creation():
+def test_invalid_device_creation(client):
     """Test creating device with invalid data."""
     invalid_data = {
         "device_id": "",  # Empty ID
@@ -233,7 +359,7 @@ def test_invalid_device_creation():
     assert response.status_code in [400, 422]  # Validation error
 
 
-def test_nonexistent_device():
+def test_nonexistent_device(client):
     """Test accessing non-existent device."""
     response = client.get("/api/devices/NONEXISTENT")
     assert response.status_code == 404
@@ -242,7 +368,7 @@ def test_nonexistent_device():
 # ============================================
 # INTEGRATION TESTS
 # ============================================
-def test_full_workflow():
+def test_full_workflow(client):
     """Test complete device data workflow."""
     # 1. Create device
     device_data = {
@@ -262,7 +388,7 @@ def test_full_workflow():
     }
     
     data_resp = client.post("/api/data", json=sensor_data)
-    assert data_resp.status_code in [201, 404]
+    assert data_resp.status_code in [202, 404]
     
     # 3. Get data back
     get_resp = client.get("/api/data/WORKFLOW-TEST?limit=1")
@@ -0,0 +1,99 @@
+"""
+IoT Multi-Rubro System - Load Generator Tests
+==============================================
+Unit tests for the ESP32 fleet emulator's payloads and statistics.
+"""
+
+import re
+import sys
+from argparse import Namespace
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# Add scripts to path
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from load_generator import percentile, registration_payload, data_payload, summarize
+
+
+def _firmware_fields(function: str) -> dict:
+    """`doc["field"] = source;` assignments in a main.ino function, as {field: source}."""
+    source = (ROOT / "iot_firmware" / "main" / "main.ino").read_text(encoding="utf-8")
+    body = re.search(rf"void {function}\(\) \{{(.*?)\n\}}", source, re.S).group(1)
+    return dict(re.findall(r'doc\["(\w+)"\] = ([^;]+);', body))
+
+
+def _firmware_defines() -> dict:
+    header = (ROOT / "iot_firmware" / "main" / "config.h").read_text(encoding="utf-8")
+    return dict(re.findall(r'#define (\w+) "([^"]*)"', header))
+
+
+def test_percentile_nearest_rank():
+    """p-th percentile is the ceil(p * n / 100)-th smallest value."""
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    
+    values = [float(v) for v in range(1, 11)]
+    assert percentile(values, 50) == 5
+    assert percentile(values, 95) == 10
+    assert percentile(values, 0) == 1
+    
+    assert percentile([], 50) is None
+    assert percentile([7.0], 99) == 7.0
+
+
+def test_payloads_match_firmware():
+    """Registration and data bodies carry exactly the fields main.ino sends."""
+    defines = _firmware_defines()
+    
+    registration = registration_payload("ESP32-TEST", "temperature")
+    fields = _firmware_fields("registerDevice")
+    assert set(registration) == set(fields)
+    for field, source in fields.items():
+        if source in defines:
+            assert registration[field] == defines[source]
+    
+    data = data_payload("ESP32-TEST", 21.5)
+    fields = _firmware_fields("sendDataToBackend")
+    assert set(data) == set(fields)
+    assert data["unit"] == defines[fields["unit"]]
+    assert data["quality"] == float(fields["quality"])
+
+
+def test_summarize_merges_shards():
+    """Shard results are merged into one report with rates and latency percentiles."""
+    args = Namespace(url="http://test", nodes=4, interval=2.0, jitter=0.0, keep_alive=False, duration=10.0)
+    shards = [
+        {
+            "latencies_ms": [float(v) for v in range(1, 51)],
+            "statuses": {"202": 50, "503": 2},
+            "errors": {"ConnectTimeout": 1},
+            "late_sends": 1,
+            "registration": {"ok": 2}
+        },
+        {
+            "latencies_ms": [float(v) for v in range(51, 101)],
+            "statuses": {"202": 50},
+            "errors": {},
+            "late_sends": 0,
+            "registration": {"ok": 2}
+        },
+    ]
+    
+    report = summarize(shards, args, processes=2, wall_seconds=12.3456)
+    
+    assert report["ok"] == 100
+    assert report["requests"] == 103
+    assert report["error_rate"] == round(3 / 103, 5)
+    assert report["offered_rps"] == 2.0
+    assert report["sustained_rps"] == 10.0
+    assert report["http_status"] == {"202": 100, "503": 2}
+    assert report["transport_errors"] == {"ConnectTimeout": 1}
+    assert report["late_sends"] == 1
+    assert report["registration"] == {"ok": 4}
+    assert report["wall_s"] == 12.35
+    assert report["latency_ms"] == {"p50": 50.0, "p95": 95.0, "p99": 99.0, "max": 100.0, "mean": 50.5}
@@ -0,0 +1,1050 @@
+"""
+IoT Multi-Rubro System - Service Tests
+=======================================
+Unit tests for backend services (ingestion, caches, rules).
+"""
+
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend_api"))
+
+from database import Base, engine, SessionLocal, Device, SensorData, Alert, DeviceStatus, insert_readings
+from services.ingest_buffer import IngestionBuffer, IngestQueueFull
+
+
+@pytest.fixture(scope="module")
+def device_pk():
+    """Ensure a device exists for service tests."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    device = db.query(Device).filter(Device.device_id == "SVC-TEST").first()
+    if not device:
+        device = Device(device_id="SVC-TEST", name="Service Test", device_type="temperature")
+        db.add(device)
+        db.commit()
+        db.refresh(device)
+    pk = device.id
+    db.close()
+    return pk
+
+
+def _count_rows(device_pk: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(SensorData).filter(SensorData.device_id == device_pk).count()
+    finally:
+        db.close()
+
+
+# ============================================
+# INGESTION BUFFER TESTS
+# ============================================
+def test_ingest_buffer_write_through_when_stopped(device_pk):
+    """Without a flusher the buffer writes through immediately."""
+    buffer = IngestionBuffer(flush_size=10, flush_interval=0.05, max_pending=100)
+    before = _count_rows(device_pk)
+    
+    buffer.submit(device_pk, 1.0)
+    
+    assert buffer.pending == 0
+    assert _count_rows(device_pk) == before + 1
+
+
+def test_ingest_buffer_group_commit(device_pk):
+    """Running buffer groups rows and flushes everything on stop."""
+    buffer = IngestionBuffer(flush_size=1000, flush_interval=10.0, max_pending=5)
+    before = _count_rows(device_pk)
+    
+    async def scenario():
+        buffer.start()
+        for i in range(5):
+            buffer.submit(device_pk, float(i), device_status=DeviceStatus.ONLINE)
+        assert buffer.pending == 5
+        with pytest.raises(IngestQueueFull):
+            buffer.submit(device_pk, 99.0)
+        await buffer.stop()
+    
+    asyncio.run(scenario())
+    
+    assert buffer.pending == 0
+    assert buffer.flush_count == 1
+    assert _count_rows(device_pk) == before + 5
+
+
+# ============================================
+# DEVICE REGISTRY TESTS
+# ============================================
+def test_device_registry_hits_and_invalidation(device_pk):
+    """Registry serves repeat lookups from memory and honours invalidation."""
+    from services.device_registry import DeviceRegistry
+    
+    registry = DeviceRegistry()
+    db = SessionLocal()
+    try:
+        first = registry.get(db, "SVC-TEST")
+        second = registry.get(db, "SVC-TEST")
+        assert first is second
+        assert first.id == device_pk
+        assert registry.get_by_pk(db, device_pk) is first
+        assert (registry.hits, registry.misses) == (2, 1)
+        
+        registry.invalidate("SVC-TEST")
+        registry.get(db, "SVC-TEST")
+        assert registry.misses == 2
+        
+        assert registry.get(db, "NO-SUCH-DEVICE") is None
+    finally:
+        db.close()
+
+
+# ============================================
+# RULES ENGINE TESTS
+# ============================================
+class _FakeEngine:
+    """Stands in for RulesEngine when evaluating compiled predicates."""
+    
+    def __init__(self, latest):
+        self.latest = latest
+    
+    def _get_latest_value(self, device_id):
+        return self.latest.get(device_id)
+
+
+def test_compile_condition_and_or():
+    """Compiled predicates honour AND/OR and cross-device values."""
+    from services.rules_engine import RulesEngine
+    
+    predicate, device_ids = RulesEngine.compile_condition({
+        "and": [
+            {"device_id": "TEMP-X", "operator": ">", "value": 25},
+            {"device_id": "HUM-X", "operator": "<", "value": 30}
+        ]
+    })
+    assert device_ids == {"TEMP-X", "HUM-X"}
+    assert predicate(_FakeEngine({"HUM-X": 20}), "TEMP-X", 30) is True
+    assert predicate(_FakeEngine({"HUM-X": 40}), "TEMP-X", 30) is False
+    assert predicate(_FakeEngine({}), "TEMP-X", 30) is False
+    
+    predicate, _ = RulesEngine.compile_condition({
+        "or": [
+            {"device_id": "TEMP-X", "operator": ">", "value": 25},
+            {"device_id": "HUM-X", "operator": "<", "value": 30}
+        ]
+    })
+    assert predicate(_FakeEngine({"HUM-X": 20}), "TEMP-X", 0) is True
+    
+    predicate, _ = RulesEngine.compile_condition({"device_id": "A", "operator": "~", "value": 1})
+    assert predicate(_FakeEngine({}), "A", 1) is False
+
+
+# ============================================
+# LATEST VALUE TABLE TESTS
+# ============================================
+def test_latest_value_table_ordering_and_staleness():
+    """Older readings never overwrite newer ones; stale entries read as None."""
+    from datetime import datetime, timedelta
+    from services.latest_values import LatestValueTable
+    
+    table = LatestValueTable(max_age_seconds=60)
+    now = datetime.utcnow()
+    
+    table.update(1, 10.0, now)
+    table.update(1, 5.0, now - timedelta(seconds=5))
+    assert table.get(1).value == 10.0
+    
+    table.update(2, 3.0, now - timedelta(seconds=120))
+    assert table.get(2) is None
+    assert table.peek(2).value == 3.0
+    assert table.snapshot(1)["last_value"] == 10.0
+
+
+def test_rule_trigger_stats_are_batched():
+    """Triggers start the cooldown in memory and persist in one UPDATE."""
+    from datetime import datetime
+    from database import Rule
+    from services.rules_engine import RuleIndex, RulesEngine
+    
+    db = SessionLocal()
+    try:
+        rule = Rule(
+            name="Batched Stats",
+            condition={"device_id": "SVC-TEST", "operator": ">", "value": 0},
+            action={"type": "log", "message": "svc"},
+            cooldown_seconds=3600
+        )
+        db.add(rule)
+        db.commit()
+        
+        index = RuleIndex()
+        compiled = RulesEngine.compile_rule(rule)
+        engine = RulesEngine(db)
+        
+        index.record_trigger(compiled, datetime.utcnow())
+        index.record_trigger(compiled, datetime.utcnow())
+        assert engine._is_in_cooldown(compiled)
+        assert index.pending_trigger_count == 2
+        
+        assert index.persist_trigger_stats(db) == 1
+        db.commit()
+        db.refresh(rule)
+        assert rule.trigger_count == 2
+        assert rule.last_triggered is not None
+        assert index.pending_trigger_count == 0
+        
+        db.delete(rule)
+        db.commit()
+    finally:
+        db.close()
+
+
+# ============================================
+# ROLLUP TESTS
+# ============================================
+def test_plan_segments_covers_window_exactly():
+    """Segments are contiguous, aligned and coarsest-first."""
+    from datetime import datetime
+    from services.rollups import plan_segments
+    
+    start = datetime(2025, 1, 1, 22, 30, 15)
+    end = datetime(2025, 1, 3, 1, 5, 30)
+    segments = plan_segments(start, end)
+    
+    assert segments[0][1] == start
+    assert segments[-1][2] == end
+    for (_, _, prev_end), (_, next_start, _) in zip(segments, segments[1:]):
+        assert prev_end == next_start
+    assert ("1d", datetime(2025, 1, 2), datetime(2025, 1, 3)) in segments
+    assert segments[0][0] is None and segments[-1][0] is None
+
+
+def test_window_stats_match_raw_readings(device_pk):
+    """Rollup-served window statistics equal those computed from raw rows."""
+    import statistics
+    from datetime import datetime, timedelta
+    from services.rollups import window_stats
+    
+    buffer = IngestionBuffer()
+    now = datetime.utcnow()
+    values = [float(v) for v in range(1, 41)]
+    for i, value in enumerate(values):
+        buffer.submit(device_pk, value, quality=0.5, timestamp=now - timedelta(minutes=3 * i, seconds=7))
+    
+    db = SessionLocal()
+    try:
+        start = now - timedelta(hours=3)
+        expected = [
+            v for (v,) in db.query(SensorData.value).filter(
+                SensorData.device_id == device_pk,
+                SensorData.timestamp >= start,
+                SensorData.timestamp < now
+            )
+        ]
+        stats = window_stats(db, start, now, [device_pk])[device_pk]
+    finally:
+        db.close()
+    
+    assert stats.count == len(expected)
+    assert stats.min == min(expected)
+    assert stats.max == max(expected)
+    assert abs(stats.mean - statistics.mean(expected)) < 1e-9
+    assert abs(stats.std_dev - statistics.stdev(expected)) < 1e-6
+
+
+# ============================================
+# STREAMING QUANTILE TESTS
+# ============================================
+def test_streaming_median_exact_then_approximate():
+    """Small streams are exact; large streams stay close with bounded memory."""
+    import random
+    import statistics
+    from services.quantiles import P2Quantile, streaming_median
+    
+    assert streaming_median([]) is None
+    assert streaming_median([3.0, 1.0, 2.0, 10.0]) == statistics.median([3.0, 1.0, 2.0, 10.0])
+    
+    rng = random.Random(42)
+    values = [rng.gauss(20.0, 5.0) for _ in range(50000)]
+    estimator = P2Quantile(0.5, exact_limit=256)
+    for v in values:
+        estimator.add(v)
+    
+    assert len(estimator._sample) == 0
+    assert abs(estimator.value - statistics.median(values)) < 0.2
+
+
+# ============================================
+# REPORT GENERATOR TESTS
+# ============================================
+def test_report_alert_counts_are_grouped(device_pk):
+    """Severity/resolution counts and per-device counts come from grouped queries."""
+    from datetime import datetime, timedelta
+    from sqlalchemy import event
+    from database import Alert, AlertSeverity
+    
+    from services.report_generator import ReportGenerator
+    
+    db = SessionLocal()
+    try:
+        db.query(Alert).filter(Alert.device_id == device_pk).delete()
+        db.add_all([
+            Alert(device_id=device_pk, severity=AlertSeverity.CRITICAL, title="t", message="m"),
+            Alert(device_id=device_pk, severity=AlertSeverity.CRITICAL, title="t", message="m", is_resolved=True),
+            Alert(device_id=device_pk, severity=AlertSeverity.INFO, title="t", message="m"),
+        ])
+        db.commit()
+    finally:
+        db.close()
+    
+    generator = ReportGenerator(SessionLocal())
+    start = datetime.utcnow() - timedelta(hours=1)
+    end = datetime.utcnow() + timedelta(hours=1)
+    
+    counts = generator._count_alerts(start, end, device_pk=device_pk)
+    assert counts["total"] == 3
+    assert counts["by_severity"] == {"critical": 2, "error": 0, "warning": 0, "info": 1}
+    assert counts["resolved"] == 1 and counts["unresolved"] == 2
+    
+    # Round-trips do not depend on the number of devices
+    statements = []
+    bind = generator.db.get_bind()
+    listener = lambda *args: statements.append(args[2])
+    event.listen(bind, "before_cursor_execute", listener)
+    try:
+        summary = generator._get_devices_summary(start, end)
+    finally:
+        event.remove(bind, "before_cursor_execute", listener)
+    
+    assert next(d for d in summary if d["id"] == "SVC-TEST")["alerts"] == 3
+    assert len(statements) <= 10
+    generator.db.close()
+
+
+# ============================================
+# LIVE METRICS TESTS
+# ============================================
+def test_sliding_counter_expires_old_buckets():
+    """Events leave the window once their bucket is older than the window."""
+    from services.live_metrics import SlidingCounter
+    
+    counter = SlidingCounter(window_seconds=60, bucket_seconds=10)
+    counter.add(1000.0, 3)
+    counter.add(1035.0)
+    counter.add(1005.0)  # out of order, same bucket as the first
+    counter.add(985.0)   # out of order, older bucket
+    
+    assert counter.total(now=1040.0) == 6
+    assert counter.total(now=1071.0) == 1
+    assert counter.total(now=1100.0) == 0
+
+
+def test_live_metrics_incremental_matches_reconcile(device_pk):
+    """Counters updated by the ingest path agree with a full recount."""
+    from datetime import datetime
+    from services.live_metrics import live_metrics
+    
+    db = SessionLocal()
+    try:
+        live_metrics.reconcile(db)
+        before = live_metrics.snapshot()
+        
+        buffer = IngestionBuffer()
+        now = datetime.utcnow()
+        for i in range(5):
+            buffer.submit(device_pk, float(i), timestamp=now)
+        
+        after = live_metrics.snapshot()
+        assert after["data_24h"] == before["data_24h"] + 5
+        assert after["data_7d"] == before["data_7d"] + 5
+        assert after["ingest_rate_per_second"] > 0
+        
+        live_metrics.reconcile(db)
+        reconciled = live_metrics.snapshot()
+        assert reconciled["data_24h"] == after["data_24h"]
+        assert reconciled["devices_online"] == after["devices_online"]
+        assert reconciled["alerts_open"] == db.query(Alert).filter(Alert.is_resolved == False).count()
+    finally:
+        db.close()
+
+
+# ============================================
+# DB THREAD POOL TESTS
+# ============================================
+def test_run_db_keeps_event_loop_responsive():
+    """Blocking DB work on the pool does not stall other coroutines."""
+    import time
+    from database import run_db
+    
+    async def scenario():
+        ticks = 0
+        
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        
+        task = asyncio.create_task(ticker())
+        result = await run_db(lambda: time.sleep(0.2) or "done")
+        task.cancel()
+        return result, ticks
+    
+    result, ticks = asyncio.run(scenario())
+    assert result == "done"
+    assert ticks >= 5
+
+
+# ============================================
+# REALTIME FAN-OUT TESTS
+# ============================================
+class _FakeWebSocket:
+    """Minimal WebSocket stand-in; `gate` blocks sends to emulate a slow client."""
+    
+    def __init__(self, slow: bool = False):
+        self.sent = []
+        self.gate = asyncio.Event()
+        if not slow:
+            self.gate.set()
+    
+    async def accept(self):
+        pass
+    
+    async def close(self, code: int = 1000):
+        pass
+    
+    async def send_text(self, payload: str):
+        await self.gate.wait()
+        self.sent.append(payload)
+
+
+def test_broadcast_does_not_wait_for_slow_clients():
+    """A stalled client neither blocks the producer nor the other clients."""
+    import json
+    from services.realtime import ConnectionManager
+    
+    async def scenario():
+        manager = ConnectionManager(queue_size=4, policy="coalesce")
+        fast, slow = _FakeWebSocket(), _FakeWebSocket(slow=True)
+        await manager.connect(fast)
+        await manager.connect(slow)
+        
+        for i in range(10):
+            await manager.broadcast({"type": "sensor_data", "device_id": f"D{i % 2}", "value": i})
+            await asyncio.sleep(0.001)  # Let writers drain
+        await manager.broadcast({"type": "alert", "id": 1})
+        await asyncio.sleep(0.01)
+        
+        assert len(fast.sent) == 11
+        slow_client = manager.clients[slow]
+        assert slow_client.coalesced > 0
+        
+        slow.gate.set()
+        await asyncio.sleep(0.01)
+        values = [json.loads(p).get("value") for p in slow.sent]
+        # Latest reading of each device survives coalescing, alert is not dropped
+        assert 8 in values and 9 in values
+        assert any(json.loads(p)["type"] == "alert" for p in slow.sent)
+        
+        # Disconnect policy evicts a client whose queue overflows
+        strict = ConnectionManager(queue_size=2, policy="disconnect")
+        stalled = _FakeWebSocket(slow=True)
+        await strict.connect(stalled)
+        for i in range(5):
+            strict.publish({"type": "alert", "id": i})
+        assert strict.stats()["connections"] == 0
+        assert strict.evicted_total == 1
+    
+    asyncio.run(scenario())
+
+
+def test_subscriptions_route_by_topic():
+    """Subscribed clients only receive messages matching one of their topics."""
+    import json
+    from services.realtime import ConnectionManager
+    
+    async def scenario():
+        manager = ConnectionManager()
+        everything, butcher, alerts = _FakeWebSocket(), _FakeWebSocket(), _FakeWebSocket()
+        await manager.connect(everything)
+        butcher_client = await manager.connect(butcher)
+        alerts_client = await manager.connect(alerts)
+        
+        manager.handle_message(butcher_client, json.dumps({"action": "subscribe", "rubro": "carniceria"}))
+        manager.handle_message(alerts_client, json.dumps({"action": "subscribe", "type": ["alert"]}))
+        await asyncio.sleep(0.01)
+        butcher.sent.clear()
+        alerts.sent.clear()
+        
+        manager.publish({"type": "sensor_data", "device_id": "T1", "rubro": "carniceria", "value": 1})
+        manager.publish({"type": "sensor_data", "device_id": "R1", "rubro": "riego", "value": 2})
+        manager.publish({"type": "alert", "device_id": "R1", "title": "x"})
+        await asyncio.sleep(0.01)
+        
+        assert len(everything.sent) == 3
+        assert [json.loads(p)["device_id"] for p in butcher.sent] == ["T1"]
+        assert [json.loads(p)["type"] for p in alerts.sent] == ["alert"]
+        
+        # Clearing subscriptions restores the unfiltered stream
+        manager.handle_message(butcher_client, json.dumps({"action": "unsubscribe"}))
+        assert butcher_client in manager.recipients({"type": "sensor_data", "rubro": "riego"})
+        assert manager.stats()["topics"] == 1
+        
+        manager.disconnect(alerts)
+        assert manager.stats()["topics"] == 0
+    
+    asyncio.run(scenario())
+
+
+def test_frames_keep_latest_value_per_device():
+    """Readings within a tick collapse into one frame with the latest value and min/max."""
+    import json
+    from services.realtime import ConnectionManager
+    
+    async def scenario():
+        manager = ConnectionManager(frame_interval=60)
+        everything, butcher = _FakeWebSocket(), _FakeWebSocket()
+        await manager.connect(everything)
+        butcher_client = await manager.connect(butcher)
+        manager.subscribe(butcher_client, [("rubro", "carniceria")])
+        manager.start()
+        
+        for value in (3.0, 1.0, 2.0):
+            manager.publish({"type": "sensor_data", "device_id": "T1", "rubro": "carniceria", "value": value})
+        manager.publish({"type": "sensor_data", "device_id": "R1", "rubro": "riego", "value": 7.0})
+        await asyncio.sleep(0.01)
+        assert everything.sent == []
+        
+        await manager.stop()  # Flushes the pending tick
+        await asyncio.sleep(0.01)
+        
+        frame = json.loads(everything.sent[0])
+        assert len(everything.sent) == 1 and frame["type"] == "sensor_frame"
+        t1 = next(r for r in frame["readings"] if r["device_id"] == "T1")
+        assert (t1["value"], t1["min"], t1["max"], t1["count"]) == (2.0, 1.0, 3.0, 3)
+        assert [r["device_id"] for r in json.loads(butcher.sent[0])["readings"]] == ["T1"]
+    
+    asyncio.run(scenario())
+
+
+def test_binary_frames_with_device_dictionary():
+    """Binary clients get a dictionary once, then packed records much smaller than JSON."""
+    import json
+    from services.realtime import ConnectionManager, decode_frame, epoch_ms
+    
+    class _BinaryWebSocket(_FakeWebSocket):
+        async def send_bytes(self, payload: bytes):
+            self.sent.append(payload)
+    
+    async def scenario():
+        manager = ConnectionManager(frame_interval=60)
+        text_ws, binary_ws = _FakeWebSocket(), _BinaryWebSocket()
+        await manager.connect(text_ws)
+        await manager.connect(binary_ws, wire_format="binary")
+        manager.start()
+        
+        timestamp = "2025-01-17T03:30:00.250000"
+        for i in range(20):
+            manager.publish({
+                "type": "sensor_data", "device_id": f"TEMP-{i:03d}", "device_name": f"Freezer {i}",
+                "rubro": "carniceria", "device_type": "temperature",
+                "value": -17.5 + i, "unit": "°C", "quality": 0.8, "timestamp": timestamp
+            })
+        await manager.stop()
+        manager.start()
+        manager.publish({"type": "sensor_data", "device_id": "TEMP-001", "value": 3.0, "timestamp": timestamp})
+        await manager.stop()
+        await asyncio.sleep(0.01)
+        
+        dictionary, frame, second = binary_ws.sent
+        devices = json.loads(dictionary)["devices"]
+        assert [d["device_id"] for d in devices][:2] == ["TEMP-000", "TEMP-001"]
+        
+        records = decode_frame(frame)
+        assert len(records) == 20
+        index, at_ms, value, quality = records[1]
+        assert devices[index]["device_id"] == "TEMP-001"
+        assert at_ms == epoch_ms(timestamp)
+        assert value == -16.5 and abs(quality - 0.8) < 0.01
+        
+        # Dictionary is not repeated for known devices
+        assert isinstance(second, bytes) and decode_frame(second)[0][2] == 3.0
+        assert len(frame) * 5 < len(text_ws.sent[0].encode())
+    
+    asyncio.run(scenario())
+
+
+def test_binary_dictionary_survives_slow_clients():
+    """Dictionary messages are never dropped, and indexes are reused past the dictionary size."""
+    import json
+    from services.realtime import ConnectionManager, decode_frame
+    
+    class _SlowBinaryWebSocket(_FakeWebSocket):
+        async def send_bytes(self, payload: bytes):
+            await self.gate.wait()
+            self.sent.append(payload)
+    
+    async def scenario():
+        manager = ConnectionManager(queue_size=2, policy="drop_oldest", frame_interval=0, max_binary_devices=3)
+        stalled = _SlowBinaryWebSocket(slow=True)
+        await manager.connect(stalled, wire_format="binary")
+        for i in range(5):
+            manager.publish({"type": "sensor_data", "device_id": f"D{i}", "value": float(i)})
+        manager.publish({"type": "sensor_data", "device_id": "D0", "value": 10.0})
+        assert manager.clients[stalled].dropped > 0
+        
+        stalled.gate.set()
+        await asyncio.sleep(0.01)
+        
+        # Decode the stream as a client would: every index resolves to its device
+        mapping, received = {}, []
+        for payload in stalled.sent:
+            if isinstance(payload, bytes):
+                received += [(mapping[index], value) for index, _, value, _ in decode_frame(payload)]
+            else:
+                mapping.update((d["index"], d["device_id"]) for d in json.loads(payload)["devices"])
+        assert ("D0", 10.0) in received
+        assert all(device_id == f"D{int(value) % 10}" for device_id, value in received)
+        
+        assert manager.stats()["binary_devices"] == 3
+        assert manager.dictionary_reused == 3
+    
+    asyncio.run(scenario())
+
+
+# ============================================
+# SCENARIO REPLAY TESTS
+# ============================================
+def test_scenario_replay_streams_virtual_time_into_ingest():
+    """A replayed scenario lands in sensor_data with virtual timestamps."""
+    from datetime import datetime
+    from services.scenario_replay import ScenarioReplay
+    
+    replay = ScenarioReplay(batch_size=50)
+    start = datetime(2024, 1, 1)
+    
+    async def scenario():
+        await replay.start("carniceria", speed=0, seed=3, tick_seconds=10.0,
+                           start_time=start, evaluate_rules=False)
+        return await replay.wait()
+    
+    result = asyncio.run(scenario())
+    assert result["readings"] == 2 * 60
+    assert replay.status()["state"] == "finished"
+    
+    db = SessionLocal()
+    try:
+        pks = [d.id for d in replay.devices.values()]
+        rows = db.query(SensorData).filter(
+            SensorData.device_id.in_(pks),
+            SensorData.timestamp >= start,
+            SensorData.timestamp < datetime(2024, 1, 2)
+        ).all()
+    finally:
+        db.close()
+    
+    assert len(rows) >= 100
+    span = max(r.timestamp for r in rows) - min(r.timestamp for r in rows)
+    assert span.total_seconds() == 590
+
+
+# ============================================
+# SINGLE WRITER TESTS
+# ============================================
+@pytest.fixture
+def writer_device_pk(device_pk):
+    """A throwaway device for raw writer inserts (no rollups); removed afterwards."""
+    from database import delete_device_readings
+    
+    db = SessionLocal()
+    device = Device(device_id="WRITER-TEST", name="Writer Test", device_type="temperature")
+    db.add(device)
+    db.commit()
+    pk = device.id
+    db.close()
+    yield pk
+    
+    db = SessionLocal()
+    try:
+        delete_device_readings(db, pk)
+        db.query(Device).filter(Device.id == pk).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_db_writer_batches_and_isolates_failures(writer_device_pk):
+    """Queued writes share a transaction; a failing write only fails itself."""
+    from datetime import datetime
+    from services.db_writer import DatabaseWriter
+    
+    writer = DatabaseWriter(max_batch=100)
+    before = _count_rows(writer_device_pk)
+    
+    def insert(db, value):
+        insert_readings(db, [{"device_id": writer_device_pk, "timestamp": datetime.utcnow(), "value": value}])
+        return value
+    
+    def fail(db):
+        raise ValueError("bad write")
+    
+    async def scenario():
+        writer.start()
+        futures = [writer.submit(insert, float(i)) for i in range(20)]
+        futures.append(writer.submit(fail))
+        futures += [writer.submit(insert, float(i)) for i in range(20, 30)]
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures), return_exceptions=True)
+        await writer.stop()
+        return results
+    
+    results = asyncio.run(scenario())
+    
+    assert isinstance(results[20], ValueError)
+    assert [r for r in results if not isinstance(r, Exception)] == [float(i) for i in range(30)]
+    assert writer.ops_total == 30 and writer.failed_total == 1
+    assert writer.batch_count < 30  # Grouped, not one transaction per write
+    assert not writer.is_running
+    assert _count_rows(writer_device_pk) == before + 30
+
+
+def test_db_writer_side_effects_follow_the_transaction(writer_device_pk):
+    """Rule cooldowns, trigger counts and alerts survive a failing neighbour and vanish on rollback."""
+    from fastapi import HTTPException
+    from database import Rule
+    from services.db_writer import DatabaseWriter
+    from services.rules_engine import RulesEngine, rule_index
+    
+    db = SessionLocal()
+    rule = Rule(
+        name="Writer Hooks",
+        condition={"device_id": "WRITER-TEST", "operator": ">", "value": 100},
+        action={"type": "alert", "severity": "warning", "message": "Too high: {value}"},
+        cooldown_seconds=3600
+    )
+    db.add(rule)
+    db.commit()
+    rule_pk = rule.id
+    db.close()
+    rule_index.invalidate()
+    
+    writer = DatabaseWriter(max_batch=100)
+    
+    def evaluate(db, value, fail=False):
+        engine = RulesEngine(db)
+        actions = engine.evaluate_all_rules("WRITER-TEST", value)
+        engine.save_alerts(db)
+        if fail:
+            raise ValueError("failed after the alert")
+        return actions
+    
+    def missing_alert(db):
+        raise HTTPException(status_code=404, detail="Alert not found")
+    
+    def persist_then_fail(db):
+        rule_index.persist_trigger_stats(db)
+        raise ValueError("failed after the UPDATE")
+    
+    async def scenario(*calls):
+        writer.start()
+        futures = [writer.submit(*call) for call in calls]
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures), return_exceptions=True)
+        await writer.stop()
+        return results
+    
+    def alert_count():
+        db = SessionLocal()
+        try:
+            return db.query(Alert).filter(Alert.rule_id == rule_pk).count()
+        finally:
+            db.close()
+    
+    try:
+        pending = rule_index.pending_trigger_count
+        
+        # Rolled back: no alert, no cooldown, no trigger count
+        (failed,) = asyncio.run(scenario((evaluate, 150.0, True)))
+        assert isinstance(failed, ValueError)
+        assert alert_count() == 0
+        assert rule_index.pending_trigger_count == pending
+        
+        # A control-flow HTTPException in the same batch only fails itself
+        actions, not_found = asyncio.run(scenario((evaluate, 150.0), (missing_alert,)))
+        assert isinstance(not_found, HTTPException)
+        assert len(actions) == 1 and actions[0]["alert_id"] is not None
+        assert alert_count() == 1
+        assert rule_index.pending_trigger_count == pending + 1
+        assert writer.retried_batches == 0
+        
+        # The committed trigger started the cooldown
+        assert asyncio.run(scenario((evaluate, 150.0))) == [[]]
+        
+        # Counters taken by a rolled-back UPDATE go back in the queue
+        (failed,) = asyncio.run(scenario((persist_then_fail,)))
+        assert isinstance(failed, ValueError)
+        assert rule_index.pending_trigger_count == pending + 1
+    finally:
+        db = SessionLocal()
+        db.query(Alert).filter(Alert.rule_id == rule_pk).delete()
+        # Deactivate rather than delete: SQLite would hand the id to the next rule
+        db.query(Rule).filter(Rule.id == rule_pk).update({"is_active": False})
+        db.commit()
+        db.close()
+        rule_index.invalidate()
+
+
+def test_queued_rule_alerts(writer_device_pk, monkeypatch):
+    """Rules evaluated off the writer queue their alerts; a failed save undoes the trigger."""
+    from database import Rule, ReadSessionLocal
+    from services.db_writer import db_writer
+    from services.rules_engine import RulesEngine, rule_index
+    
+    db = SessionLocal()
+    rule = Rule(
+        name="Queued Alerts",
+        condition={"device_id": "WRITER-TEST", "operator": ">", "value": 100},
+        action={"type": "alert", "severity": "warning", "message": "Too high: {value}"},
+        cooldown_seconds=3600
+    )
+    db.add(rule)
+    db.commit()
+    rule_pk = rule.id
+    db.close()
+    rule_index.invalidate()
+    
+    async def scenario(engine):
+        db_writer.start()
+        actions = engine.evaluate_all_rules("WRITER-TEST", 150.0)
+        future = engine.queue_alerts()
+        await db_writer.stop()
+        return actions, future
+    
+    read_db = ReadSessionLocal()
+    try:
+        pending = rule_index.pending_trigger_count
+        
+        # The save fails: the rule leaves its cooldown and the count is dropped
+        failing = RulesEngine(read_db)
+        monkeypatch.setattr(failing, "save_alerts", lambda db, new_alerts: 1 / 0)
+        actions, future = asyncio.run(scenario(failing))
+        assert len(actions) == 1
+        assert isinstance(future.exception(), ZeroDivisionError)
+        assert rule_index.pending_trigger_count == pending
+        
+        engine = RulesEngine(read_db)
+        actions, future = asyncio.run(scenario(engine))
+        assert future.result() == 1
+        assert actions[0]["alert_id"] is None  # The writer filled in its own copy
+        assert read_db.query(Alert).filter(Alert.rule_id == rule_pk).count() == 1
+        assert rule_index.pending_trigger_count == pending + 1
+    finally:
+        read_db.close()
+        db = SessionLocal()
+        db.query(Alert).filter(Alert.rule_id == rule_pk).delete()
+        # Deactivate rather than delete: SQLite would hand the id to the next rule
+        db.query(Rule).filter(Rule.id == rule_pk).update({"is_active": False})
+        db.commit()
+        db.close()
+        rule_index.invalidate()
+
+
+def test_rule_evaluation_only_locks_the_trigger(writer_device_pk):
+    """Lookups and predicates run without the index lock; concurrent evaluations trigger a rule once."""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from database import Rule, ReadSessionLocal
+    from services.rules_engine import RulesEngine, rule_index
+    
+    db = SessionLocal()
+    rule = Rule(
+        name="Concurrent Triggers",
+        condition={"device_id": "WRITER-TEST", "operator": ">", "value": 100},
+        action={"type": "log", "message": "Concurrent trigger"},
+        cooldown_seconds=3600
+    )
+    db.add(rule)
+    db.commit()
+    rule_pk = rule.id
+    db.close()
+    rule_index.invalidate()
+    
+    read_db = ReadSessionLocal()
+    try:
+        assert RulesEngine(read_db).evaluate_all_rules("WRITER-TEST", 0.0) == []  # Builds the index
+        
+        # Another thread holding the lock does not hold up a non-triggering evaluation
+        held, release = threading.Event(), threading.Event()
+        
+        def hold():
+            with rule_index.lock:
+                held.set()
+                release.wait(5)
+        
+        holder = threading.Thread(target=hold)
+        holder.start()
+        held.wait(5)
+        try:
+            with ThreadPoolExecutor(1) as pool:
+                evaluation = pool.submit(RulesEngine(read_db).evaluate_all_rules, "WRITER-TEST", 0.0)
+                assert evaluation.result(timeout=2) == []
+        finally:
+            release.set()
+            holder.join()
+        
+        pending = rule_index.pending_trigger_count
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(
+                lambda _: RulesEngine(read_db).evaluate_all_rules("WRITER-TEST", 150.0), range(32)
+            ))
+        assert sum(len(actions) for actions in results) == 1
+        assert rule_index.pending_trigger_count == pending + 1
+    finally:
+        read_db.close()
+        db = SessionLocal()
+        # Deactivate rather than delete: SQLite would hand the id to the next rule
+        db.query(Rule).filter(Rule.id == rule_pk).update({"is_active": False})
+        db.commit()
+        db.close()
+        rule_index.invalidate()
+
+
+def test_read_sessions_are_read_only(device_pk):
+    """Reader connections cannot write."""
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from database import ReadSessionLocal, read_engine
+    
+    if read_engine is engine:
+        pytest.skip("Single shared engine (non-file database)")
+    
+    db = ReadSessionLocal()
+    try:
+        assert db.query(Device).filter(Device.id == device_pk).count() == 1
+        with pytest.raises(OperationalError):
+            db.execute(text("UPDATE devices SET name = 'x' WHERE id = :pk"), {"pk": device_pk})
+    finally:
+        db.close()
+
+
+def test_pool_options_only_size_queue_pools():
+    """In-memory SQLite (SingletonThreadPool) gets no pool sizing; file databases do."""
+    from sqlalchemy import create_engine
+    from database import pool_options
+    
+    assert pool_options("sqlite://") == {}
+    assert pool_options("sqlite:///:memory:") == {}
+    assert set(pool_options("sqlite:///telemetry.db")) == {"pool_size", "max_overflow"}
+    create_engine("sqlite://", **pool_options("sqlite://")).dispose()
+
+
+# ============================================
+# SENSOR DATA PARTITION TESTS
+# ============================================
+def test_sensor_data_partitions(device_pk):
+    """Readings land in their period's partition; reads prune, retention drops partitions."""
+    from datetime import datetime
+    import database
+    from database import partition_key, sensor_data_between, drop_partitions_before
+    
+    if not database.PARTITIONED:
+        pytest.skip("Partitions are SQLite-only")
+    
+    january, february = datetime(2001, 1, 15, 12), datetime(2001, 2, 15, 12)
+    db = SessionLocal()
+    try:
+        insert_readings(db, [
+            {"device_id": device_pk, "timestamp": january, "value": 1.0},
+            {"device_id": device_pk, "timestamp": february, "value": 2.0}
+        ])
+        db.commit()
+        
+        keys = database.list_partitions(db.connection())
+        assert partition_key(january) in keys and partition_key(february) in keys
+        
+        # Only February's partition is read, even without a timestamp filter
+        raw = sensor_data_between(db, datetime(2001, 2, 1), datetime(2001, 2, 28))
+        assert [v for (v,) in db.query(raw.value).filter(raw.device_id == device_pk)] == [2.0]
+        
+        # The view still exposes every partition
+        assert db.query(SensorData).filter(SensorData.timestamp < datetime(2001, 3, 1)).count() == 2
+        
+        # Ids come from each partition's own JSON-safe range
+        ids = sorted(i for (i,) in db.query(SensorData.id).filter(SensorData.timestamp < datetime(2001, 3, 1)))
+        assert ids[0] > database.partition_id_offset(partition_key(january))
+        assert ids[1] > database.partition_id_offset(partition_key(february)) > ids[0]
+        assert database.partition_id_offset("20991231") + database.PARTITION_ID_SPAN < database.MAX_SAFE_ID
+        
+        dropped = drop_partitions_before(db, datetime(2001, 2, 1))
+        db.commit()
+        assert partition_key(january) in dropped and partition_key(february) not in dropped
+        assert partition_key(january) not in database.list_partitions(db.connection())
+        assert db.query(SensorData).filter(SensorData.timestamp < datetime(2001, 3, 1)).count() == 1
+    finally:
+        db.close()
+
+
+# ============================================
+# RETENTION TESTS
+# ============================================
+@pytest.fixture
+def retention_device_pk():
+    """A throwaway device of its own rubro; its readings and archive rows are removed afterwards."""
+    from database import ArchiveSegment, delete_device_readings
+    
+    db = SessionLocal()
+    device = Device(device_id="RET-TEST", name="Retention Test", device_type="temperature", rubro="retention_test")
+    db.add(device)
+    db.commit()
+    pk = device.id
+    db.close()
+    yield pk
+    
+    db = SessionLocal()
+    try:
+        delete_device_readings(db, pk)
+        db.query(ArchiveSegment).filter(ArchiveSegment.rubro == "retention_test").delete()
+        db.query(Device).filter(Device.id == pk).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_retention_archives_to_parquet(tmp_path, device_pk, retention_device_pk):
+    """Aged rows of the policy's rubro move to Parquet, stay readable and leave the database."""
+    pytest.importorskip("pyarrow")
+    from datetime import datetime, timedelta
+    from database import ReadSessionLocal, ArchiveSegment
+    from services.retention import RetentionEngine
+    
+    now = datetime(2002, 6, 1)
+    db = SessionLocal()
+    insert_readings(db, [
+        {"device_id": retention_device_pk, "timestamp": now - timedelta(days=day), "value": float(day)}
+        for day in range(60)
+    ])
+    db.commit()
+    db.close()
+    
+    engine_ = RetentionEngine(
+        policies=[{"table": "sensor_data", "rubro": "retention_test", "days": 30}],
+        archive_dir=str(tmp_path), chunk_rows=7
+    )
+    result = engine_.run(now=now)
+    
+    assert result["archived"] == {"sensor_data/retention_test": 29}
+    assert result["files"] == 5  # Chunks of 7 rows
+    assert engine_.run(now=now)["archived"] == {"sensor_data/retention_test": 0}
+    
+    db = ReadSessionLocal()
+    try:
+        remaining = db.query(SensorData).filter(
+            SensorData.device_id == retention_device_pk, SensorData.timestamp <= now
+        ).count()
+        assert remaining == 31
+        assert sum(s.row_count for s in db.query(ArchiveSegment).filter(ArchiveSegment.rubro == "retention_test")) == 29
+        
+        archived = engine_.read_archive(db, "sensor_data", now - timedelta(days=45), now, retention_device_pk)
+        assert [row["value"] for row in archived] == [float(day) for day in range(45, 30, -1)]
+    finally:
+        db.close()
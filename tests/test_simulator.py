@@ -0,0 +1,174 @@
+"""
+IoT Multi-Rubro System - Simulator Tests
+=========================================
+Unit tests for the sensor models and the vectorized fleet.
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from simulator.sensor_models import create_sensor, SENSOR_MODELS
+from simulator.fleet import SensorFleet, FleetSimulator
+
+
+class _Clock:
+    """Manually advanced clock for deterministic reads."""
+    
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+def _replay(sensor_type: str, seed, steps: int = 50):
+    clock = _Clock()
+    sensor = create_sensor(sensor_type, "S-1", seed=seed, clock=clock)
+    values = []
+    for _ in range(steps):
+        clock.now += 1.0
+        values.append(sensor.read().value)
+    return values
+
+
+# ============================================
+# SENSOR MODEL TESTS
+# ============================================
+def test_seeded_sensors_replay_bit_for_bit():
+    """Same seed and clock give identical readings for every model."""
+    for sensor_type in SENSOR_MODELS:
+        assert _replay(sensor_type, seed=42) == _replay(sensor_type, seed=42)
+    assert _replay("temperature", seed=42) != _replay("temperature", seed=43)
+
+
+def test_motion_business_hours_follow_the_scenario_day(monkeypatch):
+    """Motion sensors read the hour in the site's time zone, where the scenario day starts."""
+    import time
+    from datetime import timedelta, timezone
+    from simulator.scenario import ScenarioRunner
+    
+    if not hasattr(time, "tzset"):
+        pytest.skip("time.tzset is not available")
+    
+    exact = {"business_hours": (8, 9), "peak_probability": 1.0, "noise_level": 0.0, "drift_rate": 0.0, "failure_probability": 0.0}
+    scenario = {"devices": [{"device_id": "M-1", "device_type": "motion", "config": exact}]}
+    
+    def motion_at(tz, hour):
+        runner = ScenarioRunner(scenario, seed=3, tz=tz)
+        runner.clock.advance(hour * 3600)
+        fleet = FleetSimulator(seed=3, start_time=runner.start_time, tz=tz)
+        fleet.add_fleet("motion", [f"M-{i}" for i in range(200)], **exact)
+        values = fleet.step(now=runner.clock())[0].values
+        return runner.sensors["M-1"].read().value, float(values.mean())
+    
+    try:
+        for host_tz in ("UTC", "Etc/GMT+11"):
+            monkeypatch.setenv("TZ", host_tz)
+            time.tzset()
+            for site_tz in (None, timezone(timedelta(hours=-3))):
+                sensor, fleet = motion_at(site_tz, 8.5)  # Shop open at 08:30 on the scenario day
+                assert sensor == 1.0 and fleet == 1.0
+                _, fleet = motion_at(site_tz, 12.0)  # Closed: 10% of the peak probability
+                assert fleet < 0.5
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def test_sensor_streams_are_independent_of_creation_order():
+    """Each sensor's stream depends only on the seed and its id."""
+    clock = _Clock()
+    a1 = create_sensor("distance", "A", seed=7, clock=clock)
+    b1 = create_sensor("distance", "B", seed=7, clock=clock)
+    b2 = create_sensor("distance", "B", seed=7, clock=clock)
+    
+    first = [b1.read().value for _ in range(100)]
+    a1.read()
+    assert [b2.read().value for _ in range(100)] == first
+    assert a1.rng is not b1.rng
+
+
+# ============================================
+# FLEET TESTS
+# ============================================
+def test_fleet_from_devices_groups_by_type():
+    """Per-device config overrides defaults; unknown types are skipped."""
+    simulator = FleetSimulator.from_devices([
+        ("T1", "temperature", {"base_temp": -15.0, "amplitude": 0.0}),
+        ("T2", "temperature", None),
+        ("F1", "flow", {"valve_open": False}),
+        ("X1", "unknown", {}),
+    ], seed=1, start_time=0.0)
+    
+    assert simulator.size == 3
+    temperature = simulator.fleets["temperature"]
+    assert temperature.params["base_temp"].tolist() == [-15.0, 20.0]
+    
+    readings = {r.sensor_type: r for r in simulator.step(now=1.0)}
+    assert readings["temperature"].values[0] == pytest.approx(-15.0, abs=1.0)
+    assert readings["flow"].values[0] == pytest.approx(0.0, abs=0.1)
+
+
+def test_fleet_failures_disconnect_sensors():
+    """Failed sensors report quality 0 and keep their last value."""
+    fleet = SensorFleet("distance", [f"D{i}" for i in range(1000)],
+                        rng=np.random.default_rng(3), start_time=0.0, failure_probability=0.5)
+    first = fleet.step(now=1.0)
+    failed = ~first.is_connected
+    
+    assert 300 < failed.sum() < 700
+    assert (first.quality[failed] == 0).all()
+    
+    before = first.values.copy()
+    second = fleet.step(now=2.0)
+    assert (~second.is_connected[failed]).all()
+    assert np.array_equal(second.values[failed], before[failed])
+
+
+def test_fleet_seed_is_reproducible():
+    """Seeded fleets replay identically regardless of fleet order."""
+    def run(types):
+        simulator = FleetSimulator(seed=5, start_time=0.0)
+        for sensor_type in types:
+            simulator.add_fleet(sensor_type, [f"{sensor_type}-{i}" for i in range(100)])
+        return {r.sensor_type: r.values.copy() for r in simulator.step(now=1.0)}
+    
+    forward = run(["temperature", "motion"])
+    backward = run(["motion", "temperature"])
+    for sensor_type in forward:
+        assert np.array_equal(forward[sensor_type], backward[sensor_type])
+
+
+def test_fleet_throughput():
+    """A 100k-sensor fleet steps well above 100k readings per second."""
+    from simulator.fleet import benchmark
+    
+    result = benchmark(sensors_per_type=12500, steps=5)
+    assert result["sensors"] == 100000
+    assert result["readings_per_second"] > 100000
+
+
+# ============================================
+# SCENARIO REPLAY TESTS
+# ============================================
+def test_scenario_events_follow_virtual_clock():
+    """A compressor failure raises the freezer temperature, then recovers."""
+    from simulator.scenario import ScenarioRunner, load_scenario
+    
+    runner = ScenarioRunner(load_scenario("carniceria_completo"), seed=1, start_time=0.0, tick_seconds=10.0)
+    sensor = runner.sensors["CARN-TEMP-001"]
+    freezer = {}  # Thermal state before noise (the scenario uses 30% relative noise)
+    for elapsed, batch in runner.ticks():
+        freezer[elapsed] = sensor.last_value
+    
+    assert runner.clock() == 86400.0
+    assert len(freezer) == 8640
+    assert runner.events_applied == 4
+    assert freezer[64800 + 540] > freezer[64800 - 10] + 3     # 0.5 °C/min compressor failure
+    assert runner.sensors["CARN-TEMP-001"].base_temp == -18.0  # Restored after the event
@@ -82,6 +82,11 @@ function handleMessage(message) {
             handleSensorData(message);
             break;
         
+        case 'sensor_frame':
+            // Latest reading per device batched by the server each tick
+            message.readings.forEach(handleSensorData);
+            break;
+        
         case 'alert':
             handleAlert(message);
             break;